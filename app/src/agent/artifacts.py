@@ -0,0 +1,73 @@
+"""Content-addressed storage for generated artifacts.
+
+Image bytes are kept out of the graph state: the state only carries small
+references of the form ``sha256:<hex digest>`` and the bytes live in a local
+directory keyed by that digest, so identical files are stored once.
+"""
+
+from __future__ import annotations
+
+import functools
+import hashlib
+import os
+import tempfile
+
+REF_PREFIX = "sha256:"
+_DIGEST_LENGTH = 64
+
+
+class ArtifactStore:
+    """A content-addressed blob store on the local disk."""
+
+    def __init__(self, root: str) -> None:
+        self.root = root
+
+    def path(self, ref: str) -> str:
+        """Return the local path of the blob behind `ref`."""
+        if not ref.startswith(REF_PREFIX):
+            raise ValueError(f"Not an artifact reference: {ref!r}")
+        digest = ref[len(REF_PREFIX) :]
+        if len(digest) != _DIGEST_LENGTH or not all(
+            c in "0123456789abcdef" for c in digest
+        ):
+            raise ValueError(f"Malformed artifact digest: {digest!r}")
+        return os.path.join(self.root, digest[:2], digest[2:])
+
+    def exists(self, ref: str) -> bool:
+        """Return whether the blob behind `ref` is stored."""
+        return os.path.exists(self.path(ref))
+
+    def put(self, data: bytes | memoryview) -> str:
+        """Store `data` and return its reference. Existing blobs are reused."""
+        ref = REF_PREFIX + hashlib.sha256(data).hexdigest()
+        path = self.path(ref)
+        if os.path.exists(path):
+            return ref
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write to a temporary file and rename so readers never see a partial blob.
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+        return ref
+
+    def put_file(self, file_path: str) -> str:
+        """Store the contents of `file_path` and return its reference."""
+        with open(file_path, "rb") as f:
+            return self.put(f.read())
+
+    def get(self, ref: str) -> bytes:
+        """Return the bytes behind `ref`."""
+        with open(self.path(ref), "rb") as f:
+            return f.read()
+
+
+@functools.lru_cache(maxsize=8)
+def get_artifact_store(root: str) -> ArtifactStore:
+    """Return the process-wide store rooted at `root`."""
+    return ArtifactStore(root)
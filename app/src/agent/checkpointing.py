@@ -0,0 +1,293 @@
+"""Checkpointer backends for the agent graph.
+
+The graph is compiled at import time, so the backend is chosen from
+environment variables rather than from `Configuration`:
+
+- ``OWNIT_CHECKPOINTER``: ``sqlite`` (default) or ``memory``.
+- ``OWNIT_CHECKPOINT_DB``: path of the SQLite database (default
+  ``data/checkpoints.sqlite``, ignored by git). Its directory is created.
+- ``OWNIT_CHECKPOINT_KEEP_LAST``: checkpoints kept per thread (default 20, 0 keeps all).
+- ``OWNIT_CHECKPOINT_TTL_HOURS``: idle threads older than this are evicted
+  (default 168, 0 disables eviction).
+- ``OWNIT_CHECKPOINT_MAINTENANCE_MINUTES``: how often eviction and
+  compaction run (default 60, 0 disables them).
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections.abc import AsyncIterator, Mapping, Sequence
+from typing import Any
+
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import (
+    BaseCheckpointSaver,
+    ChannelVersions,
+    Checkpoint,
+    CheckpointMetadata,
+    CheckpointTuple,
+)
+from langgraph.checkpoint.memory import InMemorySaver
+from langgraph.checkpoint.sqlite import SqliteSaver
+
+from agent.executors import get_io_executor, run_io
+
+DEFAULT_CHECKPOINT_DB = os.path.join("data", "checkpoints.sqlite")
+# VACUUM rewrites the whole file, so it only runs once this share of the
+# database's pages is free.
+VACUUM_FREE_RATIO = 0.25
+# Seconds the compaction connection waits for checkpoint writes to finish.
+_COMPACT_TIMEOUT = 30.0
+
+
+class RetainingSqliteSaver(SqliteSaver):
+    """A SQLite/WAL checkpointer with a retention policy and async support.
+
+    The stock `SqliteSaver` only implements the sync interface, and the
+    aiosqlite-based saver must be built inside a running event loop, which
+    does not fit a graph compiled at import time. This saver keeps the sync
+    implementation and serves the async interface from the shared I/O pool.
+
+    On top of that it:
+
+    - keeps only the newest `keep_last` checkpoints of each thread,
+    - evicts threads that have been idle for longer than `thread_ttl` seconds,
+    - periodically truncates the WAL and, once enough of it is free space,
+      VACUUMs the database file.
+    """
+
+    def __init__(
+        self,
+        conn: sqlite3.Connection,
+        *,
+        keep_last: int = 20,
+        thread_ttl: float | None = 7 * 24 * 3600,
+        maintenance_interval: float | None = 3600,
+    ) -> None:
+        super().__init__(conn)
+        self.keep_last = keep_last
+        self.thread_ttl = thread_ttl
+        self.maintenance_interval = maintenance_interval
+        self._last_maintenance = time.monotonic()
+        self._maintenance_lock = threading.Lock()
+        # Empty for in-memory databases, which are never compacted.
+        self._path = conn.execute("PRAGMA database_list").fetchone()[2]
+
+    @classmethod
+    def from_path(cls, path: str, **kwargs: Any) -> RetainingSqliteSaver:
+        """Open (or create) the database at `path`, creating its directory."""
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        conn = sqlite3.connect(path, check_same_thread=False)
+        return cls(conn, **kwargs)
+
+    def setup(self) -> None:
+        """Create the checkpoint tables plus the thread activity table."""
+        if self.is_setup:
+            return
+        super().setup()
+        self.conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS thread_activity (
+                thread_id TEXT PRIMARY KEY,
+                updated_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS thread_activity_updated_at
+                ON thread_activity (updated_at);
+            """
+        )
+
+    def put(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        """Save a checkpoint, then apply the per-thread retention policy."""
+        next_config = super().put(config, checkpoint, metadata, new_versions)
+        thread_id = str(next_config["configurable"]["thread_id"])
+        checkpoint_ns = str(next_config["configurable"]["checkpoint_ns"])
+        with self.cursor() as cur:
+            cur.execute(
+                "INSERT OR REPLACE INTO thread_activity (thread_id, updated_at) VALUES (?, ?)",
+                (thread_id, time.time()),
+            )
+            if self.keep_last > 0:
+                self._prune_thread(cur, thread_id, checkpoint_ns)
+        self._schedule_maintenance()
+        return next_config
+
+    def _prune_thread(
+        self, cur: sqlite3.Cursor, thread_id: str, checkpoint_ns: str
+    ) -> None:
+        """Delete all but the newest `keep_last` checkpoints of a thread."""
+        # Checkpoint ids are time-ordered (uuid6), so the newest sort last.
+        cur.execute(
+            """
+            SELECT checkpoint_id FROM checkpoints
+            WHERE thread_id = ? AND checkpoint_ns = ?
+            ORDER BY checkpoint_id DESC
+            LIMIT 1 OFFSET ?
+            """,
+            (thread_id, checkpoint_ns, self.keep_last - 1),
+        )
+        row = cur.fetchone()
+        if row is None:
+            return
+        oldest_kept = row[0]
+        for table in ("checkpoints", "writes"):
+            cur.execute(
+                f"DELETE FROM {table} "
+                "WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id < ?",
+                (thread_id, checkpoint_ns, oldest_kept),
+            )
+
+    def delete_thread(self, thread_id: str) -> None:
+        """Delete a thread's checkpoints, writes and activity record."""
+        super().delete_thread(thread_id)
+        with self.cursor() as cur:
+            cur.execute(
+                "DELETE FROM thread_activity WHERE thread_id = ?", (str(thread_id),)
+            )
+
+    def evict_expired_threads(self, now: float | None = None) -> int:
+        """Delete every thread idle for longer than `thread_ttl`. Returns the count."""
+        if not self.thread_ttl:
+            return 0
+        cutoff = (now if now is not None else time.time()) - self.thread_ttl
+        with self.cursor() as cur:
+            cur.execute(
+                "SELECT thread_id FROM thread_activity WHERE updated_at < ?", (cutoff,)
+            )
+            expired = [row[0] for row in cur.fetchall()]
+            for table in ("checkpoints", "writes", "thread_activity"):
+                cur.executemany(
+                    f"DELETE FROM {table} WHERE thread_id = ?",
+                    [(thread_id,) for thread_id in expired],
+                )
+        if expired:
+            logging.info(f"Evicted {len(expired)} expired checkpoint threads")
+        return len(expired)
+
+    def compact(self) -> None:
+        """Fold the WAL back into the database and reclaim free pages.
+
+        Runs on a connection of its own, without the saver's lock: checkpoint
+        reads go on throughout, and writes only wait, on SQLite's busy
+        timeout, while a VACUUM rewrites the file. VACUUM only runs once
+        `VACUUM_FREE_RATIO` of the pages are free.
+        """
+        if not self._path:
+            return
+        conn = sqlite3.connect(self._path, timeout=_COMPACT_TIMEOUT)
+        try:
+            conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+            [pages] = conn.execute("PRAGMA page_count").fetchone()
+            [free] = conn.execute("PRAGMA freelist_count").fetchone()
+            if pages and free / pages >= VACUUM_FREE_RATIO:
+                logging.info(f"Vacuuming checkpoints: {free} of {pages} pages free")
+                conn.execute("VACUUM")
+        finally:
+            conn.close()
+
+    def maintain(self) -> None:
+        """Run TTL eviction followed by compaction."""
+        if not self._maintenance_lock.acquire(blocking=False):
+            return
+        try:
+            self.evict_expired_threads()
+            self.compact()
+        except Exception as e:
+            logging.error(f"Checkpoint maintenance failed: {e}")
+        finally:
+            self._last_maintenance = time.monotonic()
+            self._maintenance_lock.release()
+
+    def _schedule_maintenance(self) -> None:
+        """Run `maintain` on the I/O pool if the interval has elapsed."""
+        if not self.maintenance_interval:
+            return
+        if time.monotonic() - self._last_maintenance < self.maintenance_interval:
+            return
+        self._last_maintenance = time.monotonic()
+        get_io_executor().submit(self.maintain)
+
+    async def aget_tuple(self, config: RunnableConfig) -> CheckpointTuple | None:
+        """Get a checkpoint tuple without blocking the event loop."""
+        return await run_io(self.get_tuple, config)
+
+    async def alist(
+        self,
+        config: RunnableConfig | None,
+        *,
+        filter: dict[str, Any] | None = None,  # noqa: A002 matches the base signature
+        before: RunnableConfig | None = None,
+        limit: int | None = None,
+    ) -> AsyncIterator[CheckpointTuple]:
+        """List checkpoints without blocking the event loop."""
+        tuples = await run_io(
+            lambda: list(self.list(config, filter=filter, before=before, limit=limit))
+        )
+        for checkpoint_tuple in tuples:
+            yield checkpoint_tuple
+
+    async def aput(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        """Save a checkpoint without blocking the event loop."""
+        return await run_io(self.put, config, checkpoint, metadata, new_versions)
+
+    async def aput_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[tuple[str, Any]],
+        task_id: str,
+        task_path: str = "",
+    ) -> None:
+        """Store intermediate writes without blocking the event loop."""
+        await run_io(self.put_writes, config, writes, task_id, task_path)
+
+    async def adelete_thread(self, thread_id: str) -> None:
+        """Delete a thread without blocking the event loop."""
+        await run_io(self.delete_thread, thread_id)
+
+    async def aget_delta_channel_history(
+        self, *, config: RunnableConfig, channels: Sequence[str]
+    ) -> Mapping[str, Any]:
+        """Read delta channel history without blocking the event loop."""
+        return await run_io(
+            lambda: self.get_delta_channel_history(config=config, channels=channels)
+        )
+
+
+def _env_float(name: str, default: float) -> float:
+    value = os.getenv(name)
+    return float(value) if value not in (None, "") else default
+
+
+def build_checkpointer() -> BaseCheckpointSaver:
+    """Build the checkpointer selected by the ``OWNIT_CHECKPOINT*`` variables."""
+    backend = os.getenv("OWNIT_CHECKPOINTER", "sqlite").lower()
+    if backend == "memory":
+        return InMemorySaver()
+    if backend != "sqlite":
+        raise ValueError(f"Unknown checkpointer backend: {backend!r}")
+
+    path = os.getenv("OWNIT_CHECKPOINT_DB", DEFAULT_CHECKPOINT_DB)
+    ttl_hours = _env_float("OWNIT_CHECKPOINT_TTL_HOURS", 7 * 24)
+    maintenance_minutes = _env_float("OWNIT_CHECKPOINT_MAINTENANCE_MINUTES", 60)
+    logging.info(f"Using SQLite checkpointer at {path}")
+    return RetainingSqliteSaver.from_path(
+        path,
+        keep_last=int(_env_float("OWNIT_CHECKPOINT_KEEP_LAST", 20)),
+        thread_ttl=ttl_hours * 3600 or None,
+        maintenance_interval=maintenance_minutes * 60 or None,
+    )
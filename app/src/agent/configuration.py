@@ -9,6 +9,7 @@ from langchain_core.runnables import ensure_config
 from langgraph.config import get_config
 
 from agent import prompts
+from agent.printing import DEFAULT_STRIP_ROWS, PRINT_WIDTHS_CM
 
 
 @dataclass(kw_only=True)
@@ -31,6 +32,242 @@ class Configuration:
         },
     )
 
+    context_token_budget: int = field(
+        default=8000,
+        metadata={
+            "description": "Tokens of conversation history sent to the model per call. "
+            "Longer threads are compacted: old tool outputs and superseded image prompts "
+            "are elided first, then the oldest turns are dropped. 0 disables compaction."
+        },
+    )
+
+    context_keep_recent: int = field(
+        default=8,
+        metadata={
+            "description": "Latest messages that are always sent to the model in full."
+        },
+    )
+
+    artifact_store_dir: str = field(
+        default="artifacts",
+        metadata={
+            "description": "Directory of the content-addressed store that holds generated "
+            "image bytes. The graph state only keeps references into it."
+        },
+    )
+
+    generation_cache_dir: str = field(
+        default="generation_cache",
+        metadata={
+            "description": "Directory of the local cache of generated images, keyed by "
+            "the generation parameters and the normalized prompt."
+        },
+    )
+
+    generation_cache_ttl_hours: float = field(
+        default=24,
+        metadata={
+            "description": "Hours a cached generation is served before the prompt is "
+            "sent to the image API again. 0 disables the cache."
+        },
+    )
+
+    generation_cache_max_mb: float = field(
+        default=512,
+        metadata={
+            "description": "Size of the generation cache above which the least recently "
+            "used images are evicted."
+        },
+    )
+
+    save_local_images: bool = field(
+        default=True,
+        metadata={
+            "description": "Also write generated images under images/<email>/. The copies "
+            "are written in the background of the artifact store and GCS upload; "
+            "select_variant needs them, production falls back to the store."
+        },
+    )
+
+    gcs_upload_concurrency: int = field(
+        default=8,
+        metadata={
+            "description": "Maximum number of concurrent GCS uploads per event loop."
+        },
+    )
+
+    gcs_upload_retries: int = field(
+        default=3,
+        metadata={
+            "description": "How many times a transient GCS upload failure is retried."
+        },
+    )
+
+    gcs_retry_backoff: float = field(
+        default=0.5,
+        metadata={
+            "description": "Base delay in seconds before the first upload retry; it doubles "
+            "on each further attempt."
+        },
+    )
+
+    keying_threshold: float = field(
+        default=30,
+        metadata={
+            "description": "Brightness (0-255) below which pixels of a production file "
+            "are made transparent."
+        },
+    )
+
+    keying_feather: float = field(
+        default=0,
+        metadata={
+            "description": "Width of the soft alpha ramp above the keying threshold. "
+            "0 gives a hard cut-out."
+        },
+    )
+
+    print_dpi: int = field(
+        default=300,
+        metadata={
+            "description": "Resolution of production files. Designs are upscaled to the "
+            "print width of the ordered talle at this DPI. 0 keeps the generated size."
+        },
+    )
+
+    print_widths_cm: dict[str, float] = field(
+        default_factory=lambda: dict(PRINT_WIDTHS_CM),
+        metadata={
+            "description": "Print width in centimetres of each talle (lowercase). Only "
+            "these talles can be ordered."
+        },
+    )
+
+    print_strip_rows: int = field(
+        default=DEFAULT_STRIP_ROWS,
+        metadata={
+            "description": "Rows of a production file rendered at a time. Bounds the "
+            "memory a render takes, whatever the print size."
+        },
+    )
+
+    gang_sheet_width_cm: float = field(
+        default=55.88,
+        metadata={
+            "description": "Width of the DTF roll gang sheets are printed on (22 in)."
+        },
+    )
+
+    gang_sheet_max_length_cm: float = field(
+        default=100,
+        metadata={
+            "description": "Longest gang sheet cut from the roll. Sheets end below their "
+            "lowest file, so most are shorter."
+        },
+    )
+
+    gang_sheet_spacing_cm: float = field(
+        default=0.5,
+        metadata={
+            "description": "Minimum gap between files on a gang sheet, and between files "
+            "and the sheet edges, left for cutting."
+        },
+    )
+
+    gang_sheet_allow_rotation: bool = field(
+        default=True,
+        metadata={
+            "description": "Whether files may be turned 90 degrees on a gang sheet."
+        },
+    )
+
+    gang_sheet_dir: str = field(
+        default="gang_sheets",
+        metadata={
+            "description": "Directory gang sheets and their manifests are written to."
+        },
+    )
+
+    prekey_cache_size: int = field(
+        default=32,
+        metadata={
+            "description": "Designs keyed speculatively when a thread enters the finishing "
+            "state and kept for production, per process. 0 disables pre-keying."
+        },
+    )
+
+    render_mockups: bool = field(
+        default=True,
+        metadata={
+            "description": "Whether the finishing state previews every design on the "
+            "garment of each product type, as mockup artifacts."
+        },
+    )
+
+    production_queue_path: str = field(
+        default="production_jobs.sqlite",
+        metadata={
+            "description": "SQLite database of the production job queue. Processes that "
+            "share it share the queue."
+        },
+    )
+
+    production_workers: int = field(
+        default=2,
+        metadata={
+            "description": "Production jobs each process runs at once. Read once, when "
+            "the workers are started."
+        },
+    )
+
+    production_max_attempts: int = field(
+        default=5,
+        metadata={
+            "description": "Attempts made at a production job before it is marked failed."
+        },
+    )
+
+    production_retry_backoff: float = field(
+        default=2.0,
+        metadata={
+            "description": "Base delay in seconds before a failed production job is "
+            "retried; it doubles on each further attempt."
+        },
+    )
+
+    max_image_variants: int = field(
+        default=4,
+        metadata={
+            "description": "Upper bound on the number of variants a single create_image "
+            "call may generate."
+        },
+    )
+
+    max_parallel_tool_calls: int = field(
+        default=4,
+        metadata={
+            "description": "Maximum number of tool calls from a single model turn "
+            "that the tools node runs concurrently."
+        },
+    )
+
+    io_pool_size: int = field(
+        default=16,
+        metadata={
+            "description": "Number of threads used for blocking I/O such as file writes "
+            "and GCS uploads. Read once, when the pool is first used."
+        },
+    )
+
+    cpu_pool_size: int = field(
+        default=2,
+        metadata={
+            "description": "Number of worker processes used for CPU-bound image work. "
+            "0 runs that work on the I/O thread pool instead. Read once, when the "
+            "pool is first used."
+        },
+    )
+
     # max_search_results: int = field(
     #     default=5,
     #     metadata={
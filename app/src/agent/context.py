@@ -0,0 +1,222 @@
+"""Keep the model context of long design conversations within a token budget.
+
+The graph state keeps the whole thread, but the model does not need all of
+it: early turns, old ``create_image_prompt`` outputs and superseded image
+prompts only cost input tokens and latency on every call. When a thread's
+history exceeds the budget, `ContextCompactor` trims it in three steps, each
+only as far as needed:
+
+1. Outputs of old tool calls are replaced by a short placeholder.
+2. Image prompts of old ``create_image`` calls are elided; the latest one is
+   always kept because the next iteration edits it.
+3. The oldest whole turns are dropped, up to the turn with the latest
+   ``create_image`` call. A note listing the design numbers generated in
+   them is added to the start of the first turn kept.
+
+The most recent messages are never touched, and a tool call is never
+separated from its result. Threads under the budget are sent unchanged, so
+their prompt prefix stays cacheable.
+"""
+
+from __future__ import annotations
+
+import functools
+import json
+import logging
+import threading
+from collections import OrderedDict
+from collections.abc import Callable, Sequence
+from typing import Any
+
+import tiktoken
+from langchain_core.messages import (
+    AIMessage,
+    BaseMessage,
+    HumanMessage,
+    ToolMessage,
+)
+
+from agent.utils import get_message_text
+
+# Fixed per-message cost of the chat format (role, separators).
+MESSAGE_OVERHEAD_TOKENS = 4
+# Tool outputs shorter than this are cheaper to keep than to explain away.
+MIN_STUB_TOKENS = 40
+ELIDED_PROMPT = "[prompt omitido; ver el diseño más reciente]"
+# Message ids whose token counts are remembered per compactor.
+TOKEN_CACHE_SIZE = 4096
+
+
+@functools.lru_cache(maxsize=1)
+def _encoding() -> Any:
+    """Return the tiktoken encoding, or None if it cannot be loaded offline."""
+    try:
+        return tiktoken.get_encoding("o200k_base")
+    except Exception as e:
+        logging.warning(f"tiktoken unavailable ({e}); estimating tokens from length")
+        return None
+
+
+def count_text_tokens(text: str) -> int:
+    """Count the tokens of `text`, estimating 4 characters per token without tiktoken."""
+    encoding = _encoding()
+    if encoding is None:
+        return (len(text) + 3) // 4
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+class ContextCompactor:
+    """Trims message histories to a token budget.
+
+    Token counts are cached per message id, so each message is tokenized once
+    however many times the thread is sent to the model.
+
+    Args:
+        budget (int): Maximum tokens of history sent to the model.
+        keep_recent (int): Number of latest messages that are never compacted.
+        count_text (Callable[[str], int]): Token counter for a piece of text.
+    """
+
+    def __init__(
+        self,
+        budget: int,
+        keep_recent: int,
+        count_text: Callable[[str], int] = count_text_tokens,
+    ) -> None:
+        self.budget = budget
+        self.keep_recent = keep_recent
+        self.count_text = count_text
+        self._counts: OrderedDict[str, int] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _measure(self, message: BaseMessage) -> int:
+        text = get_message_text(message)
+        if isinstance(message, AIMessage) and message.tool_calls:
+            text += json.dumps(
+                [tc["args"] for tc in message.tool_calls], ensure_ascii=False
+            )
+        return self.count_text(text) + MESSAGE_OVERHEAD_TOKENS
+
+    def count(self, message: BaseMessage) -> int:
+        """Return the tokens of `message`, tokenizing it only the first time."""
+        if message.id is None:
+            return self._measure(message)
+        with self._lock:
+            if message.id in self._counts:
+                self._counts.move_to_end(message.id)
+                return self._counts[message.id]
+        tokens = self._measure(message)
+        with self._lock:
+            self._counts[message.id] = tokens
+            while len(self._counts) > TOKEN_CACHE_SIZE:
+                self._counts.popitem(last=False)
+        return tokens
+
+    def _replace_count(
+        self, counts: list[int], index: int, message: BaseMessage
+    ) -> int:
+        """Store the count of a rewritten message and return the change."""
+        tokens = self._measure(message)
+        delta = tokens - counts[index]
+        counts[index] = tokens
+        return delta
+
+    def compact(self, messages: Sequence[BaseMessage]) -> list[BaseMessage]:
+        """Return `messages` trimmed to the budget. The input is not modified."""
+        counts = [self.count(m) for m in messages]
+        total = sum(counts)
+        if total <= self.budget:
+            return list(messages)
+
+        out = list(messages)
+        protected = _turn_safe_start(out, len(out) - self.keep_recent)
+
+        # 1. Replace old tool outputs with a placeholder.
+        for i in range(protected):
+            if total <= self.budget:
+                break
+            message = out[i]
+            if isinstance(message, ToolMessage) and counts[i] > MIN_STUB_TOKENS:
+                stub = f"[Resultado anterior de {message.name or 'la herramienta'} omitido]"
+                out[i] = message.model_copy(update={"content": stub})
+                total += self._replace_count(counts, i, out[i])
+
+        # 2. Elide the prompts of superseded create_image calls.
+        latest = max((i for i, m in enumerate(out) if _image_calls(m)), default=None)
+        for i in range(protected):
+            if total <= self.budget:
+                break
+            if i == latest or not _image_calls(out[i]):
+                continue
+            message = out[i]
+            tool_calls = [
+                {**tc, "args": {**tc["args"], "prompt": ELIDED_PROMPT}}
+                if tc["name"] == "create_image"
+                else tc
+                for tc in message.tool_calls  # type: ignore attribute checked by _image_calls
+            ]
+            out[i] = message.model_copy(update={"tool_calls": tool_calls})
+            total += self._replace_count(counts, i, out[i])
+
+        # 3. Drop the oldest whole turns, keeping track of their designs. The
+        # turn with the latest create_image call stays, so it can be edited.
+        cut = 0
+        last_start = min(protected, len(out) - 1)
+        if latest is not None:
+            last_start = min(last_start, latest)
+        turn_starts = [
+            i for i in range(1, last_start + 1) if isinstance(out[i], HumanMessage)
+        ]
+        for start in turn_starts:
+            if total <= self.budget:
+                break
+            total -= sum(counts[cut:start])
+            cut = start
+        if cut == 0:
+            return out
+
+        designs = sorted(
+            {
+                tc["args"].get("image_number")
+                for m in out[:cut]
+                for tc in _image_calls(m)
+                if tc["args"].get("image_number") is not None
+            }
+        )
+        note = f"[Se omitieron {cut} mensajes anteriores de la conversación."
+        if designs:
+            note += f" Diseños ya generados: {', '.join(str(d) for d in designs)}."
+        logging.info(f"Compacted context: dropped {cut} messages, ~{total} tokens left")
+        # The note leads the first kept turn rather than being a system message
+        # of its own: providers accept a single system message, sent first.
+        return [_with_leading_note(out[cut], note + "]"), *out[cut + 1 :]]
+
+
+def _image_calls(message: BaseMessage) -> list[dict]:
+    """Return the create_image tool calls of a message."""
+    if not isinstance(message, AIMessage):
+        return []
+    return [tc for tc in message.tool_calls if tc["name"] == "create_image"]
+
+
+def _with_leading_note(message: BaseMessage, note: str) -> BaseMessage:
+    """Return a copy of `message` with `note` added before its content."""
+    if isinstance(message.content, str):
+        content: str | list = f"{note}\n\n{message.content}"
+    else:
+        content = [{"type": "text", "text": note}, *message.content]
+    return message.model_copy(update={"content": content})
+
+
+def _turn_safe_start(messages: list[BaseMessage], index: int) -> int:
+    """Move `index` back so it does not split a tool call from its results."""
+    index = max(0, index)
+    while 0 < index < len(messages) and isinstance(messages[index], ToolMessage):
+        index -= 1
+    return index
+
+
+@functools.lru_cache(maxsize=4)
+def get_context_compactor(budget: int, keep_recent: int) -> ContextCompactor:
+    """Return the process-wide compactor for these settings."""
+    return ContextCompactor(budget, keep_recent)
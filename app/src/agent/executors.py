@@ -0,0 +1,168 @@
+"""Bounded executors for blocking tool work.
+
+Graph nodes are coroutines that share one event loop per process, so any
+synchronous call made inline (file I/O, GCS uploads, image processing) stalls
+every other thread served by that process. Blocking work is pushed to one of
+two process-wide pools instead:
+
+- an I/O thread pool for network and disk calls, and
+- a CPU process pool for pixel work that holds the GIL.
+
+Both pools are created lazily and sized from `Configuration` the first time
+they are used; `warm_cpu_pool` starts the CPU pool ahead of the first turn.
+Modules whose CPU work needs per-process setup register it with
+`register_cpu_initializer`, and each worker runs it as it starts.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import functools
+import logging
+import multiprocessing
+import threading
+import time
+from collections.abc import Callable
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, TypeVar
+
+from agent import instrumentation
+from agent.configuration import Configuration
+
+T = TypeVar("T")
+
+_lock = threading.Lock()
+_io_executor: ThreadPoolExecutor | None = None
+_cpu_executor: ProcessPoolExecutor | None = None
+_cpu_initializers: list[tuple[Callable[[], None], Callable[[Configuration], bool]]] = []
+
+
+def register_cpu_initializer(
+    func: Callable[[], None],
+    enabled: Callable[[Configuration], bool] = lambda _: True,
+) -> None:
+    """Have every CPU pool worker call `func` as it starts.
+
+    Register before the pool starts; workers already running do not call it.
+
+    Args:
+        func (Callable[[], None]): A module-level function, so it pickles.
+        enabled (Callable[[Configuration], bool]): Whether the configuration
+            the pool is started with needs `func`.
+    """
+    with _lock:
+        _cpu_initializers.append((func, enabled))
+
+
+def _enabled_initializers(
+    configuration: Configuration,
+) -> tuple[Callable[[], None], ...]:
+    """Return the registered initializers the configuration needs."""
+    with _lock:
+        return tuple(f for f, enabled in _cpu_initializers if enabled(configuration))
+
+
+def _initialize_worker(initializers: tuple[Callable[[], None], ...]) -> None:
+    """Run the initializers of a CPU pool worker."""
+    for initializer in initializers:
+        initializer()
+
+
+def get_io_executor() -> ThreadPoolExecutor:
+    """Return the shared thread pool used for blocking I/O."""
+    global _io_executor  # noqa: PLW0603
+    with _lock:
+        if _io_executor is None:
+            workers = Configuration.from_context().io_pool_size
+            _io_executor = ThreadPoolExecutor(
+                max_workers=workers, thread_name_prefix="ownit-io"
+            )
+            logging.info(f"Started I/O thread pool with {workers} workers")
+        return _io_executor
+
+
+def get_cpu_executor() -> Executor:
+    """Return the shared pool used for CPU-bound image work.
+
+    A `cpu_pool_size` of 0 disables the process pool and falls back to the
+    I/O thread pool, which still keeps the event loop free.
+    """
+    global _cpu_executor  # noqa: PLW0603
+    configuration = Configuration.from_context()
+    initializers = _enabled_initializers(configuration)
+    with _lock:
+        if _cpu_executor is None:
+            workers = configuration.cpu_pool_size
+            if workers > 0:
+                # "spawn" avoids forking a process that is already running
+                # the Streamlit and executor threads.
+                _cpu_executor = ProcessPoolExecutor(
+                    max_workers=workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_initialize_worker,
+                    initargs=(initializers,),
+                )
+                logging.info(f"Started CPU process pool with {workers} workers")
+        cpu_executor = _cpu_executor
+    return cpu_executor or get_io_executor()
+
+
+def _timed_call(submitted_at: float, call: Callable[[], T]) -> tuple[float, T]:
+    """Run `call` in a worker and return how long it was queued, with its result."""
+    return time.time() - submitted_at, call()
+
+
+async def _submit(pool: str, executor: Executor, call: Callable[[], T]) -> T:
+    """Run `call` on `executor`, recording its queue wait when instrumented."""
+    loop = asyncio.get_running_loop()
+    if not instrumentation.enabled():
+        return await loop.run_in_executor(executor, call)
+    # Wall clock, not perf_counter: process pool workers have their own.
+    queued, result = await loop.run_in_executor(
+        executor, functools.partial(_timed_call, time.time(), call)
+    )
+    instrumentation.record_queue_wait(pool, queued)
+    return result
+
+
+async def run_io(func: Callable[..., T], /, *args: Any, **kwargs: Any) -> T:
+    """Run a blocking I/O call on the I/O thread pool and await its result."""
+    return await _submit(
+        "io", get_io_executor(), functools.partial(func, *args, **kwargs)
+    )
+
+
+async def run_cpu(func: Callable[..., T], /, *args: Any, **kwargs: Any) -> T:
+    """Run a CPU-bound call on the CPU pool and await its result.
+
+    `func` and its arguments must be picklable when the process pool is on.
+    """
+    return await _submit(
+        "cpu", get_cpu_executor(), functools.partial(func, *args, **kwargs)
+    )
+
+
+async def warm_cpu_pool() -> None:
+    """Start the CPU pool workers ahead of the first turn.
+
+    Each worker runs the registered initializers as it starts; with the pool
+    off they run in this process instead.
+    """
+    configuration = Configuration.from_context()
+    initializers = _enabled_initializers(configuration)
+    workers = max(1, configuration.cpu_pool_size)
+    # A spawn pool starts a worker per task submitted while none is idle.
+    await asyncio.gather(
+        *(run_cpu(_initialize_worker, initializers) for _ in range(workers))
+    )
+
+
+def shutdown_executors(wait: bool = True) -> None:
+    """Shut down both pools. They are recreated on next use."""
+    global _io_executor, _cpu_executor  # noqa: PLW0603
+    with _lock:
+        executors = [e for e in (_io_executor, _cpu_executor) if e is not None]
+        _io_executor = None
+        _cpu_executor = None
+    for executor in executors:
+        executor.shutdown(wait=wait)
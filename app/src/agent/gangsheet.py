@@ -0,0 +1,488 @@
+"""DTF gang sheets: finished production files packed onto print sheets.
+
+The print shop prints on a roll of fixed width and cuts it to length, so
+production files are best printed many at a time, arranged on one "gang
+sheet". `compose_gang_sheets` takes the finished production jobs that are
+not on a sheet yet and:
+
+1. packs their files onto sheets with `pack_sheets`, a MaxRects packer that
+   keeps every file `spacing` pixels from its neighbours and the sheet edges
+   and may turn files by 90 degrees;
+2. composites each sheet with `compose_sheet` one strip of rows at a time,
+   streaming in the rows of the files the strip crosses, so neither a sheet
+   tens of thousands of pixels long nor the files on it are ever held in
+   memory whole;
+3. uploads each sheet with a JSON manifest of where every job went, and
+   records the sheet on its jobs.
+
+Packing and compositing only take picklable arguments and run in the CPU pool.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import os
+import time
+import uuid
+from dataclasses import asdict, dataclass, field
+
+import numpy as np
+from PIL import Image
+
+from agent.configuration import Configuration
+from agent.executors import run_cpu, run_io
+from agent.jobs import (
+    ProductionJob,
+    ProductionQueue,
+    get_production_queue,
+    render_slots,
+)
+from agent.printing import (
+    DEFAULT_STRIP_ROWS,
+    PngStreamReader,
+    PngStreamWriter,
+    print_width_px,
+)
+from agent.storage import aupload_file
+
+
+@dataclass(frozen=True)
+class Placement:
+    """Where an item goes on a sheet. `width` and `height` are as placed."""
+
+    index: int
+    x: int
+    y: int
+    width: int
+    height: int
+    rotated: bool
+
+
+@dataclass
+class PackedSheet:
+    """The items placed on one sheet and the length of roll they take."""
+
+    width: int
+    length: int = 0
+    placements: list[Placement] = field(default_factory=list)
+
+    @property
+    def utilization(self) -> float:
+        """Fraction of the sheet covered by items."""
+        used = sum(p.width * p.height for p in self.placements)
+        return used / (self.width * self.length) if self.length else 0.0
+
+
+@dataclass(frozen=True)
+class _Free:
+    x: int
+    y: int
+    width: int
+    height: int
+
+    def contains(self, other: _Free) -> bool:
+        return (
+            self.x <= other.x
+            and self.y <= other.y
+            and self.x + self.width >= other.x + other.width
+            and self.y + self.height >= other.y + other.height
+        )
+
+
+class MaxRectsBin:
+    """A MaxRects bin using the bottom-left rule, which keeps sheets short.
+
+    Args:
+        width (int): Bin width.
+        height (int): Bin height.
+    """
+
+    def __init__(self, width: int, height: int) -> None:
+        self.width = width
+        self.height = height
+        self.free = [_Free(0, 0, width, height)]
+
+    def insert(
+        self, width: int, height: int, allow_rotation: bool
+    ) -> tuple[int, int, bool] | None:
+        """Place a `width` x `height` rectangle.
+
+        Returns:
+            tuple[int, int, bool] | None: Its position and whether it was
+                rotated, or None if it does not fit.
+        """
+        best = None
+        orientations = [(width, height, False)]
+        if allow_rotation and width != height:
+            orientations.append((height, width, True))
+        for free in self.free:
+            for w, h, rotated in orientations:
+                if w <= free.width and h <= free.height:
+                    score = (free.y + h, free.x)
+                    if best is None or score < best[0]:
+                        best = (score, free.x, free.y, w, h, rotated)
+        if best is None:
+            return None
+        _, x, y, w, h, rotated = best
+        self._split(_Free(x, y, w, h))
+        return x, y, rotated
+
+    def _split(self, used: _Free) -> None:
+        """Carve `used` out of every free rectangle it overlaps."""
+        pieces = []
+        for free in self.free:
+            if (
+                used.x >= free.x + free.width
+                or used.x + used.width <= free.x
+                or used.y >= free.y + free.height
+                or used.y + used.height <= free.y
+            ):
+                pieces.append(free)
+                continue
+            if used.x > free.x:
+                pieces.append(_Free(free.x, free.y, used.x - free.x, free.height))
+            if used.x + used.width < free.x + free.width:
+                right = used.x + used.width
+                pieces.append(
+                    _Free(right, free.y, free.x + free.width - right, free.height)
+                )
+            if used.y > free.y:
+                pieces.append(_Free(free.x, free.y, free.width, used.y - free.y))
+            if used.y + used.height < free.y + free.height:
+                bottom = used.y + used.height
+                pieces.append(
+                    _Free(free.x, bottom, free.width, free.y + free.height - bottom)
+                )
+        # Drop free rectangles contained in another; larger ones are checked first.
+        pieces.sort(key=lambda r: r.width * r.height, reverse=True)
+        self.free = []
+        for piece in pieces:
+            if not any(kept.contains(piece) for kept in self.free):
+                self.free.append(piece)
+
+
+def pack_sheets(
+    sizes: list[tuple[int, int]],
+    sheet_width: int,
+    max_length: int,
+    spacing: int,
+    allow_rotation: bool = True,
+) -> tuple[list[PackedSheet], list[int]]:
+    """Pack rectangles onto as few fixed-width sheets as possible.
+
+    Items are placed largest first, each on the first sheet it fits, and
+    kept at least `spacing` apart and from the sheet edges. Each sheet is cut
+    `spacing` below its lowest item.
+
+    Args:
+        sizes (list[tuple[int, int]]): ``(width, height)`` of each item.
+        sheet_width (int): Sheet width, the width of the roll.
+        max_length (int): Longest sheet allowed.
+        spacing (int): Minimum gap around every item.
+        allow_rotation (bool): Whether items may be turned by 90 degrees.
+
+    Returns:
+        tuple[list[PackedSheet], list[int]]: The sheets, and the indexes of
+            items too large for any sheet.
+    """
+    # Every item takes its size plus one gap; the bin shrinks by the far
+    # edge's margin minus that gap, so items also keep `spacing` from edges.
+    bin_width, bin_height = sheet_width - spacing, max_length - spacing
+    order = sorted(
+        range(len(sizes)), key=lambda i: (max(sizes[i]), min(sizes[i])), reverse=True
+    )
+    bins: list[MaxRectsBin] = []
+    sheets: list[PackedSheet] = []
+    oversized = []
+    for index in order:
+        width, height = sizes[index]
+        footprint = (width + spacing, height + spacing)
+        sheet = None
+        for bin_, candidate in zip(bins, sheets, strict=True):
+            spot = bin_.insert(*footprint, allow_rotation)
+            if spot is not None:
+                sheet = candidate
+                break
+        if sheet is None:
+            bin_, sheet = MaxRectsBin(bin_width, bin_height), PackedSheet(sheet_width)
+            spot = bin_.insert(*footprint, allow_rotation)
+            if spot is None:
+                oversized.append(index)
+                continue
+            bins.append(bin_)
+            sheets.append(sheet)
+        x, y, rotated = spot
+        placed_width, placed_height = (height, width) if rotated else (width, height)
+        placement = Placement(
+            index, x + spacing, y + spacing, placed_width, placed_height, rotated
+        )
+        sheet.placements.append(placement)
+        sheet.length = max(sheet.length, placement.y + placed_height + spacing)
+    return sheets, oversized
+
+
+class _ItemRows:
+    """The rows of one placed file, read top to bottom as strips reach them.
+
+    Files are streamed with `PngStreamReader`, so only the rows of the
+    current strip are in memory. Turned files, and files the reader cannot
+    stream, are decoded whole instead.
+    """
+
+    def __init__(self, path: str, placement: Placement) -> None:
+        self.placement = placement
+        self._path = path
+        self._pixels: np.ndarray | None = None
+        self._file = None
+        self._reader = None
+        if placement.rotated:
+            self._pixels = np.rot90(_decode_rgba(path))
+            return
+        self._file = open(path, "rb")  # noqa: SIM115 closed by close()
+        try:
+            self._reader = PngStreamReader(self._file)
+        except ValueError:
+            self._fall_back()
+
+    def rows(self, first: int, last: int) -> np.ndarray:
+        """Return rows ``[first, last)`` of the file; calls must move down the file."""
+        if self._reader is not None:
+            try:
+                return self._reader.read_rows(last - first)
+            except ValueError:
+                self._fall_back()
+        return self._pixels[first:last]  # type: ignore index
+
+    def close(self) -> None:
+        """Release the file and its pixels."""
+        if self._file is not None:
+            self._file.close()
+        self._pixels = None
+
+    def _fall_back(self) -> None:
+        self.close()
+        self._reader = None
+        self._pixels = _decode_rgba(self._path)
+
+
+def compose_sheet(
+    path: str,
+    sheet: PackedSheet,
+    files: list[str],
+    dpi: int,
+    strip_rows: int = DEFAULT_STRIP_ROWS,
+) -> None:
+    """Composite placed files onto a transparent sheet PNG, strip by strip.
+
+    A file is opened when the first strip reaches it and closed after the
+    strip that passes its bottom edge, and only the rows of the current strip
+    are decoded, so memory holds one strip of the sheet and of each file
+    crossing it.
+
+    Args:
+        path (str): Output path. Written under a temporary name first.
+        sheet (PackedSheet): The sheet and its placements.
+        files (list[str]): File of each item, indexed by `Placement.index`.
+        dpi (int): Resolution recorded in the sheet.
+        strip_rows (int): Sheet rows composited at a time.
+    """
+    width, length = sheet.width, sheet.length
+    pending = sorted(
+        ((files[p.index], p) for p in sheet.placements), key=lambda i: i[1].y
+    )
+    next_item = 0
+    active: list[_ItemRows] = []
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    partial_path = f"{path}.part"
+    try:
+        with open(partial_path, "wb") as f:
+            writer = PngStreamWriter(f, width, length, dpi=dpi)
+            for top in range(0, length, strip_rows):
+                bottom = min(length, top + strip_rows)
+                while next_item < len(pending) and pending[next_item][1].y < bottom:
+                    active.append(_ItemRows(*pending[next_item]))
+                    next_item += 1
+                strip = np.zeros((bottom - top, width, 4), dtype=np.uint8)
+                for item in active:
+                    p = item.placement
+                    first, last = max(top, p.y), min(bottom, p.y + p.height)
+                    if first < last:
+                        strip[first - top : last - top, p.x : p.x + p.width] = (
+                            item.rows(first - p.y, last - p.y)
+                        )
+                writer.write_rows(strip)
+                for item in active:
+                    if item.placement.y + item.placement.height <= bottom:
+                        item.close()
+                active = [
+                    i for i in active if i.placement.y + i.placement.height > bottom
+                ]
+            writer.close()
+    finally:
+        for item in active:
+            item.close()
+    os.replace(partial_path, path)
+
+
+def _decode_rgba(path: str) -> np.ndarray:
+    """Decode a whole image to an RGBA array without intermediate copies."""
+    with Image.open(path) as img:
+        rgba = img if img.mode == "RGBA" else img.convert("RGBA")
+        rgba.load()
+        pixels = np.frombuffer(rgba.tobytes(), dtype=np.uint8)
+        return pixels.reshape(rgba.height, rgba.width, 4)
+
+
+@dataclass(frozen=True)
+class GangSheet:
+    """A composed and uploaded gang sheet."""
+
+    name: str
+    url: str
+    width: int
+    length: int
+    dpi: int
+    job_ids: list[str]
+    utilization: float
+    seconds: float
+
+    def to_dict(self) -> dict[str, object]:
+        """Return the sheet as a JSON-serializable dict."""
+        return asdict(self)
+
+
+def _image_size(path: str) -> tuple[int, int] | None:
+    """Read the pixel size of an image from its header, or None if it is missing."""
+    try:
+        with Image.open(path) as img:
+            return img.size
+    except FileNotFoundError:
+        return None
+
+
+async def compose_gang_sheets(configuration: Configuration) -> list[GangSheet]:
+    """Pack every finished production file not on a sheet yet onto new sheets.
+
+    Only files rendered at the configured ``print_dpi`` are ganged, since a
+    sheet has one resolution. The jobs are reserved for this batch first, so
+    concurrent batches, in this process or another, never share a file.
+    Each file is read from the local copy its job recorded when it was made.
+    Files that are missing or too large for a sheet are left for later.
+    """
+    dpi = configuration.print_dpi
+    if dpi <= 0:
+        raise ValueError("Gang sheets need production files rendered at print_dpi > 0")
+    queue = await run_io(get_production_queue, configuration)
+    batch = f"gang-{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:6]}"
+    jobs = await run_io(queue.claim_for_gang, dpi, batch)
+    try:
+        return await _compose(jobs, batch, queue, configuration)
+    finally:
+        await run_io(queue.release_gang, batch)
+
+
+async def _compose(
+    jobs: list[ProductionJob],
+    batch: str,
+    queue: ProductionQueue,
+    configuration: Configuration,
+) -> list[GangSheet]:
+    dpi = configuration.print_dpi
+    paths, sizes, ganged = [], [], []
+    for job in jobs:
+        path = job.result_path
+        size = None if path is None else await run_io(_image_size, path)
+        if size is None:
+            logging.warning(
+                f"Production file of job {job.id} is missing, not ganged: {path}"
+            )
+            continue
+        paths.append(path)
+        sizes.append(size)
+        ganged.append(job)
+    if not ganged:
+        return []
+
+    start = time.perf_counter()
+    sheet_width = print_width_px(configuration.gang_sheet_width_cm, dpi)
+    sheets, oversized = await run_cpu(
+        pack_sheets,
+        sizes,
+        sheet_width,
+        print_width_px(configuration.gang_sheet_max_length_cm, dpi),
+        print_width_px(configuration.gang_sheet_spacing_cm, dpi),
+        configuration.gang_sheet_allow_rotation,
+    )
+    for index in oversized:
+        logging.warning(
+            f"Production file of job {ganged[index].id} is larger than a sheet"
+        )
+    logging.info(
+        f"Packed {len(ganged) - len(oversized)} files onto {len(sheets)} sheets"
+    )
+
+    results = []
+    for number, sheet in enumerate(sheets, start=1):
+        sheet_start = time.perf_counter()
+        name = f"{batch}-{number}"
+        path = os.path.join(configuration.gang_sheet_dir, f"{name}.png")
+        async with render_slots(configuration.cpu_pool_size):
+            await run_cpu(
+                compose_sheet, path, sheet, paths, dpi, configuration.print_strip_rows
+            )
+        manifest = {
+            "sheet": name,
+            "width": sheet.width,
+            "length": sheet.length,
+            "dpi": dpi,
+            "items": [
+                {
+                    "job_id": ganged[p.index].id,
+                    "email": ganged[p.index].order.email,
+                    "design_number": ganged[p.index].order.design_number,
+                    "size": ganged[p.index].order.size,
+                    "product_type": ganged[p.index].order.product_type,
+                    "x": p.x,
+                    "y": p.y,
+                    "width": p.width,
+                    "height": p.height,
+                    "rotated": p.rotated,
+                }
+                for p in sheet.placements
+            ],
+        }
+        manifest_path = os.path.join(configuration.gang_sheet_dir, f"{name}.json")
+        await run_io(_write_json, manifest_path, manifest)
+        url, _ = await asyncio.gather(
+            aupload_file(path, f"gang-sheets/{name}.png"),
+            aupload_file(manifest_path, f"gang-sheets/{name}.json", "application/json"),
+        )
+        job_ids = [ganged[p.index].id for p in sheet.placements]
+        await run_io(queue.mark_ganged, job_ids, name)
+        result = GangSheet(
+            name=name,
+            url=url,
+            width=sheet.width,
+            length=sheet.length,
+            dpi=dpi,
+            job_ids=job_ids,
+            utilization=sheet.utilization,
+            seconds=time.perf_counter() - sheet_start,
+        )
+        logging.info(
+            f"Gang sheet {name}: {len(job_ids)} files on {sheet.width}x{sheet.length},"
+            f" {result.utilization:.0%} used, {result.seconds:.2f}s"
+        )
+        results.append(result)
+    logging.info(
+        f"Composed {len(results)} gang sheets in {time.perf_counter() - start:.2f}s"
+    )
+    return results
+
+
+def _write_json(path: str, data: object) -> None:
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w") as f:
+        json.dump(data, f, indent=2)
@@ -0,0 +1,152 @@
+"""A local disk cache of generated images.
+
+Image generation is the slowest and most expensive step of a turn, and the
+same request is often sent twice: a rerun, a retried network call, a double
+submit, or the model re-emitting an identical prompt while iterating. Results
+are cached on disk under a key derived from the generation parameters and the
+normalized prompt, with a TTL and a total size bound enforced by LRU eviction.
+
+Each entry is one PNG file. Its modification time records when it was
+generated (for the TTL) and its access time when it was last served (for the
+LRU order); both are set explicitly, so mount options such as ``noatime`` do
+not matter.
+"""
+
+from __future__ import annotations
+
+import contextlib
+import functools
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+import unicodedata
+
+
+def normalize_prompt(prompt: str) -> str:
+    """Normalize a prompt so trivially different spellings share an entry.
+
+    Unicode is NFC-normalized and runs of whitespace, including newlines and
+    indentation, collapse to single spaces. Case is kept: it changes the text
+    rendered in the design.
+    """
+    return " ".join(unicodedata.normalize("NFC", prompt).split())
+
+
+class GenerationCache:
+    """A TTL and size-bounded LRU cache of generated images on local disk.
+
+    Args:
+        root (str): Directory holding the cached files.
+        ttl (float): Seconds an entry stays valid after it was generated.
+        max_bytes (int): Total size above which the least recently used
+            entries are evicted.
+    """
+
+    def __init__(self, root: str, ttl: float, max_bytes: int) -> None:
+        self.root = root
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(prompt: str, variant: int = 1, **params: str) -> str:
+        """Return the cache key of one generated image.
+
+        Args:
+            prompt (str): The generation prompt; normalized before hashing.
+            variant (int): Which of several images for the same request.
+            **params (str): Model parameters such as model, size, style and quality.
+        """
+        payload = json.dumps(
+            {"prompt": normalize_prompt(prompt), "variant": variant, **params},
+            sort_keys=True,
+            ensure_ascii=False,
+        )
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.root, key[:2], f"{key}.png")
+
+    def get(self, key: str) -> bytes | None:
+        """Return the cached image for `key`, or None on a miss or expiry."""
+        path = self._path(key)
+        try:
+            generated_at = os.stat(path).st_mtime
+            if time.time() - generated_at > self.ttl:
+                os.unlink(path)
+                raise FileNotFoundError(path)
+            with open(path, "rb") as f:
+                data = f.read()
+            # Mark as recently used, keeping the generation time for the TTL.
+            os.utime(path, (time.time(), generated_at))
+        except FileNotFoundError:
+            with self._lock:
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+        return data
+
+    def put(self, key: str, data: bytes | memoryview) -> None:
+        """Store an image under `key`, then evict down to `max_bytes`."""
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+        self.evict()
+
+    def evict(self) -> int:
+        """Delete expired entries and LRU entries beyond `max_bytes`. Returns the count."""
+        now = time.time()
+        entries = []
+        with os.scandir(self.root) as shards:
+            for shard in shards:
+                if not shard.is_dir():
+                    continue
+                with os.scandir(shard.path) as files:
+                    entries.extend(
+                        (f.stat().st_atime, f.stat().st_mtime, f.stat().st_size, f.path)
+                        for f in files
+                        if f.name.endswith(".png")
+                    )
+
+        evicted = 0
+        total = sum(size for _, _, size, _ in entries)
+        for _last_used, generated_at, size, path in sorted(entries):
+            if now - generated_at <= self.ttl and total <= self.max_bytes:
+                continue
+            with contextlib.suppress(FileNotFoundError):
+                os.unlink(path)
+            total -= size
+            evicted += 1
+        if evicted:
+            logging.info(f"Evicted {evicted} cached generations")
+        return evicted
+
+    def stats(self) -> dict[str, float]:
+        """Return the hit and miss counts and the hit ratio."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+            }
+
+
+@functools.lru_cache(maxsize=4)
+def get_generation_cache(root: str, ttl: float, max_bytes: int) -> GenerationCache:
+    """Return the process-wide cache for these settings."""
+    return GenerationCache(root, ttl, max_bytes)
@@ -3,37 +3,64 @@
 Works with a chat model with tool calling support.
 """
 
-import base64
+import asyncio
 import logging
 import os
-import re
-from datetime import UTC, datetime
+import weakref
+from collections import OrderedDict
 from typing import Any, Literal, cast
 
 from dotenv import load_dotenv
-from langchain_core.messages import AIMessage, ToolMessage
-from langgraph.checkpoint.memory import InMemorySaver
+from langchain_core.messages import AIMessage, BaseMessage, ToolCall, ToolMessage
+from langgraph.config import get_config
 from langgraph.graph import END, START, StateGraph
 
+from agent.artifacts import get_artifact_store
+from agent.checkpointing import build_checkpointer
 from agent.configuration import Configuration
+from agent.context import get_context_compactor
+from agent.executors import register_cpu_initializer, run_cpu, run_io
+from agent.imaging import ImageHandle
+from agent.instrumentation import instrument_node, record_tokens, span
+from agent.jobs import (
+    DONE,
+    ProductionOrder,
+    ensure_production_workers,
+    get_production_queue,
+)
+from agent.mockups import PRODUCT_TYPES, render_mockups, warm_templates
+from agent.plan import ainvoke_with_plan
+from agent.prekeying import get_prekeyer, key_design, prekey_key
+from agent.prompting import build_model_messages, log_prompt_cache_usage
 from agent.prompts import FINISHING_PROMPT
 from agent.state import InputState, State
+from agent.storage import aupload_bytes
 from agent.tools import (
     TOOLS,
-    convert_black_to_transparent,  # Helper
     execute_production_file,
     finalize_design,
-    upload_to_gcs,  # Helper
 )
-from agent.utils import load_chat_model
+from agent.utils import get_chat_model, read_file, write_file
 
 load_dotenv()
 
-memory = InMemorySaver()
+memory = build_checkpointer()
+# Mockups render in the CPU pool; its workers build the garment templates as
+# they start, so no render waits for them.
+register_cpu_initializer(warm_templates, lambda c: c.render_mockups)
+
+FINISHING_TOOLS = [execute_production_file, finalize_design]
 
 
-configuration = Configuration.from_context()
-model = load_chat_model(configuration.model).bind_tools(TOOLS)
+def _model_history(state: State, configuration: Configuration) -> list[BaseMessage]:
+    """Return the thread history to send to the model, compacted to the budget."""
+    if configuration.context_token_budget <= 0:
+        return list(state.messages)
+    compactor = get_context_compactor(
+        configuration.context_token_budget, configuration.context_keep_recent
+    )
+    return compactor.compact(state.messages)
+
 
 async def call_model(state: State) -> dict[str, Any]:
     """
@@ -41,40 +68,15 @@ async def call_model(state: State) -> dict[str, Any]:
     calling the model and attaches the image to the final response.
     """
     configuration = Configuration.from_context()
-    model = load_chat_model(configuration.model).bind_tools(TOOLS)
-    system_message = configuration.system_prompt.format(
-        system_time=datetime.now(tz=UTC).isoformat()
-    )
-
-    response = cast(
-        AIMessage,
-        await model.ainvoke(
-            [{"role": "system", "content": system_message}, *state.messages]
-        ),
-    )
+    model = get_chat_model(configuration.model, TOOLS)
 
-    user_facing_content = response.content
-    internal_plan = None
-
-    new_response_metadata = response.response_metadata or {}
-
-    if isinstance(user_facing_content, str):
-        match = re.search(r"<Plan>(.*?)</Plan>(.*)", user_facing_content, re.DOTALL)
-        if match:
-            internal_plan = match.group(1).strip()
-            user_facing_content = match.group(2).strip()
-            new_response_metadata["internal_plan"] = internal_plan
-
-    cleaned_response = AIMessage(
-        content=user_facing_content,
-        id=response.id,
-        tool_calls=response.tool_calls,
-        name=getattr(response, "name", None),
-        invalid_tool_calls=getattr(response, "invalid_tool_calls", None),
-        tool_call_chunks=getattr(response, "tool_call_chunks", None),
-        usage_metadata=getattr(response, "usage_metadata", None),
-        response_metadata=new_response_metadata,
+    # Static system prompt first so OpenAI can reuse the cached prefix.
+    history = _model_history(state, configuration)
+    cleaned_response = await ainvoke_with_plan(
+        model, build_model_messages(configuration.system_prompt, history)
     )
+    log_prompt_cache_usage(cleaned_response.usage_metadata)
+    record_tokens("call_model", cleaned_response.usage_metadata)
 
     if state.is_last_step and cleaned_response.tool_calls:
         return {
@@ -89,56 +91,166 @@ async def call_model(state: State) -> dict[str, Any]:
     return {"messages": [cleaned_response]}
 
 
+def _thread_id() -> str | None:
+    """Return the thread_id of the current run, if any."""
+    try:
+        return get_config().get("configurable", {}).get("thread_id")
+    except RuntimeError:
+        return None
+
+
+def _start_prekeying(state: State, configuration: Configuration) -> int:
+    """Start keying every design of the thread in the background.
+
+    Newest designs go first, as they are the most likely to be chosen.
+    Designs already keyed or in progress are skipped. Returns how many
+    jobs were started.
+    """
+    if configuration.prekey_cache_size <= 0:
+        return 0
+    store = get_artifact_store(configuration.artifact_store_dir)
+    prekeyer = get_prekeyer(configuration.prekey_cache_size)
+    thread_id = _thread_id()
+
+    threshold, feather = configuration.keying_threshold, configuration.keying_feather
+
+    async def key_artifact(ref: str) -> bytes:
+        return await key_design(await run_io(store.get, ref), threshold, feather)
+
+    refs = dict.fromkeys(
+        a["ref"] for a in reversed(state.artifacts) if a.get("type") == "image"
+    )
+    started = sum(
+        prekeyer.schedule(
+            prekey_key(ref, threshold, feather),
+            lambda ref=ref: key_artifact(ref),
+            thread_id,
+        )
+        for ref in refs
+    )
+    if started:
+        logging.info(f"Pre-keying {started} candidate designs")
+    return started
+
+
+# Mockup renders of each event loop, by thread and design ref, least recently
+# used first. A thread that leaves the finishing state never collects its
+# renders, so past `MOCKUP_RENDERS_KEPT` the oldest are dropped; a dropped
+# design is rendered again if its thread comes back.
+MOCKUP_RENDERS_KEPT = 256
+_mockup_renders: weakref.WeakKeyDictionary[
+    asyncio.AbstractEventLoop,
+    OrderedDict[tuple[str | None, str], asyncio.Task[list[dict[str, Any]]]],
+] = weakref.WeakKeyDictionary()
+
+
+def _unpreviewed_designs(state: State) -> dict[str, dict[str, Any]]:
+    """Return the design artifacts of the thread without mockups, by ref."""
+    previewed = {a["source"] for a in state.artifacts if a.get("type") == "mockup"}
+    return {
+        a["ref"]: a
+        for a in state.artifacts
+        if a.get("type") == "image" and a["ref"] not in previewed
+    }
+
+
+async def _render_design_mockups(
+    design: dict[str, Any], configuration: Configuration
+) -> list[dict[str, Any]]:
+    """Preview a design on the garment of each product type.
+
+    A design that fails to render only loses its mockups. Returns the mockup
+    artifacts.
+    """
+    store = get_artifact_store(configuration.artifact_store_dir)
+    try:
+        mockups = await run_cpu(
+            render_mockups,
+            await run_io(store.get, design["ref"]),
+            PRODUCT_TYPES,
+            configuration.keying_threshold,
+            configuration.keying_feather,
+        )
+        refs = await asyncio.gather(*(run_io(store.put, m) for m in mockups))
+    except Exception:
+        logging.exception(f"Could not render mockups of {design['ref']}")
+        return []
+    labels = {k: design[k] for k in ("image_number", "variant") if k in design}
+    return [
+        {"type": "mockup", "ref": ref, "source": design["ref"], "product_type": p, **labels}
+        for p, ref in zip(PRODUCT_TYPES, refs, strict=True)
+    ]
+
+
+def _start_mockups(state: State, configuration: Configuration) -> int:
+    """Start previewing every design of the thread in the background.
+
+    Designs previewed or being previewed are skipped. Returns how many
+    renders were started.
+    """
+    if not configuration.render_mockups:
+        return 0
+    renders = _mockup_renders.setdefault(asyncio.get_running_loop(), OrderedDict())
+    thread_id = _thread_id()
+    started = 0
+    for ref, design in _unpreviewed_designs(state).items():
+        if (thread_id, ref) in renders:
+            renders.move_to_end((thread_id, ref))
+            continue
+        renders[thread_id, ref] = asyncio.create_task(
+            _render_design_mockups(design, configuration)
+        )
+        started += 1
+    while len(renders) > MOCKUP_RENDERS_KEPT:
+        _, task = renders.popitem(last=False)
+        task.cancel()
+    return started
+
+
+def _finished_mockups(state: State) -> list[dict[str, Any]]:
+    """Return the mockup artifacts of the thread rendered since the last turn.
+
+    Renders still running are left to be attached by a later turn. Finished
+    renders of designs the thread has already previewed are discarded.
+    """
+    renders = _mockup_renders.get(asyncio.get_running_loop())
+    if not renders:
+        return []
+    thread_id = _thread_id()
+    unpreviewed = _unpreviewed_designs(state)
+    mockups = []
+    for key, task in list(renders.items()):
+        if key[0] != thread_id or not task.done():
+            continue
+        del renders[key]
+        if key[1] in unpreviewed and not task.cancelled():
+            mockups.extend(task.result())
+    return mockups
+
+
 async def call_finishing_model(state: State) -> dict[str, Any]:
     """
     Call the LLM (Finishing state). It uses the simple FINISHING_PROMPT.
+
+    On entry, each design is previewed on every product type in the
+    background, so the user sees the garments before choosing one; the
+    previews rendered by the time the model answers are attached to this
+    turn, the others to the next one. Every design of the thread also starts
+    being keyed for production, after the previews so their renders are
+    queued first.
     """
     configuration = Configuration.from_context()
-    FINISHING_TOOLS = [execute_production_file, finalize_design]
-    model = load_chat_model(configuration.model).bind_tools(FINISHING_TOOLS)
-    # --- Use the new prompt ---
-    system_message = FINISHING_PROMPT.format(
-        system_time=datetime.now(tz=UTC).isoformat()
-    )
+    _start_mockups(state, configuration)
+    _start_prekeying(state, configuration)
+    model = get_chat_model(configuration.model, FINISHING_TOOLS)
 
-    # Get the model's response
-    response = cast(
-        AIMessage,
-        await model.ainvoke(
-            [{"role": "system", "content": system_message}, *state.messages]
-        ),
-    )
-
-    # --- (This logic is identical to call_model) ---
-    user_facing_content = response.content
-    internal_plan = None
-
-    # Start with existing metadata, or an empty dict
-    new_response_metadata = response.response_metadata or {}
-
-    if isinstance(user_facing_content, str):
-        # Use regex to find and extract the plan
-        # re.DOTALL makes '.' match newline characters.
-        match = re.search(r"<Plan>(.*?)</Plan>(.*)", user_facing_content, re.DOTALL)
-        if match:
-            internal_plan = match.group(1).strip()
-            user_facing_content = match.group(2).strip()
-            # Add the extracted plan to the metadata
-            new_response_metadata["internal_plan"] = internal_plan
-
-    # Create a new AIMessage with the cleaned content and the new metadata
-    cleaned_response = AIMessage(
-        content=user_facing_content,
-        id=response.id,
-        tool_calls=response.tool_calls,
-        # Pass through other attributes
-        name=getattr(response, "name", None),
-        invalid_tool_calls=getattr(response, "invalid_tool_calls", None),
-        tool_call_chunks=getattr(response, "tool_call_chunks", None),
-        usage_metadata=getattr(response, "usage_metadata", None),
-        # Set the new metadata
-        response_metadata=new_response_metadata,
+    # Stream the response; the <Plan> prefix goes to response_metadata
+    cleaned_response = await ainvoke_with_plan(
+        model, build_model_messages(FINISHING_PROMPT, _model_history(state, configuration))
     )
+    mockups = _finished_mockups(state)
+    log_prompt_cache_usage(cleaned_response.usage_metadata)
+    record_tokens("call_finishing_model", cleaned_response.usage_metadata)
 
     # Handle the case when it's the last step and the model still wants to use a tool
     if state.is_last_step and cleaned_response.tool_calls:
@@ -148,54 +260,129 @@ async def call_finishing_model(state: State) -> dict[str, Any]:
                     id=cleaned_response.id,  # Use ID from cleaned response
                     content="Sorry, I could not find an answer to your question in the specified number of steps.",
                 ),
-            ]
+            ],
+            "artifacts": mockups,
         }
 
-    return {"messages": [cleaned_response]}
+    return {"messages": [cleaned_response], "artifacts": mockups}
 
 
-async def custom_tool_node(state: State) -> dict[str, Any]:
-    """
-    Custom node to execute tools. It modifies file paths to include the user's
-    email as a directory.
-    """
-    last_message = state.messages[-1]
-    if not isinstance(last_message, AIMessage) or not last_message.tool_calls:
-        return {}
+def _local_image_paths(
+    handle: ImageHandle, base_path: str, design_path: str, configuration: Configuration
+) -> list[str]:
+    """Return where a generated image is saved locally, if anywhere."""
+    if not configuration.save_local_images:
+        return []
+    paths = [os.path.join(base_path, handle.name)]
+    if handle.variant == 1:
+        # Variant 1 is the design's default until the user picks another.
+        paths.append(design_path)
+    return paths
 
-    user_email = state.email or "unknown_user"
-    # All user-specific files will be saved under 'images/<email>/'
-    base_path = os.path.join("images", user_email)  # <-- Using images/ dir
-    os.makedirs(base_path, exist_ok=True)  # Ensure the directory exists
 
-    tool_messages = []
-    new_artifacts = []
-    new_image_count = state.image_count
+async def _persist_image(
+    handle: ImageHandle,
+    local_paths: list[str],
+    user_email: str,
+    configuration: Configuration,
+) -> str:
+    """Store, upload and optionally save one generated image, all from memory.
 
-    for tool_call in last_message.tool_calls:
-        tool_name = tool_call["name"]
-        args = tool_call["args"]
+    The artifact store write, the GCS upload and the copies to `local_paths`
+    run concurrently on the same buffer. Only a failed store write is fatal;
+    upload and local copy failures are logged.
 
-        if tool_name not in ["create_image", "create_image_prompt"]:
-            continue
+    Returns:
+        str: The artifact reference of the image.
+    """
+    store = get_artifact_store(configuration.artifact_store_dir)
+    ref, *side_effects = await asyncio.gather(
+        run_io(store.put, handle.view),
+        aupload_bytes(handle.view, f"{user_email}/{handle.name}"),
+        *(run_io(write_file, path, handle.view) for path in local_paths),
+        return_exceptions=True,
+    )
+    if isinstance(ref, BaseException):
+        raise ref
+    public_url, *writes = side_effects
+    if isinstance(public_url, BaseException):
+        logging.error(f"Failed to upload {handle.name} to GCS: {public_url}")
+    else:
+        logging.info(f"Successfully uploaded to GCS: {public_url}")
+    for path, write in zip(local_paths, writes, strict=True):
+        if isinstance(write, BaseException):
+            logging.error(f"Failed to save {path}: {write}")
+    return ref
+
+
+def _has_variant(state: State, design_num: int, variant: int) -> bool:
+    """Return whether a variant of a design was generated in this thread."""
+    return any(
+        a.get("type") == "image"
+        and a.get("image_number") == design_num
+        and a.get("variant") == variant
+        for a in state.artifacts
+    )
 
-        # Find the corresponding tool function
-        tool_to_run = next((t for t in TOOLS if t.name == tool_name), None)
-        if not tool_to_run:
-            tool_messages.append(
-                ToolMessage(
-                    content=f"Error: Tool '{tool_name}' not found.",
-                    tool_call_id=tool_call["id"],
-                )
-            )
+
+def _selected_variant(state: State, design_num: int) -> int | None:
+    """Return the variant of a design picked with select_variant, if any.
+
+    A selection made before the design was generated again no longer applies.
+    """
+    for artifact in reversed(state.artifacts):
+        if artifact.get("image_number") != design_num:
             continue
+        if artifact.get("type") == "selection":
+            return artifact["variant"]
+        if artifact.get("type") == "image":
+            return None
+    return None
+
+
+async def _run_tool_call(
+    tool_call: ToolCall, state: State, base_path: str, configuration: Configuration
+) -> tuple[ToolMessage, list[dict[str, Any]], int | None]:
+    """
+    Execute a single tool call for custom_tool_node. Errors are caught and
+    returned as an error ToolMessage so one failing call does not affect the
+    others in the same turn.
 
-        try:            
+    Returns the tool message, any new artifacts and, for create_image, the
+    image number that was requested.
+    """
+    tool_name = tool_call["name"]
+    args = dict(tool_call["args"])
+    artifacts: list[dict[str, Any]] = []
+    image_num = None
+
+    # Find the corresponding tool function
+    tool_to_run = next((t for t in TOOLS if t.name == tool_name), None)
+    if not tool_to_run:
+        return (
+            ToolMessage(
+                content=f"Error: Tool '{tool_name}' not found.",
+                tool_call_id=tool_call["id"],
+            ),
+            artifacts,
+            image_num,
+        )
+
+    with span("tool", tool_name) as span_attributes:
+        try:
             if tool_name == "create_image":
                 image_num = args.get("image_number", 1)
                 # Ensure output path is in the user's directory
                 args["output_path"] = os.path.join(base_path, f"design-{image_num}.png")
-                new_image_count = image_num
+                args["variants"] = min(
+                    max(1, int(args.get("variants", 1))), configuration.max_image_variants
+                )
+
+            if tool_name == "select_variant":
+                args["design_dir"] = base_path
+                design_num, variant = args.get("image_number"), args.get("variant")
+                if not _has_variant(state, design_num, variant):
+                    raise ValueError(f"design {design_num} has no variant {variant}")
 
             if tool_name == "convert_black_to_transparent":
                 img_name = os.path.basename(args["image_path"])
@@ -203,56 +390,141 @@ async def custom_tool_node(state: State) -> dict[str, Any]:
                 args["image_path"] = os.path.join(base_path, img_name)
                 args["output_path"] = os.path.join(base_path, out_name)
 
-            # Execute the tool with modified arguments
-            tool_output = await tool_to_run.ainvoke(args)
-            tool_messages.append(
-                ToolMessage(
-                    content=str(tool_output),
-                    tool_call_id=tool_call["id"],
-                    name=tool_name,
-                )
+            # Execute the tool with modified arguments. Invoking with the full
+            # tool call returns a ToolMessage, including any tool artifact.
+            tool_message = cast(
+                ToolMessage, await tool_to_run.ainvoke({**tool_call, "args": args})
             )
 
             if tool_name == "create_image":
-                logging.info(f"Tool {tool_name} finished, output to local path: {tool_output}")
-
-                try:
-                    with open(tool_output, "rb") as image_file:
-                        image_b64 = base64.b64encode(image_file.read()).decode("utf-8")
-                    new_artifacts.append({"type": "image", "b64": image_b64})
-                    logging.info(f"Created artifact for {tool_output}")
-                except Exception as e:
-                    logging.error(f"Failed to create artifact from {tool_output}: {e}")                
-
-                # upload to google bucket
-                try:
-                    public_url = upload_to_gcs(tool_output, user_email)
-                    if public_url:
-                        logging.info(f"Successfully uploaded to GCS: {public_url}")
-                        tool_output = public_url
-                    else:
-                        logging.error("Failed to get public URL from GCS.")
-                except Exception as e:
-                    logging.error(f"Failed to upload {tool_output} to GCS: {e}")
-        except Exception as e:
-            tool_messages.append(
-                ToolMessage(
-                    content=f"Error executing tool {tool_name}: {e}",
-                    tool_call_id=tool_call["id"],
+                handles: list[ImageHandle] = tool_message.artifact or []
+                logging.info(f"Tool {tool_name} finished with images: {handles}")
+                outcomes = await asyncio.gather(
+                    *(
+                        _persist_image(
+                            handle,
+                            _local_image_paths(
+                                handle, base_path, args["output_path"], configuration
+                            ),
+                            state.email or "unknown_user",
+                            configuration,
+                        )
+                        for handle in handles
+                    ),
+                    return_exceptions=True,
                 )
+                for handle, outcome in zip(handles, outcomes, strict=True):
+                    if isinstance(outcome, BaseException):
+                        logging.error(f"Failed to create artifact from {handle.name}: {outcome}")
+                        continue
+                    artifact = {"type": "image", "ref": outcome, "image_number": image_num}
+                    if handle.variant is not None:
+                        artifact["variant"] = handle.variant
+                    artifacts.append(artifact)
+                # The message is checkpointed: keep the references, not the bytes.
+                tool_message.artifact = [a["ref"] for a in artifacts]
+                span_attributes["images"] = len(artifacts)
+
+            if tool_name == "select_variant":
+                # Recorded in the state, where production reads it.
+                artifacts.append({"type": "selection", **tool_message.artifact})
+        except Exception as e:
+            tool_message = ToolMessage(
+                content=f"Error executing tool {tool_name}: {e}",
+                tool_call_id=tool_call["id"],
             )
             logging.error(f"Error executing tool {tool_name}: {e}")  # For server logs
+            span_attributes["error"] = str(e)
+
+    return tool_message, artifacts, image_num
+
+
+async def custom_tool_node(state: State) -> dict[str, Any]:
+    """
+    Custom node to execute tools. It modifies file paths to include the user's
+    email as a directory.
+
+    Independent tool calls from the same model turn run concurrently, capped
+    by `Configuration.max_parallel_tool_calls`, and their results are kept in
+    the original tool_call order.
+    """
+    last_message = state.messages[-1]
+    if not isinstance(last_message, AIMessage) or not last_message.tool_calls:
+        return {}
+
+    user_email = state.email or "unknown_user"
+    # All user-specific files will be saved under 'images/<email>/'
+    base_path = os.path.join("images", user_email)  # <-- Using images/ dir
+    os.makedirs(base_path, exist_ok=True)  # Ensure the directory exists
+
+    configuration = Configuration.from_context()
+    semaphore = asyncio.Semaphore(max(1, configuration.max_parallel_tool_calls))
+
+    async def run_bounded(tool_call: ToolCall) -> tuple[
+        ToolMessage, list[dict[str, Any]], int | None
+    ]:
+        async with semaphore:
+            return await _run_tool_call(tool_call, state, base_path, configuration)
+
+    tool_calls = [
+        tool_call
+        for tool_call in last_message.tool_calls
+        if tool_call["name"] in ["create_image", "create_image_prompt", "select_variant"]
+    ]
+    results = await asyncio.gather(*(run_bounded(tc) for tc in tool_calls))
+
+    tool_messages = []
+    new_artifacts = []
+    new_image_count = state.image_count
+    for tool_message, artifacts, image_num in results:
+        tool_messages.append(tool_message)
+        new_artifacts.extend(artifacts)
+        if image_num is not None:
+            new_image_count = image_num
+
+    # Return only the deltas; the reducers on State merge them.
     return {
-        "messages": [*state.messages, *tool_messages],
-        "artifacts": state.artifacts + new_artifacts,
+        "messages": tool_messages,
+        "artifacts": new_artifacts,
         "image_count": new_image_count,
     }
 
 
+async def _load_design(
+    state: State,
+    design_num: int,
+    variant: int | None,
+    local_path: str,
+    configuration: Configuration,
+) -> bytes:
+    """Return the bytes of a design of this thread.
+
+    The thread's own artifacts come first: the local copy is shared by every
+    thread of the email, and design numbers restart in each thread. The local
+    copy is only a fallback for designs without an artifact.
+    """
+    # Use the newest matching artifact. Without an explicit variant a design
+    # defaults to variant 1.
+    wanted_variants = (variant,) if variant else (None, 1)
+    for artifact in reversed(state.artifacts):
+        if (
+            artifact.get("type") == "image"
+            and artifact.get("image_number") == design_num
+            and artifact.get("variant") in wanted_variants
+        ):
+            store = get_artifact_store(configuration.artifact_store_dir)
+            return await run_io(store.get, artifact["ref"])
+
+    if await run_io(os.path.exists, local_path):
+        return await run_io(read_file, local_path)
+    raise FileNotFoundError(f"Design {design_num} not found at {local_path}")
+
+
 async def production_node(state: State) -> dict[str, Any]:
     """
-    Executes the final production logic (convert, upload) after the
-    finishing agent calls execute_production_file.
+    Queue the production file (convert, upload) after the finishing agent
+    calls execute_production_file. The turn returns right away with the job
+    id; the production workers make the file and the UI polls its status.
     """
     last_message = state.messages[-1]
     if (
@@ -281,31 +553,56 @@ async def production_node(state: State) -> dict[str, Any]:
                 "design_number is missing from execute_production_file call"
             )
 
-        # 2. Construct paths
-        input_file = f"design-{design_num}.png"
-        output_file = f"talle-{size}-{prod_type}.png"
+        # 2. Resolve the chosen design to its stored artifact. Without an
+        # explicit variant, use the one picked with select_variant, if any.
+        variant = args.get("variant") or _selected_variant(state, design_num)
+        input_file = (
+            f"design-{design_num}-{variant}.png" if variant else f"design-{design_num}.png"
+        )
         local_input_path = os.path.join(base_path, input_file)
-        local_output_path = os.path.join(base_path, output_file)
-
-        # 3. Call helper: convert_black_to_transparent
-        logging.info(f"Converting {local_input_path} to {local_output_path}...")
-        convert_black_to_transparent(local_input_path, local_output_path)
-
-        # 4. Call helper: upload_to_gcs
-        logging.info(f"Uploading {local_output_path} to GCS...")
-        public_url = upload_to_gcs(local_output_path, user_email)
-
-        if not public_url:
-            raise Exception("Failed to upload final file to GCS")
-
-        logging.info(f"Final file available at: {public_url}")
-        tool_output = public_url
+        configuration = Configuration.from_context()
+        print_width_cm = configuration.print_widths_cm.get(size)
+        if configuration.print_dpi > 0 and print_width_cm is None:
+            talles = ", ".join(t.upper() for t in configuration.print_widths_cm)
+            raise ValueError(f"Unknown size {size!r}; available sizes are {talles}")
+        source = await _load_design(state, design_num, variant, local_input_path, configuration)
+        store = get_artifact_store(configuration.artifact_store_dir)
+        source_ref = await run_io(store.put, source)
+
+        # 3. Queue the job; a repeated order resolves to the same job
+        order = ProductionOrder(
+            email=user_email,
+            design_number=design_num,
+            variant=variant,
+            size=size,
+            product_type=prod_type,
+            source_ref=source_ref,
+            keying_threshold=configuration.keying_threshold,
+            keying_feather=configuration.keying_feather,
+            thread_id=_thread_id(),
+            print_width_cm=print_width_cm or 0.0,
+            print_dpi=configuration.print_dpi if print_width_cm else 0,
+        )
+        queue = await run_io(get_production_queue, configuration)
+        job, queued = await run_io(queue.enqueue, order, configuration.production_max_attempts)
+        (await ensure_production_workers(configuration)).notify()
+
+        if job.status == DONE:
+            tool_output = f"Production file already made: {job.result_url}"
+        elif queued:
+            tool_output = f"Production job {job.id} queued for {order.output_name}."
+        else:
+            tool_output = (
+                f"Production job {job.id} for {order.output_name} is already {job.status}."
+            )
+        logging.info(tool_output)
 
         tool_messages.append(
             ToolMessage(
-                content=str(tool_output),
+                content=tool_output,
                 tool_call_id=tool_call["id"],
                 name="execute_production_file",
+                artifact={"job_id": job.id},
             )
         )
     except Exception as e:
@@ -318,7 +615,7 @@ async def production_node(state: State) -> dict[str, Any]:
             )
         )
 
-    return {"messages": [*state.messages, *tool_messages], "artifacts": state.artifacts}
+    return {"messages": tool_messages}
 
 
 def route_entry(state: State) -> Literal["call_finishing_model", "call_model"]:
@@ -391,10 +688,12 @@ def route_finishing_model(
 builder = StateGraph(State, input_schema=InputState, context_schema=Configuration)
 
 # --- MODIFIED GRAPH DEFINITION ---
-builder.add_node("call_model", call_model)
-builder.add_node("tools", custom_tool_node)
-builder.add_node("call_finishing_model", call_finishing_model)
-builder.add_node("production_node", production_node) # <-- ADDED
+builder.add_node("call_model", instrument_node("call_model", call_model))
+builder.add_node("tools", instrument_node("tools", custom_tool_node))
+builder.add_node(
+    "call_finishing_model", instrument_node("call_finishing_model", call_finishing_model)
+)
+builder.add_node("production_node", instrument_node("production_node", production_node))
 
 builder.add_conditional_edges(
     START,
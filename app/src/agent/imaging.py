@@ -0,0 +1,96 @@
+"""Image handles and vectorized image helpers used by the production pipeline."""
+
+from __future__ import annotations
+
+import io
+from dataclasses import dataclass
+
+import numpy as np
+from PIL import Image
+
+DEFAULT_KEYING_THRESHOLD = 30
+
+
+@dataclass(frozen=True)
+class ImageHandle:
+    """An encoded image held in memory.
+
+    A generated image is decoded from base64 once into a handle, and the
+    same buffer is then handed to the artifact store, the GCS upload and the
+    optional local copy, so nothing has to read it back from disk.
+
+    Attributes:
+        data (bytes): The encoded image, e.g. PNG bytes.
+        name (str): File name used for the local copy and the GCS blob.
+        variant (int | None): Variant number when a design has several.
+    """
+
+    data: bytes
+    name: str
+    variant: int | None = None
+
+    @property
+    def view(self) -> memoryview:
+        """A view of the image bytes; taking it does not copy them."""
+        return memoryview(self.data)
+
+    def __len__(self) -> int:
+        return len(self.data)
+
+    def __repr__(self) -> str:
+        # Keep the bytes out of logs and tool message reprs.
+        return f"ImageHandle(name={self.name!r}, variant={self.variant}, size={len(self.data)})"
+
+
+def key_black_to_transparent(
+    img: Image.Image, threshold: float = DEFAULT_KEYING_THRESHOLD, feather: float = 0
+) -> Image.Image:
+    """Make dark pixels of an image transparent.
+
+    A pixel is keyed out when its brightness, the mean of its R, G and B
+    channels, is below ``threshold``. With ``feather > 0`` pixels whose
+    brightness falls in ``[threshold, threshold + feather)`` get their alpha
+    scaled linearly instead of kept as is, which softens the cut-out edge.
+
+    Args:
+        img (Image.Image): The image to key. Converted to RGBA if needed.
+        threshold (float): Brightness below which pixels become transparent.
+        feather (float): Width of the soft alpha ramp above the threshold.
+
+    Returns:
+        Image.Image: A new RGBA image with the keyed alpha channel.
+    """
+    rgba = img if img.mode == "RGBA" else img.convert("RGBA")
+    # Work on the separate Pillow bands: contiguous planes are much faster to
+    # sum than the channel axis of an interleaved (H, W, 4) array.
+    red, green, blue, alpha = rgba.split()
+    alpha_plane = np.asarray(alpha)
+    # Compare the channel sum against 3 * threshold to stay in integers.
+    brightness_sum = (
+        np.asarray(red).astype(np.uint16) + np.asarray(green) + np.asarray(blue)
+    )
+
+    if feather > 0:
+        ramp = (brightness_sum.astype(np.float32) - 3 * threshold) / (3 * feather)
+        new_alpha = (alpha_plane * np.clip(ramp, 0.0, 1.0)).astype(np.uint8)
+    else:
+        new_alpha = alpha_plane * (brightness_sum >= 3 * threshold)
+
+    return Image.merge("RGBA", (red, green, blue, Image.fromarray(new_alpha)))
+
+
+def key_png(
+    data: bytes, threshold: float = DEFAULT_KEYING_THRESHOLD, feather: float = 0
+) -> bytes:
+    """Key an encoded image held in memory and return the result as PNG bytes.
+
+    This is the in-memory counterpart of `convert_black_to_transparent`, used
+    by the production pipeline so the keyed file can be uploaded straight
+    from the buffer. It only touches picklable arguments, so it can run in
+    the CPU process pool.
+    """
+    with Image.open(io.BytesIO(data)) as img:
+        keyed = key_black_to_transparent(img, threshold=threshold, feather=feather)
+    buffer = io.BytesIO()
+    keyed.save(buffer, "PNG")
+    return buffer.getvalue()
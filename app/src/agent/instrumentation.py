@@ -0,0 +1,341 @@
+"""Latency, token and byte instrumentation for the agent graph.
+
+Disabled by default. Set ``OWNIT_INSTRUMENTATION=1`` (or call `enable`) to
+record, per graph node and tool:
+
+- wall time and errors,
+- time spent queued for the I/O and CPU executors,
+- model tokens in, out and served from the prompt cache,
+- bytes uploaded to GCS.
+
+Metrics are kept in process and rendered in the Prometheus text format by
+`render_prometheus`. Each turn run inside `turn_trace` also produces a
+structured trace of its spans, logged as one JSON line and kept in a small
+ring buffer (`recent_traces`).
+
+When disabled, every hook returns after a single flag check.
+"""
+
+from __future__ import annotations
+
+import contextlib
+import contextvars
+import functools
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from bisect import bisect_left
+from collections import deque
+from collections.abc import Awaitable, Callable, Iterator
+from dataclasses import dataclass, field
+from typing import Any, TypeVar
+
+T = TypeVar("T")
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+TRACE_BUFFER_SIZE = 100
+
+_enabled = os.getenv("OWNIT_INSTRUMENTATION", "").lower() in ("1", "true", "yes")
+
+
+def enabled() -> bool:
+    """Return whether instrumentation is recording."""
+    return _enabled
+
+
+def enable(on: bool = True) -> None:
+    """Turn instrumentation on or off for this process."""
+    global _enabled  # noqa: PLW0603
+    _enabled = on
+
+
+class Registry:
+    """Counters and histograms keyed by metric name and label values."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._help: dict[str, tuple[str, str]] = {}
+        self._counters: dict[tuple[str, tuple[tuple[str, str], ...]], float] = {}
+        # name, labels -> [bucket counts..., sum, count]
+        self._histograms: dict[
+            tuple[str, tuple[tuple[str, str], ...]], list[float]
+        ] = {}
+
+    def describe(self, name: str, kind: str, help_text: str) -> None:
+        """Register the TYPE and HELP lines of a metric."""
+        self._help[name] = (kind, help_text)
+
+    def inc(self, name: str, value: float = 1, **labels: str) -> None:
+        """Add `value` to a counter."""
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name: str, value: float, **labels: str) -> None:
+        """Record one observation in a histogram."""
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = [0.0] * (len(DEFAULT_BUCKETS) + 2)
+            index = bisect_left(DEFAULT_BUCKETS, value)
+            if index < len(DEFAULT_BUCKETS):
+                histogram[index] += 1
+            histogram[-2] += value
+            histogram[-1] += 1
+
+    def value(self, name: str, **labels: str) -> float:
+        """Return a counter value, or a histogram's observation count."""
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            if key in self._histograms:
+                return self._histograms[key][-1]
+            return self._counters.get(key, 0)
+
+    def reset(self) -> None:
+        """Drop all recorded values."""
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+    def render(self) -> str:
+        """Return all metrics in the Prometheus text exposition format."""
+        with self._lock:
+            counters = sorted(self._counters.items())
+            histograms = sorted(self._histograms.items())
+
+        lines: list[str] = []
+        described: set[str] = set()
+
+        def header(name: str) -> None:
+            if name in described or name not in self._help:
+                return
+            kind, help_text = self._help[name]
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            described.add(name)
+
+        for (name, labels), value in counters:
+            header(name)
+            lines.append(f"{name}{_labels(labels)} {value:g}")
+        for (name, labels), histogram in histograms:
+            header(name)
+            cumulative = 0.0
+            for bound, count in zip(DEFAULT_BUCKETS, histogram, strict=False):
+                cumulative += count
+                bucket_labels = _labels((*labels, ("le", f"{bound:g}")))
+                lines.append(f"{name}_bucket{bucket_labels} {cumulative:g}")
+            lines.append(
+                f"{name}_bucket{_labels((*labels, ('le', '+Inf')))} {histogram[-1]:g}"
+            )
+            lines.append(f"{name}_sum{_labels(labels)} {histogram[-2]:.6f}")
+            lines.append(f"{name}_count{_labels(labels)} {histogram[-1]:g}")
+        return "\n".join(lines) + "\n"
+
+
+def _labels(labels: tuple[tuple[str, str], ...]) -> str:
+    if not labels:
+        return ""
+    escaped = (
+        f'{k}="{str(v).replace(chr(92), chr(92) * 2).replace(chr(34), chr(92) + chr(34))}"'
+        for k, v in labels
+    )
+    return "{" + ",".join(escaped) + "}"
+
+
+REGISTRY = Registry()
+REGISTRY.describe(
+    "ownit_turn_duration_seconds", "histogram", "Wall time of a whole turn."
+)
+REGISTRY.describe(
+    "ownit_node_duration_seconds", "histogram", "Wall time of a graph node."
+)
+REGISTRY.describe("ownit_node_errors_total", "counter", "Graph node runs that raised.")
+REGISTRY.describe(
+    "ownit_tool_duration_seconds", "histogram", "Wall time of a tool call."
+)
+REGISTRY.describe("ownit_tool_errors_total", "counter", "Tool calls that failed.")
+REGISTRY.describe(
+    "ownit_executor_queue_seconds",
+    "histogram",
+    "Time blocking work waited for a worker.",
+)
+REGISTRY.describe("ownit_llm_tokens_total", "counter", "Model tokens by direction.")
+REGISTRY.describe("ownit_upload_bytes_total", "counter", "Bytes uploaded to GCS.")
+REGISTRY.describe(
+    "ownit_upload_duration_seconds", "histogram", "Wall time of a GCS upload."
+)
+REGISTRY.describe(
+    "ownit_generation_cache_lookups_total", "counter", "Generated image cache lookups."
+)
+
+
+def render_prometheus() -> str:
+    """Return the process metrics in the Prometheus text format."""
+    return REGISTRY.render()
+
+
+@dataclass
+class Trace:
+    """The spans recorded during one turn."""
+
+    thread_id: str | None
+    trace_id: str = field(default_factory=lambda: uuid.uuid4().hex)
+    started_at: float = field(default_factory=time.time)
+    spans: list[dict[str, Any]] = field(default_factory=list)
+
+    def add(self, name: str, start: float, duration: float, **attributes: Any) -> None:
+        """Record a span that started at `start` (a time.time value)."""
+        self.spans.append(
+            {
+                "name": name,
+                "offset_ms": round((start - self.started_at) * 1000, 3),
+                "duration_ms": round(duration * 1000, 3),
+                **attributes,
+            }
+        )
+
+    def to_dict(self) -> dict[str, Any]:
+        """Return the trace as a JSON-serializable dict."""
+        return {
+            "trace_id": self.trace_id,
+            "thread_id": self.thread_id,
+            "started_at": self.started_at,
+            "duration_ms": round((time.time() - self.started_at) * 1000, 3),
+            "spans": sorted(self.spans, key=lambda s: s["offset_ms"]),
+        }
+
+
+_current_trace: contextvars.ContextVar[Trace | None] = contextvars.ContextVar(
+    "ownit_trace", default=None
+)
+_recent_traces: deque[dict[str, Any]] = deque(maxlen=TRACE_BUFFER_SIZE)
+
+
+def recent_traces() -> list[dict[str, Any]]:
+    """Return the traces of the latest turns, newest last."""
+    return list(_recent_traces)
+
+
+@contextlib.contextmanager
+def turn_trace(thread_id: str | None) -> Iterator[Trace | None]:
+    """Collect the spans of one turn. Tasks started inside inherit the trace."""
+    if not _enabled:
+        yield None
+        return
+    trace = Trace(thread_id)
+    token = _current_trace.set(trace)
+    start = time.perf_counter()
+    try:
+        yield trace
+    finally:
+        # Fails if an async generator is closed from another context, e.g. on cancel.
+        with contextlib.suppress(ValueError):
+            _current_trace.reset(token)
+        REGISTRY.observe("ownit_turn_duration_seconds", time.perf_counter() - start)
+        record = trace.to_dict()
+        _recent_traces.append(record)
+        logging.info(
+            f"turn_trace {json.dumps(record, ensure_ascii=False, default=str)}"
+        )
+
+
+@contextlib.contextmanager
+def span(kind: str, name: str, **attributes: Any) -> Iterator[dict[str, Any]]:
+    """Time a node or tool run, recording errors. Yields a dict for extra attributes.
+
+    Args:
+        kind (str): ``node`` or ``tool``; selects the metric family.
+        name (str): The node or tool name, used as the metric label.
+        **attributes (Any): Extra fields for the trace span.
+    """
+    if not _enabled:
+        yield attributes
+        return
+    started_at = time.time()
+    start = time.perf_counter()
+    error = None
+    try:
+        yield attributes
+    except BaseException as e:
+        error = repr(e)
+        raise
+    finally:
+        duration = time.perf_counter() - start
+        REGISTRY.observe(f"ownit_{kind}_duration_seconds", duration, **{kind: name})
+        if error is None:
+            error = attributes.pop("error", None)
+        if error is not None:
+            REGISTRY.inc(f"ownit_{kind}_errors_total", **{kind: name})
+        trace = _current_trace.get()
+        if trace is not None:
+            trace.add(
+                f"{kind}:{name}",
+                started_at,
+                duration,
+                **attributes,
+                **({"error": error} if error else {}),
+            )
+
+
+def instrument_node(
+    name: str, node: Callable[..., Awaitable[T]]
+) -> Callable[..., Awaitable[T]]:
+    """Wrap an async graph node so each run is timed and traced."""
+
+    @functools.wraps(node)
+    async def wrapper(*args: Any, **kwargs: Any) -> T:
+        if not _enabled:
+            return await node(*args, **kwargs)
+        with span("node", name):
+            return await node(*args, **kwargs)
+
+    return wrapper
+
+
+def record_tokens(node: str, usage_metadata: dict[str, Any] | None) -> None:
+    """Count the tokens of one model call."""
+    if not _enabled or not usage_metadata:
+        return
+    tokens = {
+        "in": usage_metadata.get("input_tokens", 0),
+        "out": usage_metadata.get("output_tokens", 0),
+        "cached": (usage_metadata.get("input_token_details") or {}).get(
+            "cache_read", 0
+        ),
+    }
+    for direction, count in tokens.items():
+        REGISTRY.inc(
+            "ownit_llm_tokens_total", count or 0, node=node, direction=direction
+        )
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.add(f"tokens:{node}", time.time(), 0, tokens=tokens)
+
+
+def record_queue_wait(pool: str, seconds: float) -> None:
+    """Record how long a job waited for an executor worker."""
+    if _enabled:
+        REGISTRY.observe("ownit_executor_queue_seconds", max(0.0, seconds), pool=pool)
+
+
+def record_upload(num_bytes: int, seconds: float) -> None:
+    """Record one completed GCS upload."""
+    if not _enabled:
+        return
+    REGISTRY.inc("ownit_upload_bytes_total", num_bytes)
+    REGISTRY.observe("ownit_upload_duration_seconds", seconds)
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.add("upload", time.time() - seconds, seconds, bytes=num_bytes)
+
+
+def record_cache_lookup(hit: bool) -> None:
+    """Count one generation cache lookup."""
+    if _enabled:
+        REGISTRY.inc(
+            "ownit_generation_cache_lookups_total", result="hit" if hit else "miss"
+        )
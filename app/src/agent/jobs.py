@@ -0,0 +1,731 @@
+"""A durable queue of production jobs and the workers that run them.
+
+Making a production file (keying the chosen design, uploading it and keeping
+a local copy) used to run inline in `production_node`, so the user waited for
+it, a failure was final and a burst of orders queued on the chat turns. Now
+the node only records a `ProductionOrder` in a SQLite-backed
+`ProductionQueue` and returns the job id; `ProductionWorkers` running on the
+same event loop pick jobs up, retry failures with exponential backoff and
+record the outcome, which the UI and the API poll.
+
+- Orders are idempotent: the same design, size and product type ordered
+  again from the same thread resolve to one job. Ordering again after a
+  final failure requeues it.
+- Workers claim jobs with a lease. A job whose worker died is claimed again
+  once its lease expires, so any process sharing the database can finish it.
+- Several processes can share one database; claims are serialized by SQLite.
+
+Orders record the print size and DPI they were placed with, and the worker
+renders the file at that resolution with `agent.printing` on the CPU pool.
+The first job of a design renders every configured talle from one decode of
+it, under ``images/<email>/prints``; jobs for other talles of the same design
+link their file from there instead of rendering again. Renders are limited to
+all but one CPU worker, so a burst of large prints leaves room for the keying
+other sessions are waiting on.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import functools
+import hashlib
+import json
+import logging
+import os
+import shutil
+import sqlite3
+import threading
+import time
+import uuid
+import weakref
+from collections.abc import Iterator
+from dataclasses import asdict, dataclass, fields
+from typing import Any
+
+from agent.artifacts import get_artifact_store
+from agent.configuration import Configuration
+from agent.executors import run_cpu, run_io
+from agent.prekeying import get_prekeyer, key_design, prekey_key
+from agent.printing import print_width_px, render_print_files
+from agent.storage import aupload_bytes, aupload_file
+from agent.utils import write_file
+
+QUEUED, RUNNING, DONE, FAILED = "queued", "running", "done", "failed"
+# Seconds a worker may hold a job before another worker may take it over.
+LEASE_SECONDS = 300.0
+# Seconds an idle worker sleeps before polling for jobs enqueued elsewhere.
+POLL_INTERVAL = 1.0
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS production_jobs (
+    id TEXT PRIMARY KEY,
+    idempotency_key TEXT NOT NULL UNIQUE,
+    thread_id TEXT,
+    email TEXT NOT NULL,
+    design_number INTEGER NOT NULL,
+    variant INTEGER,
+    size TEXT NOT NULL,
+    product_type TEXT NOT NULL,
+    source_ref TEXT NOT NULL,
+    keying_threshold REAL NOT NULL,
+    keying_feather REAL NOT NULL,
+    print_width_cm REAL NOT NULL DEFAULT 0,
+    print_dpi INTEGER NOT NULL DEFAULT 0,
+    status TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL,
+    next_run_at REAL NOT NULL,
+    leased_until REAL,
+    result_url TEXT,
+    result_path TEXT,
+    error TEXT,
+    gang_sheet TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS production_jobs_ready
+    ON production_jobs (status, next_run_at);
+CREATE INDEX IF NOT EXISTS production_jobs_thread
+    ON production_jobs (thread_id, created_at);
+"""
+# Columns added since the table was first created, with their definitions.
+_ADDED_COLUMNS = {
+    "print_width_cm": "REAL NOT NULL DEFAULT 0",
+    "print_dpi": "INTEGER NOT NULL DEFAULT 0",
+    "gang_sheet": "TEXT",
+    "result_path": "TEXT",
+}
+
+
+@dataclass(frozen=True)
+class ProductionOrder:
+    """What to produce: one design keyed for one size and product type.
+
+    A `print_dpi` of 0 keeps the design at its generated size.
+    """
+
+    email: str
+    design_number: int
+    variant: int | None
+    size: str
+    product_type: str
+    source_ref: str
+    keying_threshold: float
+    keying_feather: float
+    thread_id: str | None = None
+    print_width_cm: float = 0.0
+    print_dpi: int = 0
+
+    @property
+    def output_name(self) -> str:
+        """Return the file name of the production file.
+
+        It names the design and variant, and ends with a digest of the
+        idempotency key: design numbers restart in every thread of an email,
+        and orders differing only in keying or print settings must not share
+        a file either.
+        """
+        design = f"design-{self.design_number}"
+        if self.variant:
+            design += f"-{self.variant}"
+        return (
+            f"{design}-talle-{self.size}-{self.product_type}"
+            f"-{self.idempotency_key[:8]}.png"
+        )
+
+    @property
+    def idempotency_key(self) -> str:
+        """Return the key under which repeated orders collapse into one job.
+
+        Orders only collapse within a thread, so every thread that orders a
+        design sees the job in `ProductionQueue.jobs_for_thread`.
+        """
+        # Numbers are normalized to the types they are stored as, so an order
+        # read back from the queue has the same key (and file name).
+        payload = json.dumps(
+            [
+                self.email,
+                self.thread_id,
+                self.source_ref,
+                self.size,
+                self.product_type,
+                float(self.keying_threshold),
+                float(self.keying_feather),
+                float(self.print_width_cm),
+                int(self.print_dpi),
+            ]
+        )
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+
+_ORDER_FIELDS = tuple(f.name for f in fields(ProductionOrder))
+
+
+@dataclass(frozen=True)
+class ProductionJob:
+    """A queued order and its progress."""
+
+    id: str
+    order: ProductionOrder
+    status: str
+    attempts: int
+    max_attempts: int
+    next_run_at: float
+    result_url: str | None
+    error: str | None
+    created_at: float
+    updated_at: float
+    gang_sheet: str | None = None
+    result_path: str | None = None
+
+    @property
+    def finished(self) -> bool:
+        """Whether the job reached a final status."""
+        return self.status in (DONE, FAILED)
+
+    def to_dict(self) -> dict[str, Any]:
+        """Return the job as a JSON-serializable dict."""
+        view = asdict(self)
+        view.update(view.pop("order"))
+        # Where the file was made on the server is of no use to clients.
+        del view["result_path"]
+        return view
+
+    @classmethod
+    def from_row(cls, row: sqlite3.Row) -> ProductionJob:
+        """Build a job from a ``production_jobs`` row."""
+        return cls(
+            id=row["id"],
+            order=ProductionOrder(**{name: row[name] for name in _ORDER_FIELDS}),
+            status=row["status"],
+            attempts=row["attempts"],
+            max_attempts=row["max_attempts"],
+            next_run_at=row["next_run_at"],
+            result_url=row["result_url"],
+            error=row["error"],
+            created_at=row["created_at"],
+            updated_at=row["updated_at"],
+            gang_sheet=row["gang_sheet"],
+            result_path=row["result_path"],
+        )
+
+
+class ProductionQueue:
+    """Production jobs persisted in SQLite. All methods are blocking.
+
+    Args:
+        path (str): Path of the SQLite database, created if missing.
+        retry_backoff (float): Delay in seconds before the first retry of a
+            failed job; it doubles on each further attempt.
+        lease_seconds (float): How long a claimed job is reserved for its worker.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        retry_backoff: float = 2.0,
+        lease_seconds: float = LEASE_SECONDS,
+    ) -> None:
+        self.path = path
+        self.retry_backoff = retry_backoff
+        self.lease_seconds = lease_seconds
+        self._conn = sqlite3.connect(
+            path, check_same_thread=False, isolation_level=None
+        )
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA busy_timeout=30000")
+        self._conn.executescript(_SCHEMA)
+        self._migrate()
+        self._lock = threading.Lock()
+
+    def _migrate(self) -> None:
+        """Add the columns a database created by an older version lacks."""
+        columns = {
+            row["name"]
+            for row in self._conn.execute("PRAGMA table_info(production_jobs)")
+        }
+        for name, definition in _ADDED_COLUMNS.items():
+            if name not in columns:
+                self._conn.execute(
+                    f"ALTER TABLE production_jobs ADD COLUMN {name} {definition}"
+                )
+
+    @contextlib.contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        """Run statements in one write transaction, taken up front."""
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield self._conn
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+
+    def enqueue(
+        self, order: ProductionOrder, max_attempts: int = 5
+    ) -> tuple[ProductionJob, bool]:
+        """Queue `order` unless an equivalent job exists.
+
+        A job that finally failed is requeued with fresh attempts.
+
+        Returns:
+            tuple[ProductionJob, bool]: The job, and whether it was (re)queued.
+        """
+        now = time.time()
+        key = order.idempotency_key
+        with self._transaction() as conn:
+            row = conn.execute(
+                "SELECT * FROM production_jobs WHERE idempotency_key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                job_id = uuid.uuid4().hex
+                conn.execute(
+                    f"INSERT INTO production_jobs (id, idempotency_key, {', '.join(_ORDER_FIELDS)},"
+                    " status, max_attempts, next_run_at, created_at, updated_at)"
+                    f" VALUES (?, ?, {', '.join('?' * len(_ORDER_FIELDS))}, ?, ?, ?, ?, ?)",
+                    (
+                        job_id,
+                        key,
+                        *(getattr(order, name) for name in _ORDER_FIELDS),
+                        QUEUED,
+                        max_attempts,
+                        now,
+                        now,
+                        now,
+                    ),
+                )
+            elif row["status"] == FAILED:
+                job_id = row["id"]
+                conn.execute(
+                    "UPDATE production_jobs SET status = ?, attempts = 0, max_attempts = ?,"
+                    " next_run_at = ?, error = NULL, updated_at = ? WHERE id = ?",
+                    (QUEUED, max_attempts, now, now, job_id),
+                )
+            else:
+                return ProductionJob.from_row(row), False
+            job = conn.execute(
+                "SELECT * FROM production_jobs WHERE id = ?", (job_id,)
+            ).fetchone()
+        return ProductionJob.from_row(job), True
+
+    def claim(self) -> ProductionJob | None:
+        """Reserve the oldest runnable job for the calling worker, if any.
+
+        Runnable jobs are queued jobs whose retry time has come and running
+        jobs whose lease expired. An expired job out of attempts fails instead.
+        """
+        now = time.time()
+        with self._transaction() as conn:
+            conn.execute(
+                "UPDATE production_jobs SET status = ?, error = 'Worker lease expired.',"
+                " updated_at = ?"
+                " WHERE status = ? AND leased_until < ? AND attempts >= max_attempts",
+                (FAILED, now, RUNNING, now),
+            )
+            row = conn.execute(
+                "SELECT id FROM production_jobs"
+                " WHERE (status = ? AND next_run_at <= ?) OR (status = ? AND leased_until < ?)"
+                " ORDER BY next_run_at LIMIT 1",
+                (QUEUED, now, RUNNING, now),
+            ).fetchone()
+            if row is None:
+                return None
+            conn.execute(
+                "UPDATE production_jobs SET status = ?, attempts = attempts + 1,"
+                " leased_until = ?, updated_at = ? WHERE id = ?",
+                (RUNNING, now + self.lease_seconds, now, row["id"]),
+            )
+            job = conn.execute(
+                "SELECT * FROM production_jobs WHERE id = ?", (row["id"],)
+            ).fetchone()
+        return ProductionJob.from_row(job)
+
+    def complete(
+        self, job: ProductionJob, result_url: str, result_path: str | None = None
+    ) -> bool:
+        """Mark a claimed job done. Returns False if its lease was lost meanwhile.
+
+        Args:
+            job (ProductionJob): The job, as claimed.
+            result_url (str): Public URL of the production file.
+            result_path (str | None): Local copy of the production file.
+        """
+        with self._transaction() as conn:
+            cursor = conn.execute(
+                "UPDATE production_jobs SET status = ?, result_url = ?, result_path = ?,"
+                " error = NULL, leased_until = NULL, updated_at = ?"
+                " WHERE id = ? AND status = ? AND attempts = ?",
+                (
+                    DONE,
+                    result_url,
+                    result_path,
+                    time.time(),
+                    job.id,
+                    RUNNING,
+                    job.attempts,
+                ),
+            )
+        return cursor.rowcount == 1
+
+    def fail(self, job: ProductionJob, error: str) -> ProductionJob | None:
+        """Record a failed attempt: retry later with backoff, or fail for good.
+
+        Returns the updated job, or None if its lease was lost meanwhile.
+        """
+        now = time.time()
+        retry = job.attempts < job.max_attempts
+        with self._transaction() as conn:
+            cursor = conn.execute(
+                "UPDATE production_jobs SET status = ?, error = ?, next_run_at = ?,"
+                " leased_until = NULL, updated_at = ? WHERE id = ? AND status = ? AND attempts = ?",
+                (
+                    QUEUED if retry else FAILED,
+                    error,
+                    now + self.retry_backoff * 2 ** (job.attempts - 1)
+                    if retry
+                    else now,
+                    now,
+                    job.id,
+                    RUNNING,
+                    job.attempts,
+                ),
+            )
+        if cursor.rowcount != 1:
+            return None
+        return self.get(job.id)
+
+    def get(self, job_id: str) -> ProductionJob | None:
+        """Return a job by id."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT * FROM production_jobs WHERE id = ?", (job_id,)
+            ).fetchone()
+        return ProductionJob.from_row(row) if row else None
+
+    def jobs_for_thread(self, thread_id: str) -> list[ProductionJob]:
+        """Return the jobs ordered from a thread, oldest first."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT * FROM production_jobs WHERE thread_id = ? ORDER BY created_at",
+                (thread_id,),
+            ).fetchall()
+        return [ProductionJob.from_row(row) for row in rows]
+
+    def claim_for_gang(self, dpi: int, batch: str) -> list[ProductionJob]:
+        """Reserve the finished jobs at `dpi` that are on no gang sheet for `batch`.
+
+        Jobs reserved by a batch are not handed to another until released.
+        """
+        with self._transaction() as conn:
+            conn.execute(
+                "UPDATE production_jobs SET gang_sheet = ?"
+                " WHERE status = ? AND gang_sheet IS NULL AND print_dpi = ?",
+                (batch, DONE, dpi),
+            )
+            rows = conn.execute(
+                "SELECT * FROM production_jobs WHERE gang_sheet = ? ORDER BY updated_at",
+                (batch,),
+            ).fetchall()
+        return [ProductionJob.from_row(row) for row in rows]
+
+    def mark_ganged(self, job_ids: list[str], sheet: str) -> None:
+        """Record the gang sheet jobs were printed on."""
+        with self._transaction() as conn:
+            conn.executemany(
+                "UPDATE production_jobs SET gang_sheet = ? WHERE id = ?",
+                [(sheet, job_id) for job_id in job_ids],
+            )
+
+    def release_gang(self, batch: str) -> int:
+        """Return the jobs `batch` reserved but did not place. Returns how many."""
+        with self._transaction() as conn:
+            cursor = conn.execute(
+                "UPDATE production_jobs SET gang_sheet = NULL WHERE gang_sheet = ?",
+                (batch,),
+            )
+        return cursor.rowcount
+
+    def counts(self) -> dict[str, int]:
+        """Return how many jobs are in each status."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT status, COUNT(*) FROM production_jobs GROUP BY status"
+            ).fetchall()
+        return dict(rows)
+
+
+@functools.lru_cache(maxsize=4)
+def _open_queue(path: str, retry_backoff: float) -> ProductionQueue:
+    return ProductionQueue(path, retry_backoff=retry_backoff)
+
+
+def get_production_queue(configuration: Configuration) -> ProductionQueue:
+    """Return the process-wide queue for the configured database."""
+    return _open_queue(
+        os.path.abspath(configuration.production_queue_path),
+        configuration.production_retry_backoff,
+    )
+
+
+_render_semaphores: weakref.WeakKeyDictionary[
+    asyncio.AbstractEventLoop, asyncio.Semaphore
+] = weakref.WeakKeyDictionary()
+
+
+def render_slots(cpu_pool_size: int) -> asyncio.Semaphore:
+    """Return the semaphore bounding print renders on the running loop.
+
+    Renders leave one CPU pool worker free for the keying other sessions wait on.
+    """
+    loop = asyncio.get_running_loop()
+    semaphore = _render_semaphores.get(loop)
+    if semaphore is None:
+        semaphore = _render_semaphores[loop] = asyncio.Semaphore(
+            max(1, cpu_pool_size - 1)
+        )
+    return semaphore
+
+
+_print_renders: weakref.WeakKeyDictionary[
+    asyncio.AbstractEventLoop, dict[str, asyncio.Future[None]]
+] = weakref.WeakKeyDictionary()
+
+
+def _link_or_copy(source: str, path: str) -> None:
+    """Place a hard link to `source` at `path`, or a copy where links fail."""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    partial_path = f"{path}.part"
+    with contextlib.suppress(FileNotFoundError):
+        os.remove(partial_path)
+    try:
+        os.link(source, partial_path)
+    except OSError:
+        shutil.copyfile(source, partial_path)
+    os.replace(partial_path, path)
+
+
+async def _render_talles(
+    keyed: bytes, outputs: list[tuple[str, int]], dpi: int, configuration: Configuration
+) -> None:
+    """Render a keyed design to every ``(path, width_px)`` of `outputs` at once."""
+    async with render_slots(configuration.cpu_pool_size):
+        sizes = await run_cpu(
+            render_print_files, keyed, outputs, dpi, configuration.print_strip_rows
+        )
+    for (path, _), (width, height) in zip(outputs, sizes, strict=True):
+        logging.info(f"Rendered {path} at {width}x{height}")
+
+
+async def print_file(
+    keyed: bytes, order: ProductionOrder, configuration: Configuration
+) -> str:
+    """Return the path of the print-resolution render of `order`'s talle.
+
+    The first order of a design renders every configured talle from one
+    decode of it; orders of the same design for other talles reuse those
+    files. Concurrent orders of a design share one render.
+    """
+    dpi = order.print_dpi
+    digest = hashlib.sha256(keyed).hexdigest()[:16]
+    render_dir = os.path.join("images", order.email, "prints", f"{digest}-{dpi}dpi")
+    width = print_width_px(order.print_width_cm, dpi)
+    path = os.path.join(render_dir, f"{width}px.png")
+    if await run_io(os.path.exists, path):
+        return path
+    renders = _print_renders.setdefault(asyncio.get_running_loop(), {})
+    render = renders.get(render_dir)
+    if render is None:
+        widths = {
+            print_width_px(cm, dpi) for cm in configuration.print_widths_cm.values()
+        }
+        outputs = [
+            (os.path.join(render_dir, f"{w}px.png"), w)
+            for w in sorted({width, *widths})
+        ]
+        render = renders[render_dir] = asyncio.ensure_future(
+            _render_talles(keyed, outputs, dpi, configuration)
+        )
+        render.add_done_callback(lambda _: renders.pop(render_dir, None))
+    # Shielded: a cancelled job must not cancel the render other jobs wait on.
+    await asyncio.shield(render)
+    if not await run_io(os.path.exists, path):
+        # Started by an order placed with other talles configured.
+        await _render_talles(keyed, [(path, width)], dpi, configuration)
+    return path
+
+
+async def produce(job: ProductionJob, configuration: Configuration) -> tuple[str, str]:
+    """Make the production file of a job.
+
+    The design is usually already keyed by the prekeyer; otherwise it is
+    keyed here. Its print-resolution render, see `print_file`, is linked to
+    the local copy and uploaded from it.
+
+    Returns:
+        tuple[str, str]: The public URL of the file and the path of its
+            local copy.
+    """
+    order = job.order
+    keyed = None
+    if configuration.prekey_cache_size > 0:
+        prekeyer = get_prekeyer(configuration.prekey_cache_size)
+        key = prekey_key(order.source_ref, order.keying_threshold, order.keying_feather)
+        keyed = await prekeyer.take(key)
+        if keyed is not None:
+            logging.info(
+                f"Using pre-keyed design {order.design_number} for job {job.id}"
+            )
+    if keyed is None:
+        store = get_artifact_store(configuration.artifact_store_dir)
+        source = await run_io(store.get, order.source_ref)
+        keyed = await key_design(source, order.keying_threshold, order.keying_feather)
+
+    local_path = os.path.join("images", order.email, order.output_name)
+    blob_name = f"{order.email}/{order.output_name}"
+    if order.print_dpi > 0:
+        rendered = await print_file(keyed, order, configuration)
+        await run_io(_link_or_copy, rendered, local_path)
+        public_url = await aupload_file(local_path, blob_name)
+    else:
+        public_url, _ = await asyncio.gather(
+            aupload_bytes(keyed, blob_name),
+            run_io(write_file, local_path, keyed),
+        )
+    if configuration.prekey_cache_size > 0:
+        # The design is chosen: stop keying the other candidates.
+        get_prekeyer(configuration.prekey_cache_size).discard_pending(order.thread_id)
+    return public_url, local_path
+
+
+class ProductionWorkers:
+    """A pool of worker tasks draining a `ProductionQueue` on one event loop.
+
+    Args:
+        queue (ProductionQueue): The queue to drain.
+        configuration (Configuration): Settings used to make the files.
+        concurrency (int): Number of jobs run at once.
+        poll_interval (float): Seconds between polls when idle; `notify`
+            wakes the workers early for jobs enqueued in this process.
+    """
+
+    def __init__(
+        self,
+        queue: ProductionQueue,
+        configuration: Configuration,
+        concurrency: int,
+        poll_interval: float = POLL_INTERVAL,
+    ) -> None:
+        self.queue = queue
+        self.configuration = configuration
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+        self._wake = asyncio.Event()
+        self._tasks: list[asyncio.Task[None]] = []
+
+    def start(self) -> None:
+        """Start the worker tasks on the running loop."""
+        if not self._tasks:
+            self._tasks = [
+                asyncio.create_task(self._work(), name=f"production-worker-{i}")
+                for i in range(max(1, self.concurrency))
+            ]
+            logging.info(f"Started {len(self._tasks)} production workers")
+
+    def notify(self) -> None:
+        """Wake idle workers to look for new jobs."""
+        self._wake.set()
+
+    async def stop(self) -> None:
+        """Cancel the workers. Jobs they held are retried once their lease expires."""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def _work(self) -> None:
+        while True:
+            # Cleared before claiming, so a notify during the claim is not lost.
+            self._wake.clear()
+            try:
+                job = await run_io(self.queue.claim)
+            except Exception as e:
+                logging.error(f"Could not claim a production job: {e}")
+                job = None
+            if job is None:
+                with contextlib.suppress(TimeoutError):
+                    await asyncio.wait_for(self._wake.wait(), self.poll_interval)
+                continue
+            try:
+                await self._run(job)
+            except Exception:
+                # Recording the outcome failed, e.g. the database stayed
+                # locked; the job is retried once its lease expires.
+                logging.exception(f"Could not record production job {job.id}")
+
+    async def _run(self, job: ProductionJob) -> None:
+        logging.info(f"Running production job {job.id} (attempt {job.attempts})")
+        try:
+            public_url, local_path = await produce(job, self.configuration)
+        except Exception as e:
+            updated = await run_io(self.queue.fail, job, f"{type(e).__name__}: {e}")
+            if updated is not None and updated.status == QUEUED:
+                delay = updated.next_run_at - time.time()
+                logging.warning(
+                    f"Production job {job.id} failed ({e}); retry in {delay:.1f}s"
+                )
+            else:
+                logging.error(f"Production job {job.id} failed for good: {e}")
+            return
+        if await run_io(self.queue.complete, job, public_url, local_path):
+            logging.info(f"Production job {job.id} done: {public_url}")
+
+
+_workers: weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, ProductionWorkers] = (
+    weakref.WeakKeyDictionary()
+)
+
+
+async def ensure_production_workers(configuration: Configuration) -> ProductionWorkers:
+    """Return the workers of the running event loop, starting them on first use."""
+    loop = asyncio.get_running_loop()
+    workers = _workers.get(loop)
+    if workers is None:
+        queue = await run_io(get_production_queue, configuration)
+        workers = _workers[loop] = ProductionWorkers(
+            queue, configuration, configuration.production_workers
+        )
+        workers.start()
+    return workers
+
+
+async def stop_production_workers() -> None:
+    """Stop the workers of the running event loop, if any."""
+    workers = _workers.pop(asyncio.get_running_loop(), None)
+    if workers is not None:
+        await workers.stop()
+
+
+async def wait_for_job(
+    queue: ProductionQueue,
+    job_id: str,
+    timeout: float = 60.0,
+    poll_interval: float = 0.05,
+) -> ProductionJob:
+    """Poll until a job is done or failed and return it.
+
+    Raises:
+        TimeoutError: If the job is still pending after `timeout` seconds.
+    """
+    deadline = time.monotonic() + timeout
+    while True:
+        job = await run_io(queue.get, job_id)
+        if job is None:
+            raise KeyError(job_id)
+        if job.finished:
+            return job
+        if time.monotonic() > deadline:
+            raise TimeoutError(f"Production job {job_id} still {job.status}")
+        await asyncio.sleep(poll_interval)
@@ -0,0 +1,269 @@
+"""Garment mockup previews of a design on each product type.
+
+While finishing, the user picks a product type without seeing the design on
+it. `render_mockups` composites a design onto a garment template of each
+type, fast enough to preview every design on every product during a turn:
+
+- each `GarmentTemplate` is built once per process and cached: the shaded
+  garment, the fold shading and fabric texture the ink takes on, and the
+  displacement that bends the print along the folds, already reduced to the
+  print area as a gather index;
+- a render decodes and keys the design once for all products, resizes it to
+  the print area, and blends it onto each template with a few vectorized
+  NumPy operations on that area only.
+
+The templates are drawn procedurally, so no garment photos ship with the
+app. The functions only take picklable arguments, so they run in the CPU
+pool; `warm_templates` builds the templates when a pool worker starts.
+"""
+
+from __future__ import annotations
+
+import functools
+import io
+from dataclasses import dataclass
+
+import numpy as np
+from PIL import Image, ImageDraw, ImageFilter
+
+from agent.imaging import DEFAULT_KEYING_THRESHOLD, key_black_to_transparent
+
+PRODUCT_TYPES = ("LISO", "JASPEADO")
+# Width and height of a mockup in pixels.
+MOCKUP_SIZE = (480, 560)
+
+# T-shirt outline and print area as fractions of the mockup size.
+_OUTLINE = [
+    (0.38, 0.06), (0.18, 0.11), (0.02, 0.33), (0.14, 0.40), (0.21, 0.31),
+    (0.21, 0.95), (0.79, 0.95), (0.79, 0.31), (0.86, 0.40), (0.98, 0.33),
+    (0.82, 0.11), (0.62, 0.06),
+]  # fmt: skip
+_NECKLINE = (0.38, 0.0, 0.62, 0.13)
+_PRINT_AREA = (0.31, 0.25, 0.38, 0.42)  # left, top, width, height
+_SUPERSAMPLE = 3  # Outline drawn this many times larger, then reduced to anti-alias it.
+_BACKGROUND = (0.93, 0.93, 0.94)
+# Base color of the fabric and how strongly its texture varies.
+_FABRICS = {
+    "LISO": ((0.95, 0.94, 0.91), 0.012),
+    "JASPEADO": ((0.60, 0.61, 0.63), 0.09),
+}
+_DISPLACEMENT_PX = 3.0  # Largest shift of the print along a fold.
+
+
+@dataclass(frozen=True, eq=False)
+class GarmentTemplate:
+    """A garment to preview designs on, with the maps used to print on it.
+
+    Attributes:
+        product_type (str): The product type the garment shows.
+        base (np.ndarray): ``(H, W, 3)`` uint8 shaded garment on its background.
+        print_area (tuple[int, int, int, int]): Left, top, width and height
+            of the area a design is printed on.
+        area_base (np.ndarray): ``(h, w, 3)`` float32 copy of `base` over the
+            print area, in 0-1.
+        warp (np.ndarray): ``(h * w,)`` int32 index, into the flattened print
+            area, of the design pixel shown at each pixel; bends the design
+            along the folds.
+        ink_shading (np.ndarray): ``(h, w, 1)`` float32 factor applied to the
+            ink: the fold shading and part of the fabric texture.
+        coverage (np.ndarray): ``(h, w, 1)`` float32 share of each print
+            area pixel covered by fabric.
+    """
+
+    product_type: str
+    base: np.ndarray
+    print_area: tuple[int, int, int, int]
+    area_base: np.ndarray
+    warp: np.ndarray
+    ink_shading: np.ndarray
+    coverage: np.ndarray
+
+
+def _silhouette(width: int, height: int) -> np.ndarray:
+    """Return the anti-aliased garment mask, 0-1."""
+    big = (width * _SUPERSAMPLE, height * _SUPERSAMPLE)
+    mask = Image.new("L", big, 0)
+    draw = ImageDraw.Draw(mask)
+    draw.polygon([(x * big[0], y * big[1]) for x, y in _OUTLINE], fill=255)
+    left, top, right, bottom = _NECKLINE
+    draw.ellipse((left * big[0], top * big[1], right * big[0], bottom * big[1]), fill=0)
+    mask = mask.resize((width, height), Image.Resampling.BOX)
+    return np.asarray(mask, dtype=np.float32) / 255
+
+
+def _smooth_noise(
+    rng: np.random.Generator, width: int, height: int, cells: int
+) -> np.ndarray:
+    """Return low-frequency noise in about [-1, 1], upscaled from a coarse grid."""
+    coarse = rng.uniform(-1, 1, size=(cells, cells)).astype(np.float32)
+    return np.asarray(
+        Image.fromarray(coarse).resize((width, height), Image.Resampling.BICUBIC)
+    )
+
+
+def _fabric_texture(
+    rng: np.random.Generator, product_type: str, width: int, height: int
+) -> np.ndarray:
+    """Return the per-pixel brightness factor of the fabric, around 1."""
+    _, strength = _FABRICS[product_type]
+    grain = rng.normal(size=(height, width)).astype(np.float32)
+    if product_type == "JASPEADO":
+        # Heathered yarn: mixed fibers make short vertical streaks.
+        streaks = rng.normal(size=(-(-height // 4), width)).astype(np.float32)
+        grain = 0.4 * grain + 0.6 * np.repeat(streaks, 4, axis=0)[:height]
+    return 1 + strength * np.clip(grain, -2.5, 2.5) / 2.5
+
+
+@functools.cache
+def garment_template(product_type: str) -> GarmentTemplate:
+    """Return the garment template of a product type, built on first use.
+
+    Args:
+        product_type (str): One of `PRODUCT_TYPES`, in any case.
+
+    Returns:
+        GarmentTemplate: The cached template.
+
+    Raises:
+        ValueError: If the product type is unknown.
+    """
+    product_type = product_type.upper()
+    if product_type not in _FABRICS:
+        raise ValueError(
+            f"Unknown product type {product_type!r}; expected one of {', '.join(PRODUCT_TYPES)}"
+        )
+    width, height = MOCKUP_SIZE
+    # Seeded per product so every process draws the same garment.
+    rng = np.random.default_rng(PRODUCT_TYPES.index(product_type))
+    mask = _silhouette(width, height)
+
+    # Folds: a height field of broad and narrower creases. The shading
+    # lights its slopes from the top left; the displacement follows them.
+    folds = 0.7 * _smooth_noise(rng, width, height, 5) + 0.3 * _smooth_noise(
+        rng, width, height, 11
+    )
+    slope_y, slope_x = np.gradient(folds)
+    steepest = max(float(np.abs(slope_x).max()), float(np.abs(slope_y).max()), 1e-6)
+    slope_x, slope_y = slope_x / steepest, slope_y / steepest
+    shading = 1 + 0.06 * folds - 0.12 * (slope_x + slope_y)
+    # Darken toward the outline, where the garment turns away.
+    edges = Image.fromarray((mask * 255).astype(np.uint8)).filter(
+        ImageFilter.GaussianBlur(10)
+    )
+    shading *= 0.82 + 0.18 * np.asarray(edges, dtype=np.float32) / 255
+
+    texture = _fabric_texture(rng, product_type, width, height)
+    color = np.asarray(_FABRICS[product_type][0], dtype=np.float32)
+    garment = color * (texture * shading)[..., None]
+    background = np.asarray(_BACKGROUND, dtype=np.float32)
+    base = background + (garment - background) * mask[..., None]
+
+    left, top, area_width, area_height = (
+        round(f * size)
+        for f, size in zip(_PRINT_AREA, (width, height, width, height), strict=True)
+    )
+    area = np.s_[top : top + area_height, left : left + area_width]
+    rows, cols = np.mgrid[0:area_height, 0:area_width]
+    source_rows = np.clip(
+        np.rint(rows - _DISPLACEMENT_PX * slope_y[area]), 0, area_height - 1
+    )
+    source_cols = np.clip(
+        np.rint(cols - _DISPLACEMENT_PX * slope_x[area]), 0, area_width - 1
+    )
+    warp = (source_rows * area_width + source_cols).astype(np.int32).ravel()
+    # The ink sits on the fibers, so it takes on some of their texture.
+    ink_shading = shading[area] * (1 + (texture[area] - 1) * 0.5)
+
+    base_u8 = np.rint(np.clip(base, 0, 1) * 255).astype(np.uint8)
+    return GarmentTemplate(
+        product_type=product_type,
+        base=base_u8,
+        print_area=(left, top, area_width, area_height),
+        area_base=base_u8[area].astype(np.float32) / 255,
+        warp=warp,
+        ink_shading=ink_shading[..., None].astype(np.float32),
+        coverage=mask[area][..., None],
+    )
+
+
+def warm_templates() -> None:
+    """Build the template of every product type, so renders never wait for one."""
+    for product_type in PRODUCT_TYPES:
+        garment_template(product_type)
+
+
+def _fit(design: Image.Image, width: int, height: int) -> np.ndarray:
+    """Resize a premultiplied design into a print area, centered and top aligned.
+
+    Returns:
+        np.ndarray: ``(height, width, 4)`` float32 premultiplied RGBA, 0-1.
+    """
+    scale = min(width / design.width, height / design.height)
+    size = (max(1, round(design.width * scale)), max(1, round(design.height * scale)))
+    fitted = np.asarray(
+        design.resize(size, Image.Resampling.BILINEAR, reducing_gap=2.0)
+    )
+    area = np.zeros((height, width, 4), dtype=np.float32)
+    left = (width - size[0]) // 2
+    area[: size[1], left : left + size[0]] = fitted / np.float32(255)
+    return area
+
+
+def composite(design: np.ndarray, template: GarmentTemplate) -> np.ndarray:
+    """Print a fitted design on a garment.
+
+    Args:
+        design (np.ndarray): ``(h, w, 4)`` float32 premultiplied RGBA the
+            size of the template's print area, as returned by `_fit`.
+        template (GarmentTemplate): The garment to print on.
+
+    Returns:
+        np.ndarray: ``(H, W, 3)`` uint8 mockup.
+    """
+    left, top, width, height = template.print_area
+    bent = design.reshape(-1, 4)[template.warp].reshape(height, width, 4)
+    # "Over" with premultiplied ink, limited to the fabric under the area.
+    alpha = bent[..., 3:] * template.coverage
+    ink = bent[..., :3] * template.ink_shading * template.coverage
+    area = ink + template.area_base * (1 - alpha)
+    mockup = template.base.copy()
+    mockup[top : top + height, left : left + width] = np.rint(np.clip(area, 0, 1) * 255)
+    return mockup
+
+
+def render_mockups(
+    data: bytes,
+    product_types: tuple[str, ...] = PRODUCT_TYPES,
+    threshold: float = DEFAULT_KEYING_THRESHOLD,
+    feather: float = 0,
+) -> list[bytes]:
+    """Render a design on the garment of each product type.
+
+    Args:
+        data (bytes): The encoded design, as generated (not yet keyed).
+        product_types (tuple[str, ...]): The products to preview it on.
+        threshold (float): Keying threshold, as used for production.
+        feather (float): Keying feather, as used for production.
+
+    Returns:
+        list[bytes]: One JPEG mockup per product type, in order.
+    """
+    with Image.open(io.BytesIO(data)) as img:
+        # Premultiplied, so the keyed-out background does not darken the
+        # design's edges when it is scaled down.
+        design = key_black_to_transparent(img, threshold, feather).convert("RGBa")
+    fitted: dict[tuple[int, int], np.ndarray] = {}
+    mockups = []
+    for product_type in product_types:
+        template = garment_template(product_type)
+        _, _, width, height = template.print_area
+        if (width, height) not in fitted:
+            fitted[width, height] = _fit(design, width, height)
+        buffer = io.BytesIO()
+        # Mockups are opaque and photographic: JPEG encodes them over ten
+        # times faster than PNG, into files about a sixth of the size.
+        Image.fromarray(composite(fitted[width, height], template)).save(
+            buffer, "JPEG", quality=90
+        )
+        mockups.append(buffer.getvalue())
+    return mockups
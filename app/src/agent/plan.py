@@ -0,0 +1,127 @@
+"""Incremental handling of the ``<Plan>...</Plan>`` prefix of model replies.
+
+The system prompts ask the model to open every reply with its internal plan
+wrapped in ``<Plan>`` tags. That text must never reach the user, including
+while a reply is being streamed token by token.
+"""
+
+from __future__ import annotations
+
+from collections.abc import Sequence
+from typing import Any, cast
+
+from langchain_core.messages import AIMessage, AIMessageChunk, message_chunk_to_message
+from langchain_core.messages.ai import add_ai_message_chunks
+from langchain_core.runnables import Runnable
+
+PLAN_OPEN = "<Plan>"
+PLAN_CLOSE = "</Plan>"
+
+
+class PlanFilter:
+    """Split a streamed reply into the hidden plan and the user-facing text.
+
+    Feed the reply chunk by chunk; `feed` returns the user-facing text that
+    can be shown so far. Plan text is held back until ``</Plan>`` arrives and
+    everything after it is released immediately. A reply that does not open
+    with ``<Plan>`` is passed through unchanged.
+    """
+
+    def __init__(self) -> None:
+        self.plan: str | None = None
+        # Text held back so far, kept as parts to avoid quadratic joins.
+        self._parts: list[str] = []
+        # Tail of the held text that may hold the start of a split "</Plan>".
+        self._tail = ""
+        # start -> plan -> gap -> text, or start -> text
+        self._state = "start"
+
+    def feed(self, chunk: str) -> str:
+        """Consume the next chunk and return the text that became visible."""
+        if self._state == "text":
+            return chunk
+        if self._state == "gap":
+            return self._release(chunk.lstrip())
+
+        if self._state == "start":
+            head = ("".join(self._parts) + chunk).lstrip()
+            if PLAN_OPEN.startswith(head):
+                self._parts.append(chunk)
+                return ""  # Still undecided, e.g. "<Pl".
+            if not head.startswith(PLAN_OPEN):
+                return self._release("".join(self._parts) + chunk)
+            # Continue with the text after the opening tag as plan text.
+            chunk = head[len(PLAN_OPEN) :]
+            self._parts = []
+            self._state = "plan"
+
+        window = self._tail + chunk
+        end = window.find(PLAN_CLOSE)
+        if end == -1:
+            self._parts.append(chunk)
+            self._tail = window[-(len(PLAN_CLOSE) - 1) :]
+            return ""
+        held = "".join(self._parts) + chunk
+        end += len(held) - len(window)
+        self.plan = held[:end].strip()
+        self._parts = []
+        self._state = "gap"
+        return self._release(held[end + len(PLAN_CLOSE) :].lstrip())
+
+    def finish(self) -> str:
+        """Return any text still held back once the reply has ended.
+
+        A reply that opened a plan but never closed it is shown in full,
+        tags included, rather than swallowed.
+        """
+        if self._state == "start":
+            return self._release("".join(self._parts))
+        if self._state == "plan":
+            return self._release(PLAN_OPEN + "".join(self._parts))
+        return ""
+
+    def _release(self, text: str) -> str:
+        """Switch to pass-through once there is visible text to show."""
+        if text:
+            self._parts = []
+            self._state = "text"
+        return text
+
+
+async def ainvoke_with_plan(
+    model: Runnable[Any, Any], messages: Sequence[Any]
+) -> AIMessage:
+    """Stream a model reply through a `PlanFilter` and return the final message.
+
+    The plan is moved to ``response_metadata["internal_plan"]`` and the
+    content keeps only the user-facing text. Chunks are merged once at the
+    end rather than re-scanned as the reply grows.
+
+    Args:
+        model (Runnable): The (tool-bound) chat model to call.
+        messages (Sequence): The prompt messages.
+
+    Returns:
+        AIMessage: The reply without its plan, tool calls included; empty if
+            the model streamed no chunks.
+    """
+    plan_filter = PlanFilter()
+    chunks: list[AIMessageChunk] = []
+    visible: list[str] = []
+    async for chunk in model.astream(list(messages)):
+        chunks.append(chunk)
+        if isinstance(chunk.content, str) and chunk.content:
+            visible.append(plan_filter.feed(chunk.content))
+    visible.append(plan_filter.finish())
+    if not chunks:
+        # The model streamed nothing; there is nothing to merge.
+        return AIMessage(content="")
+
+    response = cast(AIMessage, message_chunk_to_message(add_ai_message_chunks(*chunks)))
+    response_metadata = dict(response.response_metadata or {})
+    if plan_filter.plan is not None:
+        response_metadata["internal_plan"] = plan_filter.plan
+    update: dict[str, Any] = {"response_metadata": response_metadata}
+    if isinstance(response.content, str):
+        update["content"] = "".join(visible).strip()
+    return response.model_copy(update=update)
@@ -0,0 +1,137 @@
+"""Speculative keying of candidate designs.
+
+Keying the chosen design on the CPU pool is the slowest step of making a
+production file, and it could only start once the finishing model called
+``execute_production_file``. Every design a thread has generated is a
+candidate from the moment it enters the finishing state, so keying all of
+them can start in the background there; by the time the user has named the
+design, size and product type, the production file is usually already keyed
+and only has to be uploaded.
+
+`Prekeyer` holds that speculative work as tasks keyed by the artifact
+reference (the digest) of the source image and the keying parameters, so a
+choice resolves to its prepared file whichever variant the user picked. Work
+is bounded by an LRU, and a thread's unfinished jobs are cancelled once its
+production file has been made.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import functools
+import logging
+import weakref
+from collections import OrderedDict
+from collections.abc import Awaitable, Callable, Hashable
+
+from agent.executors import run_cpu
+from agent.imaging import key_png
+
+_prekeyers: weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Prekeyer] = (
+    weakref.WeakKeyDictionary()
+)
+
+
+def prekey_key(ref: str, threshold: float, feather: float) -> tuple[str, float, float]:
+    """Identify the keyed production image of a design source."""
+    return ref, threshold, feather
+
+
+async def key_design(source: bytes, threshold: float, feather: float) -> bytes:
+    """Key a design for production on the CPU pool."""
+    return await run_cpu(key_png, source, threshold=threshold, feather=feather)
+
+
+class Prekeyer:
+    """Speculative jobs of one event loop, bounded by an LRU.
+
+    Args:
+        max_entries (int): Jobs kept, running or finished. Evicting a job
+            that is still running cancels it.
+    """
+
+    def __init__(self, max_entries: int) -> None:
+        self.max_entries = max_entries
+        self._jobs: OrderedDict[Hashable, asyncio.Task[bytes]] = OrderedDict()
+        self._owners: dict[Hashable, str | None] = {}
+
+    def __len__(self) -> int:
+        return len(self._jobs)
+
+    def schedule(
+        self,
+        key: Hashable,
+        make: Callable[[], Awaitable[bytes]],
+        thread_id: str | None = None,
+    ) -> bool:
+        """Start `make` in the background unless a job for `key` already exists.
+
+        Returns:
+            bool: Whether a new job was started.
+        """
+        if key in self._jobs:
+            self._jobs.move_to_end(key)
+            return False
+        job = self._jobs[key] = asyncio.ensure_future(make())
+        job.add_done_callback(functools.partial(_log_failure, key))
+        self._owners[key] = thread_id
+        while len(self._jobs) > self.max_entries:
+            self._drop(next(iter(self._jobs)))
+        return True
+
+    async def take(self, key: Hashable) -> bytes | None:
+        """Return the result of the job for `key`, waiting if it is still running.
+
+        Returns None when there is no job, or it was cancelled or failed; the
+        caller then does the work itself.
+        """
+        job = self._jobs.get(key)
+        if job is None:
+            return None
+        self._jobs.move_to_end(key)
+        try:
+            # Shielded: a cancelled caller must not cancel the shared job.
+            return await asyncio.shield(job)
+        except asyncio.CancelledError:
+            if not job.cancelled():
+                raise
+            return None
+        except Exception:
+            # Already logged by _log_failure.
+            self._drop(key)
+            return None
+
+    def discard_pending(self, thread_id: str | None) -> int:
+        """Cancel the unfinished jobs of a thread. Returns how many were cancelled."""
+        pending = [
+            key
+            for key, job in self._jobs.items()
+            if self._owners.get(key) == thread_id and not job.done()
+        ]
+        for key in pending:
+            self._drop(key)
+        if pending:
+            logging.info(
+                f"Cancelled {len(pending)} speculative jobs of thread {thread_id}"
+            )
+        return len(pending)
+
+    def _drop(self, key: Hashable) -> None:
+        job = self._jobs.pop(key, None)
+        self._owners.pop(key, None)
+        if job is not None:
+            job.cancel()
+
+
+def _log_failure(key: Hashable, job: asyncio.Future[bytes]) -> None:
+    if not job.cancelled() and (error := job.exception()) is not None:
+        logging.warning(f"Speculative job {key} failed: {error}")
+
+
+def get_prekeyer(max_entries: int) -> Prekeyer:
+    """Return the prekeyer of the running event loop."""
+    loop = asyncio.get_running_loop()
+    prekeyer = _prekeyers.get(loop)
+    if prekeyer is None:
+        prekeyer = _prekeyers[loop] = Prekeyer(max_entries)
+    return prekeyer
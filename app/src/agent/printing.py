@@ -0,0 +1,278 @@
+"""Print-resolution rendering of production files.
+
+A design comes out of the image API at 1024x1024, far below what a print
+shop needs at its physical size: a 30 cm print at 300 DPI is over 3500
+pixels wide. `render_print_files` upscales a keyed design to the width of
+each talle at a given DPI without ever holding a whole output in memory:
+
+- the source is decoded and premultiplied by its alpha once, however many
+  outputs are rendered from it;
+- each output is resampled in horizontal strips, every strip resized from
+  its own box of the source, so the seams match a full-frame resize;
+- each strip is filtered and compressed straight into the PNG file by
+  `PngStreamWriter`, so memory is bounded by the strip, not the output.
+
+The functions only take picklable arguments, so they run in the CPU pool.
+"""
+
+from __future__ import annotations
+
+import io
+import os
+import struct
+import zlib
+from typing import BinaryIO
+
+import numpy as np
+from PIL import Image
+
+# Print width in centimetres of each talle. Designs keep their aspect ratio.
+PRINT_WIDTHS_CM = {"s": 24.0, "m": 27.0, "l": 30.0, "xl": 33.0}
+CM_PER_INCH = 2.54
+# Output rows resampled and compressed at a time.
+DEFAULT_STRIP_ROWS = 256
+
+_PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+_IDAT_BYTES = 1 << 16  # Compressed bytes buffered before an IDAT chunk is written.
+_FILTER_NONE, _FILTER_SUB, _FILTER_UP = 0, 1, 2
+# IHDR bit depth and color types: the only ones streamed, and their channels.
+_BIT_DEPTH = 8
+_COLOR_RGB, _COLOR_RGBA = 2, 6
+_CHANNELS = {_COLOR_RGB: 3, _COLOR_RGBA: 4}
+# Decompressed bytes produced per zlib call while reading, bounding memory on
+# highly compressible (mostly transparent) images.
+_READ_BYTES = 1 << 20
+
+
+def print_width_px(width_cm: float, dpi: int) -> int:
+    """Return the pixel width of a print `width_cm` wide at `dpi`."""
+    return max(1, round(width_cm / CM_PER_INCH * dpi))
+
+
+def _chunk(kind: bytes, data: bytes) -> bytes:
+    return (
+        struct.pack(">I", len(data))
+        + kind
+        + data
+        + struct.pack(">I", zlib.crc32(kind + data) & 0xFFFFFFFF)
+    )
+
+
+class PngStreamWriter:
+    """Write an 8-bit RGBA PNG to a file a block of rows at a time.
+
+    Rows are filtered with the PNG ``Sub`` filter, vectorized over the block,
+    and compressed incrementally, so only one block and the compressor's
+    window are in memory at once.
+
+    Args:
+        file (BinaryIO): Binary file to write to.
+        width (int): Image width in pixels.
+        height (int): Image height in pixels.
+        dpi (int | None): Resolution recorded in the ``pHYs`` chunk.
+        compress_level (int): zlib level, 0-9.
+    """
+
+    def __init__(
+        self,
+        file: BinaryIO,
+        width: int,
+        height: int,
+        dpi: int | None = None,
+        compress_level: int = 6,
+    ) -> None:
+        self.file = file
+        self.width = width
+        self.height = height
+        self.rows_written = 0
+        self._compressor = zlib.compressobj(compress_level)
+        self._pending: list[bytes] = []
+        self._pending_bytes = 0
+        # 8-bit RGBA, default compression and filter method, no interlace.
+        header = struct.pack(
+            ">IIBBBBB", width, height, _BIT_DEPTH, _COLOR_RGBA, 0, 0, 0
+        )
+        file.write(_PNG_SIGNATURE + _chunk(b"IHDR", header))
+        if dpi:
+            pixels_per_metre = round(dpi / CM_PER_INCH * 100)
+            file.write(
+                _chunk(
+                    b"pHYs", struct.pack(">IIB", pixels_per_metre, pixels_per_metre, 1)
+                )
+            )
+
+    def write_rows(self, rows: np.ndarray) -> None:
+        """Append a ``(rows, width, 4)`` uint8 block below the rows written so far."""
+        if rows.shape[1:] != (self.width, 4) or rows.dtype != np.uint8:
+            raise ValueError(
+                f"Expected uint8 rows of shape (n, {self.width}, 4), got {rows.shape}"
+            )
+        if self.rows_written + len(rows) > self.height:
+            raise ValueError(f"More than {self.height} rows written")
+        flat = rows.reshape(len(rows), -1)
+        filtered = np.empty((len(rows), flat.shape[1] + 1), dtype=np.uint8)
+        filtered[:, 0] = _FILTER_SUB
+        filtered[:, 1:5] = flat[:, :4]
+        # Sub: each byte minus the same channel of the pixel to its left, mod 256.
+        np.subtract(flat[:, 4:], flat[:, :-4], out=filtered[:, 5:])
+        self._emit(self._compressor.compress(filtered.tobytes()))
+        self.rows_written += len(rows)
+
+    def close(self) -> None:
+        """Flush the compressor and end the file. Does not close `file`."""
+        if self.rows_written != self.height:
+            raise ValueError(f"Wrote {self.rows_written} of {self.height} rows")
+        self._emit(self._compressor.flush(), force=True)
+        self.file.write(_chunk(b"IEND", b""))
+
+    def _emit(self, data: bytes, force: bool = False) -> None:
+        if data:
+            self._pending.append(data)
+            self._pending_bytes += len(data)
+        if self._pending_bytes >= _IDAT_BYTES or (force and self._pending):
+            self.file.write(_chunk(b"IDAT", b"".join(self._pending)))
+            self._pending, self._pending_bytes = [], 0
+
+
+class PngStreamReader:
+    """Read an 8-bit RGB or RGBA PNG a block of rows at a time.
+
+    The counterpart of `PngStreamWriter`: rows are decompressed and
+    unfiltered as they are read, so memory is bounded by the block. Only the
+    None, Sub and Up filters can be undone row-vectorized; a row using
+    another filter raises ValueError, and the caller decodes the whole image
+    instead. Files written by `PngStreamWriter` only use Sub.
+
+    Args:
+        file (BinaryIO): Binary file positioned at the PNG signature.
+
+    Raises:
+        ValueError: If the file is not a PNG this reader supports.
+    """
+
+    def __init__(self, file: BinaryIO) -> None:
+        self.file = file
+        if file.read(8) != _PNG_SIGNATURE:
+            raise ValueError("Not a PNG file")
+        length, kind = struct.unpack(">I4s", file.read(8))
+        if kind != b"IHDR":
+            raise ValueError("PNG does not start with IHDR")
+        header = file.read(length)
+        file.read(4)  # CRC
+        width, height, depth, color_type, _, _, interlace = struct.unpack(
+            ">IIBBBBB", header
+        )
+        if depth != _BIT_DEPTH or color_type not in _CHANNELS or interlace:
+            raise ValueError("Only non-interlaced 8-bit RGB and RGBA PNGs are streamed")
+        self.width = width
+        self.height = height
+        self.channels = _CHANNELS[color_type]
+        self._opaque = color_type == _COLOR_RGB
+        self.rows_read = 0
+        self._stride = width * self.channels
+        self._decompressor = zlib.decompressobj()
+        self._buffer = bytearray()
+        self._previous = np.zeros(self._stride, dtype=np.uint8)
+        self._idat_left = 0
+
+    def read_rows(self, count: int) -> np.ndarray:
+        """Return the next `count` rows as a ``(count, width, 4)`` uint8 array."""
+        count = min(count, self.height - self.rows_read)
+        needed = count * (self._stride + 1)
+        while len(self._buffer) < needed:
+            self._buffer += self._inflate()
+        block = np.frombuffer(bytes(self._buffer[:needed]), dtype=np.uint8)
+        del self._buffer[:needed]
+        block = block.reshape(count, self._stride + 1)
+        rows = np.empty((count, self._stride), dtype=np.uint8)
+        previous = self._previous
+        for i, (kind, data) in enumerate(zip(block[:, 0], block[:, 1:], strict=True)):
+            if kind == _FILTER_NONE:
+                rows[i] = data
+            elif kind == _FILTER_SUB:
+                # Undo "minus the pixel to the left": a running sum per channel, mod 256.
+                pixels = data.reshape(-1, self.channels)
+                np.cumsum(
+                    pixels, axis=0, dtype=np.uint8, out=rows[i].reshape(pixels.shape)
+                )
+            elif kind == _FILTER_UP:
+                np.add(data, previous, out=rows[i])
+            else:
+                raise ValueError(f"PNG filter {kind} cannot be streamed")
+            previous = rows[i]
+        self._previous = previous.copy()
+        self.rows_read += count
+        pixels = rows.reshape(count, self.width, self.channels)
+        if self._opaque:
+            opaque = np.full((count, self.width, 1), 255, dtype=np.uint8)
+            pixels = np.concatenate([pixels, opaque], axis=2)
+        return pixels
+
+    def _inflate(self) -> bytes:
+        """Decompress the next piece of image data."""
+        if self._decompressor.unconsumed_tail:
+            return self._decompressor.decompress(
+                self._decompressor.unconsumed_tail, _READ_BYTES
+            )
+        while self._idat_left == 0:
+            length, kind = struct.unpack(">I4s", self.file.read(8))
+            if kind == b"IDAT":
+                self._idat_left = length
+            elif kind == b"IEND":
+                raise ValueError("PNG ended before its last row")
+            else:
+                self.file.seek(length + 4, os.SEEK_CUR)
+        data = self.file.read(min(self._idat_left, _IDAT_BYTES))
+        self._idat_left -= len(data)
+        if self._idat_left == 0:
+            self.file.read(4)  # CRC
+        return self._decompressor.decompress(data, _READ_BYTES)
+
+
+def render_print_files(
+    data: bytes,
+    outputs: list[tuple[str, int]],
+    dpi: int,
+    strip_rows: int = DEFAULT_STRIP_ROWS,
+    compress_level: int = 6,
+) -> list[tuple[int, int]]:
+    """Upscale an encoded RGBA design to several print widths, one PNG each.
+
+    Args:
+        data (bytes): The encoded design, usually a keyed production PNG.
+        outputs (list[tuple[str, int]]): ``(path, width_px)`` of each output.
+            Heights follow the design's aspect ratio. Each file is written
+            under a temporary name and renamed once complete.
+        dpi (int): Resolution recorded in the outputs.
+        strip_rows (int): Output rows resampled at a time; bounds memory.
+        compress_level (int): zlib level of the outputs, 0-9.
+
+    Returns:
+        list[tuple[int, int]]: The ``(width, height)`` of each output.
+    """
+    with Image.open(io.BytesIO(data)) as img:
+        # Premultiplied once, so transparent pixels do not bleed their color
+        # into the edges, and resized strips need no conversion of the source.
+        source = img.convert("RGBA").convert("RGBa")
+    source_width, source_height = source.size
+    sizes = []
+    for path, width in outputs:
+        height = max(1, round(width * source_height / source_width))
+        scale = source_height / height
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        partial_path = f"{path}.part"
+        with open(partial_path, "wb") as f:
+            writer = PngStreamWriter(
+                f, width, height, dpi=dpi, compress_level=compress_level
+            )
+            for top in range(0, height, strip_rows):
+                bottom = min(height, top + strip_rows)
+                box = (0, top * scale, source_width, bottom * scale)
+                strip = source.resize(
+                    (width, bottom - top), Image.Resampling.LANCZOS, box=box
+                )
+                writer.write_rows(np.asarray(strip.convert("RGBA")))
+            writer.close()
+        os.replace(partial_path, path)
+        sizes.append((width, height))
+    return sizes
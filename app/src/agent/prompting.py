@@ -0,0 +1,114 @@
+"""Prompt assembly.
+
+Templates are compiled once into their literal and placeholder parts, so
+rendering is a join instead of a parse. The system prompts are rendered to
+byte-stable text: OpenAI caches the longest prompt prefix it has already
+seen, so anything that changes per call, such as the current time, goes at the
+end of the last user turn instead of inside the system prompt. It is not sent
+as a system message of its own because several providers only accept one, as
+the first message.
+"""
+
+from __future__ import annotations
+
+import functools
+import logging
+import string
+from collections.abc import Sequence
+from datetime import UTC, datetime
+from typing import Any
+
+from langchain_core.messages import BaseMessage, HumanMessage
+
+# Stands in for {system_time} inside a system prompt; the time itself is sent last.
+SYSTEM_TIME_REFERENCE = "la fecha y hora indicadas en el último mensaje del usuario"
+# Opens the line with the current time added to the last user turn.
+CURRENT_TIME_LABEL = "Fecha y hora actual:"
+
+
+class PromptTemplate:
+    """A ``str.format``-style template compiled into literal and field parts.
+
+    Only plain ``{name}`` fields are supported; ``{{`` and ``}}`` escape braces.
+    """
+
+    def __init__(self, template: str) -> None:
+        self.template = template
+        self._parts: list[tuple[str, str | None]] = []
+        for literal, field, spec, conversion in string.Formatter().parse(template):
+            if spec or conversion:
+                raise ValueError(f"Unsupported format field in template: {field!r}")
+            self._parts.append((literal, field))
+        self.fields = frozenset(field for _, field in self._parts if field)
+
+    def render(self, **values: Any) -> str:
+        """Fill in the fields. Raises KeyError if one is missing."""
+        out = []
+        for literal, field in self._parts:
+            out.append(literal)
+            if field is not None:
+                out.append(str(values[field]))
+        return "".join(out)
+
+
+@functools.lru_cache(maxsize=16)
+def compile_system_prompt(template: str) -> str:
+    """Return the byte-stable system prompt for `template`.
+
+    A ``{system_time}`` field is replaced by a pointer to the trailing time
+    message. Templates without fields are returned as is, so literal braces
+    in them are kept.
+    """
+    if "{" not in template:
+        return template
+    return PromptTemplate(template).render(system_time=SYSTEM_TIME_REFERENCE)
+
+
+def build_model_messages(
+    system_template: str, history: Sequence[BaseMessage], now: datetime | None = None
+) -> list[Any]:
+    """Assemble the messages of a model call.
+
+    The order is the static system prompt, then the conversation, with the
+    current time added to the last user turn, so consecutive calls of a thread
+    share everything up to that turn.
+
+    Args:
+        system_template (str): The system prompt template.
+        history (Sequence[BaseMessage]): The conversation so far.
+        now (datetime | None): The current time; defaults to now in UTC.
+    """
+    now = now or datetime.now(tz=UTC)
+    note = f"{CURRENT_TIME_LABEL} {now.isoformat(timespec='minutes')}"
+    messages: list[Any] = [
+        {"role": "system", "content": compile_system_prompt(system_template)},
+        *history,
+    ]
+    for i in range(len(messages) - 1, 0, -1):
+        if isinstance(messages[i], HumanMessage):
+            messages[i] = _with_note(messages[i], note)
+            break
+    else:
+        messages.append(HumanMessage(content=note))
+    return messages
+
+
+def _with_note(message: HumanMessage, note: str) -> HumanMessage:
+    """Return a copy of `message` with `note` added after its content."""
+    if isinstance(message.content, str):
+        content: str | list = f"{message.content}\n\n{note}"
+    else:
+        content = [*message.content, {"type": "text", "text": note}]
+    return message.model_copy(update={"content": content})
+
+
+def log_prompt_cache_usage(usage_metadata: dict[str, Any] | None) -> None:
+    """Log how many input tokens of a model call were served from the prompt cache."""
+    if not usage_metadata:
+        return
+    input_tokens = usage_metadata.get("input_tokens", 0)
+    cached = (usage_metadata.get("input_token_details") or {}).get("cache_read", 0)
+    ratio = cached / input_tokens if input_tokens else 0.0
+    logging.info(
+        f"Prompt cache: {cached}/{input_tokens} input tokens cached ({ratio:.0%})"
+    )
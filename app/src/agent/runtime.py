@@ -0,0 +1,101 @@
+"""A long-lived event loop for synchronous front ends.
+
+Streamlit runs each script execution in a plain thread, and calling
+`asyncio.run` there creates and tears down a new event loop per turn. Every
+async client bound to that loop (the OpenAI and GCS connection pools, the
+cached chat models) loses its keep-alive connections with it. `BackgroundLoop`
+keeps one loop running in a daemon thread instead, so those pools stay warm
+across turns, and lets the caller cancel a turn that is still in flight.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import queue
+import threading
+from collections.abc import AsyncIterator, Coroutine, Iterator
+from concurrent.futures import Future
+from typing import Any, TypeVar
+
+T = TypeVar("T")
+
+_DONE = object()
+
+
+class BackgroundLoop:
+    """An asyncio event loop running forever in a daemon thread."""
+
+    def __init__(self, name: str = "ownit-loop") -> None:
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    def _run(self) -> None:
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+
+    def submit(self, coro: Coroutine[Any, Any, T]) -> Future[T]:
+        """Schedule `coro` on the loop. Cancelling the future cancels the task."""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def run(self, coro: Coroutine[Any, Any, T], timeout: float | None = None) -> T:
+        """Run `coro` on the loop and block until it finishes.
+
+        If the calling thread is interrupted while waiting (e.g. a Streamlit
+        rerun), the coroutine is cancelled rather than left running.
+        """
+        future = self.submit(coro)
+        try:
+            return future.result(timeout)
+        finally:
+            future.cancel()
+
+    def stream(
+        self, agen: AsyncIterator[T], heartbeat: float | None = None
+    ) -> Iterator[T | None]:
+        """Iterate an async iterator from a synchronous thread.
+
+        Items are produced on the loop and handed over through a queue. If the
+        consumer stops early, or is interrupted, the producer is cancelled.
+
+        Args:
+            agen (AsyncIterator): The iterator to consume.
+            heartbeat (float | None): If set, yield None whenever no item has
+                arrived for this many seconds. Streamlit only notices a stop or
+                rerun request when the script calls into it, so the consumer
+                can use these ticks to update the page while a tool runs.
+        """
+        items: queue.Queue[Any] = queue.Queue()
+
+        async def pump() -> None:
+            try:
+                async for item in agen:
+                    items.put(item)
+            except Exception as e:  # re-raised in the consumer
+                items.put(e)
+            else:
+                items.put(_DONE)
+
+        future = self.submit(pump())
+        try:
+            while True:
+                try:
+                    item = items.get(timeout=heartbeat)
+                except queue.Empty:
+                    yield None
+                    continue
+                if item is _DONE:
+                    break
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+        finally:
+            if future.cancel():
+                logging.info("Cancelled an in-flight turn")
+
+    def close(self) -> None:
+        """Stop the loop and wait for its thread to exit."""
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join()
+        self.loop.close()
@@ -2,8 +2,9 @@
 
 from __future__ import annotations
 
+import operator
 from dataclasses import dataclass, field
-from typing import Any, Dict, List, Optional, Sequence
+from typing import Any, Optional, Sequence
 
 from langchain_core.messages import AnyMessage
 from langgraph.graph import add_messages
@@ -17,7 +18,10 @@ class InputState:
         default_factory=list
     )
     email: Optional[str] = None
-    artifacts: List[Dict[str, Any]] = field(default_factory=list)
+    # Append-only: nodes return just the artifacts they created.
+    artifacts: Annotated[list[dict[str, Any]], operator.add] = field(
+        default_factory=list
+    )
     image_count: int = 0
 
 
@@ -0,0 +1,185 @@
+"""Google Cloud Storage uploads.
+
+The GCS client is built once per process and reused, so credentials are
+parsed and an OAuth token fetched once instead of on every upload. Uploads
+stream from in-memory buffers; `aupload_bytes` adds bounded concurrency and
+retries with exponential backoff on top of the blocking client;
+`aupload_file` does the same for files too large to hold in memory, such as
+print-resolution production files. Files over `RESUMABLE_UPLOAD_BYTES` go up
+as resumable uploads in chunks, each retried on its own, so a transient
+failure resends one chunk instead of the whole file.
+
+Setting ``STORAGE_EMULATOR_HOST`` points the client at a local GCS stand-in
+with anonymous credentials, which is how the tests run offline.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import functools
+import io
+import logging
+import os
+import random
+import time
+import weakref
+from typing import Any
+
+import requests
+import urllib3
+from google.api_core import exceptions as gcs_exceptions
+from google.auth import exceptions as auth_exceptions
+from google.auth.credentials import AnonymousCredentials
+from google.cloud import storage
+from google.cloud.storage.retry import DEFAULT_RETRY
+from google.oauth2 import service_account
+
+from agent import instrumentation
+from agent.configuration import Configuration
+from agent.executors import run_io
+
+# Upload errors worth retrying: server failures, throttling and the network.
+# Anything else, such as bad credentials, a missing bucket or a missing
+# secret, will not fix itself and fails right away.
+_TRANSIENT_ERRORS = (
+    gcs_exceptions.ServerError,
+    gcs_exceptions.TooManyRequests,
+    ConnectionError,
+    TimeoutError,
+    requests.exceptions.ConnectionError,
+    requests.exceptions.Timeout,
+    requests.exceptions.ChunkedEncodingError,
+    urllib3.exceptions.HTTPError,
+    auth_exceptions.TransportError,
+)
+# Files larger than this, the most the client sends in a single request, are
+# uploaded in chunks of `UPLOAD_CHUNK_BYTES`, a multiple of 256 KiB as GCS
+# requires.
+RESUMABLE_UPLOAD_BYTES = 8 << 20
+UPLOAD_CHUNK_BYTES = 8 << 20
+
+_semaphores: weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Semaphore] = (
+    weakref.WeakKeyDictionary()
+)
+
+
+def _streamlit_secret(name: str) -> Any:
+    """Return the Streamlit secret `name`.
+
+    Streamlit is imported here rather than at module level so the API server
+    never loads the UI framework just to upload a file.
+    """
+    import streamlit as st  # noqa: PLC0415
+
+    return st.secrets[name]
+
+
+def _bucket_name() -> str:
+    """Return the bucket name from the environment or Streamlit secrets."""
+    return os.getenv("GCP_BUCKET_NAME") or _streamlit_secret("GCP_BUCKET_NAME")
+
+
+@functools.lru_cache(maxsize=1)
+def get_gcs_bucket() -> storage.Bucket:
+    """Return the process-wide bucket handle, creating the client on first use."""
+    if os.getenv("STORAGE_EMULATOR_HOST"):
+        client = storage.Client(project="emulator", credentials=AnonymousCredentials())
+    else:
+        cred_info = _streamlit_secret("gcp_service_account")
+        credentials = service_account.Credentials.from_service_account_info(cred_info)
+        client = storage.Client(credentials=credentials)
+    return client.bucket(_bucket_name())
+
+
+def upload_bytes(
+    data: bytes | memoryview, blob_name: str, content_type: str = "image/png"
+) -> str:
+    """Upload `data` to `blob_name` and return its public URL. Blocking.
+
+    The client reads the whole buffer into its request body, so an upload
+    holds one extra copy of `data` while it runs.
+    """
+    blob = get_gcs_bucket().blob(blob_name)
+    # Retries are handled by aupload_bytes, which knows which errors are transient.
+    blob.upload_from_file(
+        io.BytesIO(data), size=len(data), content_type=content_type, retry=None
+    )
+    return blob.public_url
+
+
+def upload_file(path: str, blob_name: str, content_type: str = "image/png") -> str:
+    """Upload the file at `path` to `blob_name` and return its public URL. Blocking.
+
+    Files over `RESUMABLE_UPLOAD_BYTES` are sent in chunks, and a chunk that
+    fails transiently is sent again; smaller files go up in one request.
+    """
+    blob = get_gcs_bucket().blob(blob_name)
+    retry = None
+    if os.path.getsize(path) > RESUMABLE_UPLOAD_BYTES:
+        blob.chunk_size = UPLOAD_CHUNK_BYTES
+        # The client's own policy, which also knows the chunk responses
+        # that are worth retrying (429 and 5xx).
+        retry = DEFAULT_RETRY
+    blob.upload_from_filename(path, content_type=content_type, retry=retry)
+    return blob.public_url
+
+
+def _is_transient(error: Exception) -> bool:
+    """Return whether an upload error is worth retrying."""
+    return isinstance(error, _TRANSIENT_ERRORS)
+
+
+def _upload_semaphore(limit: int) -> asyncio.Semaphore:
+    """Return the upload semaphore of the running event loop."""
+    loop = asyncio.get_running_loop()
+    semaphore = _semaphores.get(loop)
+    if semaphore is None:
+        semaphore = _semaphores[loop] = asyncio.Semaphore(max(1, limit))
+    return semaphore
+
+
+async def _aupload(upload: functools.partial[str], size: int, blob_name: str) -> str:
+    """Run a blocking upload with bounded concurrency and retries."""
+    configuration = Configuration.from_context()
+    semaphore = _upload_semaphore(configuration.gcs_upload_concurrency)
+    attempt = 0
+    queued_at = time.perf_counter()
+    async with semaphore:
+        instrumentation.record_queue_wait("gcs_upload", time.perf_counter() - queued_at)
+        while True:
+            try:
+                start = time.perf_counter()
+                url = await run_io(upload)
+                instrumentation.record_upload(size, time.perf_counter() - start)
+                return url
+            except Exception as e:
+                if attempt >= configuration.gcs_upload_retries or not _is_transient(e):
+                    raise
+                delay = configuration.gcs_retry_backoff * 2**attempt
+                delay *= 1 + random.random() / 2  # jitter
+                attempt += 1
+                logging.warning(
+                    f"Upload of {blob_name} failed ({e}); retry {attempt} in {delay:.2f}s"
+                )
+                await asyncio.sleep(delay)
+
+
+async def aupload_bytes(
+    data: bytes | memoryview, blob_name: str, content_type: str = "image/png"
+) -> str:
+    """Upload `data` without blocking the event loop and return its public URL.
+
+    At most `Configuration.gcs_upload_concurrency` uploads run at once per
+    event loop. Transient failures are retried `gcs_upload_retries` times
+    with exponential backoff and jitter.
+    """
+    upload = functools.partial(upload_bytes, data, blob_name, content_type)
+    return await _aupload(upload, len(data), blob_name)
+
+
+async def aupload_file(
+    path: str, blob_name: str, content_type: str = "image/png"
+) -> str:
+    """Upload the file at `path` like `aupload_bytes`, streaming it from disk."""
+    upload = functools.partial(upload_file, path, blob_name, content_type)
+    return await _aupload(upload, os.path.getsize(path), blob_name)
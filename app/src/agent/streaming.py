@@ -0,0 +1,91 @@
+"""Turn a graph run into a stream of user-facing events.
+
+Both front ends, the Streamlit UI and the HTTP API, render the same events:
+
+- ``("token", (message_id, text))``: user-facing model text, with the leading
+  ``<Plan>`` of each reply filtered out on the fly. A reply whose plan is never
+  closed is shown in full once its node finishes.
+- ``("tools", [tool names])``: the model called tools and they are running.
+- ``("tools_done", None)``: those tool calls finished.
+"""
+
+from __future__ import annotations
+
+from collections.abc import AsyncIterator
+from typing import Any
+
+from langchain_core.messages import AIMessage, AIMessageChunk
+from langchain_core.runnables import RunnableConfig
+from langgraph.graph.state import CompiledStateGraph
+
+from agent.instrumentation import turn_trace
+from agent.plan import PlanFilter
+
+# Nodes whose model tokens are shown to the user while they stream.
+STREAMED_NODES = frozenset({"call_model", "call_finishing_model"})
+
+
+def _finish_replies(plan_filters: dict[str, PlanFilter]) -> list[tuple[str, Any]]:
+    """End the replies streamed so far and return the text their filters held."""
+    events = [
+        ("token", (message_id, text))
+        for message_id, plan_filter in plan_filters.items()
+        if (text := plan_filter.finish())
+    ]
+    plan_filters.clear()
+    return events
+
+
+async def turn_events(
+    graph: CompiledStateGraph, input_state: dict[str, Any], config: RunnableConfig
+) -> AsyncIterator[tuple[str, Any]]:
+    """Run one turn of `graph` and yield its events as they happen.
+
+    When instrumentation is on, the turn is recorded as one trace.
+
+    Args:
+        graph (CompiledStateGraph): The compiled agent graph.
+        input_state (dict): The turn input, usually just the new message.
+        config (RunnableConfig): The run config, including the thread_id.
+    """
+    plan_filters: dict[str, PlanFilter] = {}
+    tools_running = False
+
+    with turn_trace(config.get("configurable", {}).get("thread_id")):
+        async for mode, chunk in graph.astream(
+            input_state, config=config, stream_mode=["messages", "updates"]
+        ):
+            if mode == "messages":
+                message, metadata = chunk
+                if (
+                    not isinstance(message, AIMessageChunk)
+                    or metadata.get("langgraph_node") not in STREAMED_NODES
+                    or not isinstance(message.content, str)
+                    or not message.content
+                ):
+                    continue
+                plan_filter = plan_filters.setdefault(str(message.id), PlanFilter())
+                if visible := plan_filter.feed(message.content):
+                    yield "token", (message.id, visible)
+
+            elif mode == "updates":
+                if STREAMED_NODES.intersection(chunk):
+                    # The node is done, so its replies are complete.
+                    for event in _finish_replies(plan_filters):
+                        yield event
+                for update in chunk.values():
+                    tool_names = [
+                        tool_call["name"]
+                        for message in (update or {}).get("messages", [])
+                        if isinstance(message, AIMessage)
+                        for tool_call in message.tool_calls
+                    ]
+                    if tool_names:
+                        tools_running = True
+                        yield "tools", tool_names
+                    elif tools_running:
+                        tools_running = False
+                        yield "tools_done", None
+
+        for event in _finish_replies(plan_filters):
+            yield event
@@ -1,34 +1,82 @@
+import asyncio
 import base64
 import json
 import logging
 import os
-from typing import Annotated, Any, Callable, List, Optional
+import shutil
+import weakref
+from collections.abc import Callable
+from typing import Annotated, Any
 
-import streamlit as st
-from google.cloud import storage
-from google.oauth2 import service_account
 from langchain_core.tools import tool
-from openai import OpenAI
+from openai import AsyncOpenAI
 from PIL import Image
 
+from agent.configuration import Configuration
+from agent.executors import run_io
+from agent.generation_cache import GenerationCache, get_generation_cache
+from agent.imaging import (
+    DEFAULT_KEYING_THRESHOLD,
+    ImageHandle,
+    key_black_to_transparent,
+)
+from agent.instrumentation import record_cache_lookup
+from agent.prompting import PromptTemplate
+
+_STYLE_TEMPLATE = (
+    "<ESTILO>\n"
+    "        Genera un diseño estilo caricaturesco y exagerado con un enfoque llamativo "
+    "y vibrante.\n"
+    "        Usa un personaje central de apariencia humorística, con rasgos detallados "
+    "y expresiones exageradas.\n"
+    "        Presentar un enfoque que emplea principalmente el blanco y el negro y los "
+    "colores {color_palette} para añadir contraste.\n"
+    "        **EL FONDO DEBE SER NEGRO**\n"
+    "        Los objetos deben tener un estilo hiperrealista con detalles texturizados "
+    "y reflejos luminosos.\n"
+    "        La tipografía debe tener un aire vintage, reminiscente de carteles clásicos.\n"
+    "        </ESTILO>\n"
+    "    "
+)
+
+# Se reorganiza el prompt final para dar prioridad a las instrucciones de formato.
+# The style block is inlined so the whole prompt is compiled once.
+IMAGE_PROMPT_TEMPLATE = PromptTemplate(
+    "\n"
+    "        <OBJETIVO>\n"
+    "        Diseña una obra de arte audaz y exagerada, con {main_character} como "
+    "personaje central.\n"
+    "        </OBJETIVO>\n"
+    "\n"
+    "        <INSTRUCCIONES>\n"
+    "        {text_prompt}\n"
+    "        {items_prompt}\n"
+    "         **La palabra 'OWNIT' debe estar integrada sutilmente en el diseño, de forma "
+    "que no sea el foco principal.**\n"
+    "        </INSTRUCCIONES>\n"
+    "\n"
+    "        <OBSERVACIONES>\n"
+    "        </OBSERVACIONES>\n"
+    "\n"
+    "        " + _STYLE_TEMPLATE + "\n    "
+)
+
 
 @tool
 def create_image_prompt(
-    main_character: str, text: str, items_to_include: List[str], color_palette: str
+    main_character: str, text: str, items_to_include: list[str], color_palette: str
 ) -> str:
     """Create a prompt for generating an image with a main character, text, items, and a color palette.
 
     Args:
         main_character (str): The main character to be featured in the image.
         text (str): Text to be included in the image.
-        items_to_include (List[str]): List of items to include in the image.
+        items_to_include (list[str]): List of items to include in the image.
         color_palette (str): Color palette to be used in the image.
 
     Returns:
         str: A formatted prompt for image generation.
     """
-    main_character_prompt = f"Diseña una obra de arte audaz y exagerada, con {main_character} como personaje central."
-
     items_prompt = ""
     if items_to_include:
         items_prompt = "El diseño debe incluir: " + ", ".join(items_to_include) + "."
@@ -39,43 +87,112 @@ def create_image_prompt(
             f"El texto '{text}' DEBE APARECER ESCRITO de forma clara en el diseño."
         )
 
-    style_prompt = f"""<ESTILO>
-        Genera un diseño estilo caricaturesco y exagerado con un enfoque llamativo y vibrante.
-        Usa un personaje central de apariencia humorística, con rasgos detallados y expresiones exageradas.
-        Presentar un enfoque que emplea principalmente el blanco y el negro y los colores {color_palette} para añadir contraste.
-        **EL FONDO DEBE SER NEGRO**
-        Los objetos deben tener un estilo hiperrealista con detalles texturizados y reflejos luminosos.
-        La tipografía debe tener un aire vintage, reminiscente de carteles clásicos.
-        </ESTILO>
-    """
+    return IMAGE_PROMPT_TEMPLATE.render(
+        main_character=main_character,
+        text_prompt=text_prompt,
+        items_prompt=items_prompt,
+        color_palette=color_palette,
+    )
+
+
+def variant_path(output_path: str, variant: int) -> str:
+    """Return the path of a variant, e.g. design-2.png -> design-2-3.png."""
+    root, ext = os.path.splitext(output_path)
+    return f"{root}-{variant}{ext}"
+
 
-    # Se reorganiza el prompt final para dar prioridad a las instrucciones de formato.
-    return f"""
-        <OBJETIVO>
-        {main_character_prompt}
-        </OBJETIVO>
+# Everything besides the prompt that determines the generated image.
+IMAGE_PARAMS = {
+    "model": "dall-e-3",
+    "size": "1024x1024",
+    "style": "vivid",
+    "quality": "standard",
+}
 
-        <INSTRUCCIONES>
-        {text_prompt}
-        {items_prompt}
-         **La palabra 'OWNIT' debe estar integrada sutilmente en el diseño, de forma que no sea el foco principal.**
-        </INSTRUCCIONES>
 
-        <OBSERVACIONES>
-        </OBSERVACIONES>
+_openai_clients: weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, AsyncOpenAI] = (
+    weakref.WeakKeyDictionary()
+)
 
-        {style_prompt}
+
+def _openai_client() -> AsyncOpenAI:
+    """Return the image API client of the running event loop, created on first use.
+
+    Reusing it keeps its connection pool, and the keep-alive connections in
+    it, across generations.
     """
+    loop = asyncio.get_running_loop()
+    client = _openai_clients.get(loop)
+    if client is None:
+        client = _openai_clients[loop] = AsyncOpenAI(
+            api_key=os.getenv("OPENAI_API_KEY")
+        )
+    return client
 
 
-@tool
-def create_image(
+async def close_openai_client() -> None:
+    """Close the image API client of the running event loop, if any.
+
+    Call it when the loop shuts down.
+    """
+    client = _openai_clients.pop(asyncio.get_running_loop(), None)
+    if client is not None:
+        await client.close()
+
+
+async def _generate_image_b64(client: AsyncOpenAI, prompt: str) -> str:
+    """Request a single dall-e-3 image and return it base64-encoded."""
+    response = await client.images.generate(
+        # background="transparent", ONLY FOR gpt-image-1
+        prompt=prompt,
+        response_format="b64_json",
+        n=1,
+        **IMAGE_PARAMS,  # type: ignore literal types
+    )
+    return response.data[0].b64_json  # type: ignore not null
+
+
+def _generation_cache() -> GenerationCache | None:
+    """Return the configured generation cache, or None when it is disabled."""
+    configuration = Configuration.from_context()
+    if configuration.generation_cache_ttl_hours <= 0:
+        return None
+    return get_generation_cache(
+        configuration.generation_cache_dir,
+        configuration.generation_cache_ttl_hours * 3600,
+        int(configuration.generation_cache_max_mb * 1024 * 1024),
+    )
+
+
+async def _generate_image(
+    client: AsyncOpenAI, prompt: str, variant: int, cache: GenerationCache | None
+) -> bytes:
+    """Return the decoded image for one variant, from the cache when possible."""
+    key = GenerationCache.key(prompt, variant=variant, **IMAGE_PARAMS)
+    if cache is not None:
+        cached = await run_io(cache.get, key)
+        record_cache_lookup(cached is not None)
+        if cached is not None:
+            logging.info(f"Generation cache hit for variant {variant}: {cache.stats()}")
+            return cached
+
+    data = base64.b64decode(await _generate_image_b64(client, prompt))
+    if cache is not None:
+        await run_io(cache.put, key, data)
+    return data
+
+
+@tool(response_format="content_and_artifact")
+async def create_image(
     prompt: Annotated[str, "Prompt IN SPANISH summarizing the user desires"],
     image_number: int,
+    variants: Annotated[
+        int, "How many alternative versions of this design to generate at once."
+    ] = 1,
     output_path: Annotated[
-        Optional[str], "Optional full path for the output image."
+        str | None, "Optional full path for the output image."
     ] = None,
-) -> str:
+) -> tuple[str, list[ImageHandle]]:
     """Create an image to be used as a streetwear shirt design.
 
     Use this function to produce an image for a tshirt based on the user query.
@@ -84,63 +201,69 @@ def create_image(
     Args:
         query (str): Query IN SPANISH summarizing the user desires.
         image_number (int): The number of the image to be created, used to name the file.
+        variants (int): Number of alternative versions to generate. With more than
+            one, every version is saved as `design-{n}-{k}.png` and the first one is
+            also used as `design-{n}.png` until the user picks another.
 
     Returns:
-        str: A message indicating the path to the image.
+        str: A message indicating the path to the image. The decoded images
+            are attached as the tool artifact, one `ImageHandle` per variant;
+            nothing is written to disk here.
     """
-    client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-
-    response = client.images.generate(
-        model="dall-e-3",
-        # background="transparent", ONLY FOR gpt-image-1
-        prompt=prompt,
-        size="1024x1024",
-        response_format="b64_json",
-        style="vivid",
-        quality="standard",
-        n=1,
-    )
-
-    image_b64 = response.data[0].b64_json # type: ignore not null
-    image_data = base64.b64decode(image_b64)  # type: ignore image
-
     if not output_path:
         output_path = f"image-{image_number}.png"
-    os.makedirs(os.path.dirname(output_path), exist_ok=True)
-
-    with open(output_path, "wb") as f:
-        f.write(image_data)
-
-    return output_path
-
-
-def upload_to_gcs(file_path: str, user_email: str) -> str | None:
-    """Uploads a file to Google Cloud Storage and makes it public."""
-    try:
-        # 1. Load Credentials from Streamlit Secrets
-        cred_info = st.secrets["gcp_service_account"] # type: ignore streamlit not found
-        credentials = service_account.Credentials.from_service_account_info(cred_info)
-
-        # 2. Initialize GCS Client
-        client = storage.Client(credentials=credentials)
+    variants = max(1, variants)
+
+    # dall-e-3 only supports n=1, so variants are concurrent requests.
+    # Repeated requests are served from the generation cache.
+    cache = _generation_cache()
+    client = _openai_client()
+    images = await asyncio.gather(
+        *(_generate_image(client, prompt, k, cache) for k in range(1, variants + 1))
+    )
 
-        # 3. Get Bucket and define blob name
-        bucket_name = st.secrets["GCP_BUCKET_NAME"]  # type: ignore streamlit not found
-        bucket = client.bucket(bucket_name)
+    # Decoded once; the caller stores, uploads and optionally saves the handles.
+    if variants == 1:
+        return output_path, [ImageHandle(images[0], os.path.basename(output_path))]
+
+    handles = [
+        ImageHandle(data, os.path.basename(variant_path(output_path, k)), variant=k)
+        for k, data in enumerate(images, start=1)
+    ]
+    content = (
+        f"Generated {variants} variants of design {image_number}: "
+        + ", ".join(variant_path(output_path, k) for k in range(1, variants + 1))
+        + f". Variant 1 is selected as {output_path}."
+    )
+    return content, handles
 
-        file_name = os.path.basename(file_path)
-        destination_blob_name = f"{user_email}/{file_name}"
 
-        # 4. Upload the file
-        blob = bucket.blob(destination_blob_name)
-        blob.upload_from_filename(file_path)
+@tool(response_format="content_and_artifact")
+async def select_variant(
+    image_number: Annotated[int, "The number of the design, e.g. 1, 2 or 3."],
+    variant: Annotated[int, "The variant of that design the user picked."],
+    design_dir: Annotated[
+        str | None, "Optional directory holding the design files."
+    ] = None,
+) -> tuple[str, dict[str, int]]:
+    """Select one of the variants generated for a design.
 
-        logging.info(f"File {file_name} uploaded to GCS: {blob.public_url}")
-        return blob.public_url
+    Call this when the user picks one of several versions produced by a
+    single `create_image` call. It does NOT generate a new image and does not
+    count as an iteration.
 
-    except Exception as e:
-        logging.error(f"Failed to upload to GCS: {e}")
-        return None
+    Returns:
+        str: A confirmation message. The selection is attached as the tool
+            artifact, so the graph records it in the thread state whether or
+            not designs are saved locally.
+    """
+    design_path = os.path.join(design_dir or "", f"design-{image_number}.png")
+    source = variant_path(design_path, variant)
+    if await run_io(os.path.exists, source):
+        # Keep the local default copy in step with the selection.
+        await run_io(shutil.copyfile, source, design_path)
+    selection = {"image_number": image_number, "variant": variant}
+    return f"Variant {variant} selected for design {image_number}.", selection
 
 
 @tool
@@ -159,6 +282,9 @@ def execute_production_file(
     product_type: Annotated[
         str, "The chosen product type, e.g., 'LISO' or 'JASPEADO'."
     ],
+    variant: Annotated[
+        int | None, "The chosen variant, only if the design has several."
+    ] = None,
 ) -> str:
     """
     Call this tool ONLY from the finishing state AFTER gathering the
@@ -170,38 +296,31 @@ def execute_production_file(
 def convert_black_to_transparent(
     image_path: Annotated[str, "Path to the image to be converted"],
     output_path: Annotated[str, "Path to save the converted image"],
+    threshold: float = DEFAULT_KEYING_THRESHOLD,
+    feather: float = 0,
 ) -> str:
     """Convert dark pixels in an image to transparent.
 
     Args:
         image_path (str): Path to the image to be converted.
-        color (str): Color to be made transparent in the format 'R,G,B'.
+        output_path (str): Path to save the converted image.
+        threshold (float): Brightness below which pixels become transparent.
+        feather (float): Width of the soft alpha ramp above the threshold.
 
     Returns:
         str: A message indicating the path to the converted image.
     """
-    threshold = 30
-    img = Image.open(image_path).convert("RGBA")
-    pixel_data = img.getdata()
-
-    new_pixel_data = []
-    for item in pixel_data:
-        r, g, b, a = item
-        brightness = (r + g + b) / 3
-        if brightness < threshold:
-            new_pixel_data.append((r, g, b, 0))
-        else:
-            new_pixel_data.append((r, g, b, a))
-
-    img.putdata(new_pixel_data)
+    with Image.open(image_path) as img:
+        keyed = key_black_to_transparent(img, threshold=threshold, feather=feather)
     os.makedirs(os.path.dirname(output_path), exist_ok=True)
-    img.save(output_path, "PNG")
+    keyed.save(output_path, "PNG")
     return output_path
 
 
-TOOLS: List[Callable[..., Any]] = [  # noqa: UP006 allow List
+TOOLS: list[Callable[..., Any]] = [
     create_image_prompt,
     create_image,
-    finalize_design,  
+    select_variant,
+    finalize_design,
     execute_production_file,
 ]  # type: ignore tool type
@@ -1,8 +1,25 @@
 """Utility & helper functions."""
 
+import functools
+import os
+import threading
+from collections import OrderedDict
+from collections.abc import Sequence
+from typing import Any
+
 from langchain.chat_models import init_chat_model
 from langchain_core.language_models import BaseChatModel
 from langchain_core.messages import BaseMessage
+from langchain_core.runnables import Runnable
+from langchain_core.tools import BaseTool
+
+# Maximum number of (model, tool set) bindings kept by get_chat_model.
+MODEL_CACHE_SIZE = 16
+
+_bound_models: OrderedDict[tuple[str, tuple[str, ...]], Runnable[Any, Any]] = (
+    OrderedDict()
+)
+_bound_models_lock = threading.Lock()
 
 
 def get_message_text(msg: BaseMessage) -> str:
@@ -17,6 +34,20 @@ def get_message_text(msg: BaseMessage) -> str:
         return "".join(txts).strip()
 
 
+def read_file(path: str) -> bytes:
+    """Read a whole file into memory."""
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def write_file(path: str, data: bytes | memoryview) -> str:
+    """Write `data` to `path`, creating parent directories. Returns the path."""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(data)
+    return path
+
+
 def load_chat_model(fully_specified_name: str) -> BaseChatModel:
     """Load a chat model from a fully specified name.
 
@@ -24,4 +55,50 @@ def load_chat_model(fully_specified_name: str) -> BaseChatModel:
         fully_specified_name (str): String in the format 'provider/model'.
     """
     provider, model = fully_specified_name.split("/", maxsplit=1)
+    if provider == "openai":
+        # Replies are streamed; ask for usage (including cached tokens) anyway.
+        return init_chat_model(model, model_provider=provider, stream_usage=True)
     return init_chat_model(model, model_provider=provider)
+
+
+@functools.lru_cache(maxsize=MODEL_CACHE_SIZE)
+def _cached_chat_model(fully_specified_name: str) -> BaseChatModel:
+    """Load a chat model once per name so its HTTP client is shared."""
+    return load_chat_model(fully_specified_name)
+
+
+def get_chat_model(
+    fully_specified_name: str, tools: Sequence[BaseTool] = ()
+) -> Runnable[Any, Any]:
+    """Return a chat model bound to `tools`, reusing earlier bindings.
+
+    Bindings are keyed by the model name and the tool names and kept in a
+    bounded LRU cache. Every binding of the same model wraps one client, so
+    HTTP connections are reused across calls instead of rebuilt each time.
+
+    Args:
+        fully_specified_name (str): String in the format 'provider/model'.
+        tools (Sequence[BaseTool]): Tools to bind to the model.
+    """
+    key = (fully_specified_name, tuple(t.name for t in tools))
+    with _bound_models_lock:
+        if key in _bound_models:
+            _bound_models.move_to_end(key)
+            return _bound_models[key]
+
+    base = _cached_chat_model(fully_specified_name)
+    bound = base.bind_tools(list(tools)) if tools else base
+
+    with _bound_models_lock:
+        bound = _bound_models.setdefault(key, bound)
+        _bound_models.move_to_end(key)
+        while len(_bound_models) > MODEL_CACHE_SIZE:
+            _bound_models.popitem(last=False)
+    return bound
+
+
+def clear_model_cache() -> None:
+    """Drop all cached models and bindings."""
+    with _bound_models_lock:
+        _bound_models.clear()
+    _cached_chat_model.cache_clear()
@@ -0,0 +1,329 @@
+"""HTTP API for the Ownit agent.
+
+Serves the compiled agent graph independently of the Streamlit UI:
+
+- ``POST /threads`` creates a conversation thread.
+- ``GET /threads/{thread_id}`` returns its checkpointed state.
+- ``POST /threads/{thread_id}/turns`` submits a user message and streams the
+  reply as server-sent events (``token``, ``tools``, ``tools_done``, then
+  ``state`` or ``error``).
+- ``GET /artifacts/{digest}`` returns a generated image or garment mockup by
+  its digest.
+- ``GET /jobs/{job_id}`` returns a production job and
+  ``GET /threads/{thread_id}/jobs`` the jobs ordered from a thread, for
+  clients to poll until the production file is ready.
+- ``POST /gang-sheets`` packs the finished production files that are on no
+  sheet yet onto DTF gang sheets and returns each sheet's URL, size and
+  utilization.
+- ``GET /metrics`` exposes latency, token and upload metrics for Prometheus
+  and ``GET /traces`` the latest per-turn traces, when instrumentation is on
+  (``OWNIT_INSTRUMENTATION=1``).
+
+Each worker runs at most ``OWNIT_MAX_CONCURRENT_TURNS`` turns at once
+(default 8) and answers 429 with a ``Retry-After`` header when saturated, so
+a load balancer can spread turns across workers. Run several workers with
+``uvicorn src.main:app --workers N``; they share the SQLite checkpointer, so
+any worker can continue any thread. The in-memory checkpointer is per worker
+and only suits a single worker.
+
+A thread runs one turn at a time only within a worker: the 409 for a second
+turn comes from that worker's `TurnLimiter`, which other workers do not see.
+Two workers could run turns on the same thread at once, and both would
+write its checkpoint. The container therefore runs one worker unless
+``WEB_CONCURRENCY`` says otherwise; with several workers, route requests by
+``thread_id`` (sticky routing) so every turn of a thread reaches the same
+worker.
+
+Every worker also runs ``production_workers`` production workers, started
+with the app so jobs left queued by a previous run are picked up. They share
+the SQLite job queue, so a job is made once whichever worker queued it.
+"""
+
+from __future__ import annotations
+
+import functools
+import json
+import logging
+import os
+import uuid
+from collections.abc import AsyncIterator, Callable
+from contextlib import asynccontextmanager
+from typing import Any
+
+from agent.artifacts import REF_PREFIX, get_artifact_store
+from agent.configuration import Configuration
+from agent.executors import run_io, warm_cpu_pool
+from agent.gangsheet import compose_gang_sheets
+from agent.graph import graph as agent_graph
+from agent.instrumentation import enabled as instrumentation_enabled
+from agent.instrumentation import recent_traces, render_prometheus
+from agent.jobs import (
+    ensure_production_workers,
+    get_production_queue,
+    stop_production_workers,
+)
+from agent.streaming import turn_events
+from agent.tools import close_openai_client
+from fastapi import FastAPI, HTTPException
+from fastapi.responses import FileResponse, PlainTextResponse, StreamingResponse
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage
+from pydantic import BaseModel
+from starlette.types import Receive, Scope, Send
+
+# Seconds a client is told to wait after a 429.
+RETRY_AFTER_SECONDS = 2
+# Leading bytes of a JPEG file; every other artifact is a PNG.
+JPEG_SIGNATURE = b"\xff\xd8\xff"
+
+
+class TurnLimiter:
+    """Non-blocking admission control for turns in one worker.
+
+    Turns are rejected instead of queued once `limit` are in flight, so
+    a saturated worker sheds load immediately. A thread can only run one
+    turn at a time, since both would write to the same checkpoint; this only
+    holds within the worker, so workers need requests routed by thread.
+    """
+
+    def __init__(self, limit: int) -> None:
+        self.limit = limit
+        self.active_threads: set[str] = set()
+        self._tokens: dict[str, object] = {}
+
+    def acquire(self, thread_id: str) -> object:
+        """Admit a turn for `thread_id` or raise a 429/409 HTTPException.
+
+        Returns:
+            object: The token of the turn, to pass to `release`.
+        """
+        if thread_id in self.active_threads:
+            raise HTTPException(409, f"Thread {thread_id} already has a turn running.")
+        if len(self.active_threads) >= self.limit:
+            raise HTTPException(
+                429,
+                "Too many turns in progress, retry later.",
+                headers={"Retry-After": str(RETRY_AFTER_SECONDS)},
+            )
+        self.active_threads.add(thread_id)
+        token = self._tokens[thread_id] = object()
+        return token
+
+    def release(self, thread_id: str, token: object) -> None:
+        """Free the slot `token` holds for `thread_id`.
+
+        Releasing twice is harmless: once the slot is free, or held by a
+        later turn of the thread, the token no longer matches.
+        """
+        if self._tokens.get(thread_id) is token:
+            del self._tokens[thread_id]
+            self.active_threads.discard(thread_id)
+
+
+class ClosingStreamingResponse(StreamingResponse):
+    """A streaming response that calls `on_close` however it ends.
+
+    The body generator's ``finally`` only runs once the body has started. A
+    client that disconnects before the first chunk makes Starlette raise or
+    cancel before that, and skip any background task, so cleanup tied to
+    either would never run.
+    """
+
+    def __init__(
+        self, content: AsyncIterator[str], on_close: Callable[[], None], **kwargs: Any
+    ) -> None:
+        super().__init__(content, **kwargs)
+        self.on_close = on_close
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        """Send the response, then call `on_close` even if sending failed."""
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            self.on_close()
+
+
+class TurnRequest(BaseModel):
+    """A user message submitted to a thread."""
+
+    message: str
+    email: str | None = None
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI) -> AsyncIterator[None]:
+    """Warm the CPU pool and run the production workers for the lifetime of the app.
+
+    On shutdown, the workers stop and the image API client is closed.
+    """
+    await ensure_production_workers(Configuration())
+    await warm_cpu_pool()
+    yield
+    await stop_production_workers()
+    await close_openai_client()
+
+
+app = FastAPI(title="Ownit agent", lifespan=lifespan)
+limiter = TurnLimiter(int(os.getenv("OWNIT_MAX_CONCURRENT_TURNS", "8")))
+
+
+def artifact_media_type(path: str) -> str:
+    """Return the media type of a stored artifact: JPEG mockups or PNG images."""
+    with open(path, "rb") as f:
+        return "image/jpeg" if f.read(3) == JPEG_SIGNATURE else "image/png"
+
+
+def thread_config(thread_id: str) -> dict[str, Any]:
+    """Return the graph config for a thread."""
+    return {"configurable": {"thread_id": thread_id}}
+
+
+def message_view(message: BaseMessage) -> dict[str, Any]:
+    """Return the JSON shape of a message exposed by the API."""
+    view: dict[str, Any] = {
+        "id": message.id,
+        "type": message.type,
+        "content": message.content,
+    }
+    if isinstance(message, AIMessage) and message.tool_calls:
+        view["tool_calls"] = [
+            {"name": tc["name"], "args": tc["args"]} for tc in message.tool_calls
+        ]
+    return view
+
+
+def state_view(values: dict[str, Any]) -> dict[str, Any]:
+    """Return the JSON shape of a thread state exposed by the API."""
+    return {
+        "messages": [message_view(m) for m in values.get("messages", [])],
+        "artifacts": values.get("artifacts", []),
+        "image_count": values.get("image_count", 0),
+    }
+
+
+def sse(event: str, data: Any) -> str:
+    """Format one server-sent event."""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+@app.get("/healthz")
+async def healthz() -> dict[str, Any]:
+    """Report liveness and how many turns this worker is running."""
+    return {
+        "status": "ok",
+        "active_turns": len(limiter.active_threads),
+        "limit": limiter.limit,
+    }
+
+
+@app.post("/threads", status_code=201)
+async def create_thread() -> dict[str, str]:
+    """Create a new conversation thread."""
+    return {"thread_id": str(uuid.uuid4())}
+
+
+@app.get("/threads/{thread_id}")
+async def get_thread(thread_id: str) -> dict[str, Any]:
+    """Return the checkpointed state of a thread."""
+    snapshot = await agent_graph.aget_state(thread_config(thread_id))  # type: ignore config
+    if not snapshot.values:
+        raise HTTPException(404, f"Thread {thread_id} not found.")
+    return state_view(snapshot.values)
+
+
+@app.post("/threads/{thread_id}/turns")
+async def submit_turn(thread_id: str, turn: TurnRequest) -> ClosingStreamingResponse:
+    """Submit a user message and stream the agent's reply as server-sent events."""
+    token = limiter.acquire(thread_id)
+    config = thread_config(thread_id)
+    # Only the new message: the checkpointer supplies the rest of the thread,
+    # including the email of an earlier turn when this one omits it.
+    input_state: dict[str, Any] = {"messages": [HumanMessage(content=turn.message)]}
+    if turn.email:
+        input_state["email"] = turn.email
+
+    async def events() -> AsyncIterator[str]:
+        try:
+            async for kind, payload in turn_events(agent_graph, input_state, config):  # type: ignore config
+                if kind == "token":
+                    message_id, text = payload
+                    yield sse(kind, {"message_id": message_id, "text": text})
+                else:
+                    yield sse(kind, payload)
+            snapshot = await agent_graph.aget_state(config)  # type: ignore config
+            yield sse("state", state_view(snapshot.values))
+        except Exception as e:
+            logging.error(f"Turn failed on thread {thread_id}: {e}", exc_info=True)
+            yield sse("error", {"detail": str(e)})
+        finally:
+            # Frees the slot as soon as the turn ends; the response frees it
+            # too, in case the body never started.
+            limiter.release(thread_id, token)
+
+    return ClosingStreamingResponse(
+        events(),
+        functools.partial(limiter.release, thread_id, token),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.get("/artifacts/{digest}")
+async def get_artifact(digest: str) -> FileResponse:
+    """Return a stored artifact. Artifacts are immutable, so they cache forever."""
+    store = get_artifact_store(Configuration().artifact_store_dir)
+    try:
+        path = store.path(REF_PREFIX + digest)
+    except ValueError as e:
+        raise HTTPException(400, str(e)) from e
+    if not os.path.exists(path):
+        raise HTTPException(404, f"Artifact {digest} not found.")
+    return FileResponse(
+        path,
+        media_type=await run_io(artifact_media_type, path),
+        headers={"Cache-Control": "public, max-age=31536000, immutable"},
+    )
+
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str) -> dict[str, Any]:
+    """Return the status of a production job."""
+    queue = await run_io(get_production_queue, Configuration())
+    job = await run_io(queue.get, job_id)
+    if job is None:
+        raise HTTPException(404, f"Job {job_id} not found.")
+    return job.to_dict()
+
+
+@app.get("/threads/{thread_id}/jobs")
+async def get_thread_jobs(thread_id: str) -> list[dict[str, Any]]:
+    """Return the production jobs ordered from a thread, oldest first."""
+    queue = await run_io(get_production_queue, Configuration())
+    return [job.to_dict() for job in await run_io(queue.jobs_for_thread, thread_id)]
+
+
+@app.post("/gang-sheets")
+async def create_gang_sheets() -> list[dict[str, Any]]:
+    """Compose gang sheets from the pending production files."""
+    try:
+        sheets = await compose_gang_sheets(Configuration())
+    except ValueError as e:
+        raise HTTPException(409, str(e)) from e
+    return [sheet.to_dict() for sheet in sheets]
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics() -> PlainTextResponse:
+    """Return this worker's metrics in the Prometheus text format."""
+    if not instrumentation_enabled():
+        raise HTTPException(404, "Instrumentation is disabled.")
+    return PlainTextResponse(
+        render_prometheus(), media_type="text/plain; version=0.0.4"
+    )
+
+
+@app.get("/traces")
+async def traces() -> list[dict[str, Any]]:
+    """Return the traces of the latest turns served by this worker, newest last."""
+    if not instrumentation_enabled():
+        raise HTTPException(404, "Instrumentation is disabled.")
+    return recent_traces()
@@ -6,7 +6,7 @@ Usage:
     python run_streamlit.py
     
 Or from the command line:
-    streamlit run streamlit.py
+    streamlit run streamlit_app.py
 """
 
 import os
@@ -18,9 +18,9 @@ def main():
     """Run the Streamlit app."""
     # Get the current directory
     current_dir = os.path.dirname(os.path.abspath(__file__))
-    streamlit_file = os.path.join(current_dir, "streamlit.py")
+    streamlit_file = os.path.join(current_dir, "streamlit_app.py")
     
-    # Check if streamlit.py exists
+    # Check if streamlit_app.py exists
     if not os.path.exists(streamlit_file):
         print(f"Error: {streamlit_file} not found!")
         sys.exit(1)
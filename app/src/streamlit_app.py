@@ -0,0 +1,503 @@
+# pyright: reportAttributeAccessIssue=false
+"""
+Streamlit chatbot interface for the Ownit agent.
+
+This app provides a user-friendly web interface to interact with the LangGraph-based agent.
+"""
+
+import base64
+import logging
+import time
+import uuid  # <-- Import UUID for thread IDs
+from collections.abc import AsyncIterator
+from typing import Any
+
+import streamlit as st
+from agent.artifacts import get_artifact_store
+from agent.configuration import Configuration
+from agent.executors import warm_cpu_pool
+from agent.graph import graph as agent_graph
+from agent.jobs import (
+    DONE,
+    FAILED,
+    QUEUED,
+    RUNNING,
+    ProductionJob,
+    ensure_production_workers,
+    get_production_queue,
+)
+from agent.runtime import BackgroundLoop
+from agent.streaming import turn_events
+from langchain_core.messages import AIMessage, HumanMessage
+
+# Configure Streamlit page
+st.set_page_config(
+    page_title="Ownit Agent Chatbot",
+    page_icon="🤖",
+    layout="wide",
+    initial_sidebar_state="expanded",
+)
+
+# Custom CSS (no changes)
+st.markdown(
+    """
+<style>
+    /* ... [your existing CSS] ... */
+</style>
+""",
+    unsafe_allow_html=True,
+)
+
+# --- Initialize session state ---
+if "messages" not in st.session_state:
+    st.session_state.messages = []
+
+if "artifacts" not in st.session_state:
+    st.session_state.artifacts = []
+
+if "image_count" not in st.session_state:
+    st.session_state.image_count = 0
+
+if "streaming" not in st.session_state:
+    st.session_state.streaming = True
+
+# Progress shown while a tool runs, keyed by tool name.
+TOOL_PROGRESS = {
+    "create_image": "🎨 Generando imagen...",
+    "create_image_prompt": "📝 Preparando el diseño...",
+    "select_variant": "✅ Guardando la versión elegida...",
+    "execute_production_file": "🏭 Encargando el archivo de producción...",
+}
+
+# How production jobs are shown in the sidebar, keyed by status.
+JOB_STATUS = {
+    QUEUED: "⏳ En cola",
+    RUNNING: "⚙️ En producción",
+    DONE: "✅ Listo",
+    FAILED: "❌ Falló",
+}
+# Seconds between refreshes of the sidebar while a production job is pending.
+JOB_POLL_SECONDS = 2.0
+
+# --- Add thread_id for memory ---
+if "thread_id" not in st.session_state:
+    st.session_state.thread_id = str(uuid.uuid4())
+
+
+def display_artifact(artifact: dict[str, Any], index: int | None = None) -> None:
+    """Display an artifact in the Streamlit interface."""
+    with st.container():
+        st.markdown('<div class="artifact-container">', unsafe_allow_html=True)
+
+        artifact_type = artifact.get("type", "unknown")
+
+        if artifact_type == "image":
+            image_ref = artifact.get("ref")
+            image_data = artifact.get("b64")
+            if image_ref:
+                # Resolve the reference lazily: the bytes are only read when shown.
+                try:
+                    store = get_artifact_store(Configuration().artifact_store_dir)
+                    st.image(store.path(image_ref))
+                except Exception as e:
+                    st.error(f"Error displaying image: {e!s}")
+            elif image_data:
+                try:
+                    if image_data.startswith("data:image"):
+                        image_data = image_data.split(",")[1]
+
+                    image_bytes = base64.b64decode(image_data)
+                    st.image(image_bytes)
+                except Exception as e:
+                    st.error(f"Error displaying image: {e!s}")
+
+        elif artifact_type == "mockup":
+            try:
+                store = get_artifact_store(Configuration().artifact_store_dir)
+                st.image(
+                    store.path(artifact["ref"]),
+                    caption=artifact.get("product_type", "").capitalize(),
+                )
+            except Exception as e:
+                st.error(f"Error displaying mockup: {e!s}")
+
+        elif artifact_type == "text":
+            content = artifact.get("data", artifact.get("content", ""))
+            st.text_area("Content:", value=content, height=200, disabled=True)
+
+        else:
+            st.json(artifact)
+
+        st.markdown("</div>", unsafe_allow_html=True)
+
+
+def agent_config() -> dict[str, Any]:
+    """Return the graph config for the current session's thread."""
+    return {
+        "configurable": {
+            "thread_id": st.session_state.thread_id,  # <-- Pass the thread_id
+            "system_prompt": Configuration().system_prompt,
+            "model": Configuration().model,
+        }
+    }
+
+
+@st.cache_resource
+def get_agent_loop() -> BackgroundLoop:
+    """
+    Return the event loop that runs every graph invocation of this server
+    process. Keeping one loop alive keeps the OpenAI and GCS connection
+    pools warm across turns instead of rebuilding them per asyncio.run.
+    The production workers run on it too, so jobs keep running between
+    reruns and jobs left queued by a previous run are resumed.
+    """
+    loop = BackgroundLoop()
+    loop.run(ensure_production_workers(Configuration()))
+    loop.run(warm_cpu_pool())
+    return loop
+
+
+def session_snapshot() -> dict[str, Any]:
+    """
+    Copy what a turn needs from st.session_state. Graph code runs on the
+    background loop thread, which cannot read the Streamlit session.
+    """
+    return {
+        "config": agent_config(),
+        "messages": list(st.session_state.messages),
+        "artifacts": list(st.session_state.artifacts),
+        "image_count": st.session_state.image_count,
+    }
+
+
+async def build_turn_input(
+    user_message: HumanMessage, email: str | None, session: dict[str, Any]
+) -> dict[str, Any]:
+    """
+    Build the graph input for a new turn.
+
+    The checkpointer already holds the thread, so normally only the new
+    message is sent and the graph supplies the prior state. If the
+    checkpointer has no state for this thread (e.g. the server restarted
+    with an in-memory checkpointer) the full session history is sent once
+    to seed it again.
+    """
+    snapshot = await agent_graph.aget_state(session["config"])
+    server_messages = snapshot.values.get("messages", [])
+    prior_messages = session["messages"][:-1]
+
+    if not server_messages:
+        if prior_messages:
+            logging.warning("Thread missing from the checkpointer; resending history.")
+        return {
+            "messages": [*prior_messages, user_message],
+            "email": email,
+            "artifacts": session["artifacts"],
+            "image_count": session["image_count"],
+        }
+
+    if [m.id for m in server_messages] != [m.id for m in prior_messages]:
+        # The checkpointer is the source of truth; the session is replaced
+        # with its state when the turn's result comes back.
+        logging.warning("Session history diverged from the checkpointer; resyncing.")
+
+    # Pass a dict, not InputState: dataclass defaults would reset the
+    # checkpointed artifacts and image_count.
+    return {"messages": [user_message], "email": email}
+
+
+async def run_agent(
+    user_message: HumanMessage, email: str | None, session: dict[str, Any]
+) -> dict[str, Any]:
+    """
+    Run the agent for a new user message.
+    Only the new message is submitted; see build_turn_input.
+    """
+    input_state = await build_turn_input(user_message, email, session)
+    return await agent_graph.ainvoke(input_state, config=session["config"])  # type: ignore config attribute
+
+
+async def agent_events(
+    user_message: HumanMessage, email: str | None, session: dict[str, Any]
+) -> AsyncIterator[tuple[str, Any]]:
+    """
+    Run the agent for a new user message and yield what to render as it
+    streams: the events of agent.streaming.turn_events, with tool names
+    turned into progress labels, and finally ("state", values) with the
+    checkpointed thread state.
+    """
+    input_state = await build_turn_input(user_message, email, session)
+    async for kind, payload in turn_events(agent_graph, input_state, session["config"]):
+        if kind == "tools":
+            yield kind, sorted({TOOL_PROGRESS.get(name, f"🔧 {name}...") for name in payload})
+        else:
+            yield kind, payload
+
+    yield "state", await fetch_thread_state(session["config"])
+
+
+def render_agent_stream(events: AsyncIterator[tuple[str, Any]]) -> dict[str, Any]:
+    """
+    Render agent events in the current chat message while the turn runs on
+    the background loop. Returns the final thread state.
+
+    A stop button is shown while the turn runs. Pressing it reruns the
+    script, which interrupts this loop and cancels the in-flight turn.
+    """
+    st.button("⏹ Detener", help="Stop the current reply.")
+    started = time.perf_counter()
+    first_token_at = None
+    # One placeholder and text buffer per streamed AI message.
+    replies: dict[str, tuple[Any, list[str]]] = {}
+    status = st.empty()
+    labels: list[str] = []
+    result: dict[str, Any] = {}
+
+    for event in get_agent_loop().stream(events, heartbeat=0.5):
+        if event is None:
+            # No news; refresh the timer so Streamlit can handle a stop.
+            if labels:
+                elapsed = time.perf_counter() - started
+                status.caption(" · ".join(labels) + f" ({elapsed:.0f}s)")
+            continue
+        kind, payload = event
+        if kind == "token":
+            message_id, text = payload
+            if first_token_at is None:
+                first_token_at = time.perf_counter()
+                logging.info(f"Time to first token: {first_token_at - started:.2f}s")
+            if message_id not in replies:
+                replies[message_id] = (st.empty(), [])
+            placeholder, parts = replies[message_id]
+            parts.append(text)
+            placeholder.markdown("".join(parts))
+        elif kind == "tools":
+            labels = payload
+            status.caption(" · ".join(labels))
+        elif kind == "tools_done":
+            labels = []
+            status.empty()
+        elif kind == "state":
+            result = payload
+
+    logging.info(f"Turn finished in {time.perf_counter() - started:.2f}s")
+    return result
+
+
+async def fetch_thread_state(config: dict[str, Any]) -> dict[str, Any]:
+    """Return the checkpointed state of a thread."""
+    snapshot = await agent_graph.aget_state(config)  # type: ignore config attribute
+    return snapshot.values
+
+
+def fetch_production_jobs() -> list[ProductionJob]:
+    """Return the production jobs ordered from the current session's thread."""
+    queue = get_production_queue(Configuration())
+    return queue.jobs_for_thread(st.session_state.thread_id)
+
+
+def display_production_jobs(jobs: list[ProductionJob]) -> None:
+    """Display the status of production jobs, linking finished files."""
+    if not jobs:
+        st.caption("Todavía no encargaste archivos de producción.")
+        return
+    for job in jobs:
+        order = job.order
+        st.markdown(f"**Diseño {order.design_number}** · Talle {order.size} · {order.product_type}")
+        status = JOB_STATUS.get(job.status, job.status)
+        if job.status == DONE:
+            st.markdown(f"{status} · [Descargar]({job.result_url})")
+        elif job.status == FAILED:
+            st.caption(f"{status}: {job.error}")
+        elif job.attempts > 1:
+            st.caption(f"{status} · reintento {job.attempts - 1}")
+        else:
+            st.caption(status)
+
+
+def display_mockups(mockups: list[dict[str, Any]]) -> None:
+    """Show each design's garment mockups side by side, one row per design."""
+    designs: dict[tuple[Any, Any], list[dict[str, Any]]] = {}
+    for mockup in mockups:
+        designs.setdefault((mockup.get("image_number"), mockup.get("variant")), []).append(mockup)
+    for (image_number, variant), previews in designs.items():
+        label = f"**Imagen {image_number}**"
+        if variant is not None:
+            label += f" · Versión {variant}"
+        st.markdown(label)
+        for column, mockup in zip(st.columns(len(previews)), previews, strict=True):
+            with column:
+                display_artifact(mockup)
+
+
+@st.fragment(run_every=JOB_POLL_SECONDS)
+def poll_production_jobs() -> None:
+    """Refresh the production jobs until all of them are finished."""
+    jobs = fetch_production_jobs()
+    display_production_jobs(jobs)
+    if all(job.finished for job in jobs):
+        # Rerun the whole app once, which stops the polling.
+        st.rerun()
+
+
+def setup_sidebar() -> str:
+    """Setup the sidebar configuration and return user email."""
+    with st.sidebar:
+        user_email = st.text_input(
+            "Email:",  # <-- Made label shorter
+            placeholder="your.email@example.com",
+            help="Your email is required to start the chat.",
+        )
+
+        st.markdown("---")
+        st.subheader("📦 Imagenes Generadas")
+        st.subheader("Tienes un limite de 3")
+        st.markdown(f"**Total:** {st.session_state.image_count}")
+
+        images = [a for a in st.session_state.artifacts if a.get("type") == "image"]
+        if images:
+            medals = {
+                1: "🥇 **Primera Imagen**",
+                2: "🥈 **Segunda Imagen**",
+                3: "🥉 **Tercera Imagen**",
+            }
+            for index, artifact in enumerate(images):
+                if index > 0:
+                    st.markdown("---")
+                image_number = artifact.get("image_number", index + 1)
+                label = medals.get(image_number, f"**Imagen {image_number}**")
+                if "variant" in artifact:
+                    label += f" · Versión {artifact['variant']}"
+                st.markdown(label)
+                display_artifact(artifact, index)
+        else:
+            st.caption("No se generaron imagenes todavia.")
+
+        mockups = [a for a in st.session_state.artifacts if a.get("type") == "mockup"]
+        if mockups:
+            st.markdown("---")
+            st.subheader("👕 Vista previa")
+            display_mockups(mockups)
+
+        st.markdown("---")
+        st.subheader("🏭 Producción")
+        jobs = fetch_production_jobs()
+        if any(not job.finished for job in jobs):
+            poll_production_jobs()
+        else:
+            display_production_jobs(jobs)
+
+        st.markdown("---")
+
+        st.toggle(
+            "Respuesta en vivo",
+            key="streaming",
+            help="Show the reply while it is being written.",
+        )
+
+        if st.button("🔄 Resincronizar", help="Reload the conversation from the server."):
+            state = get_agent_loop().run(fetch_thread_state(agent_config()))
+            if state:
+                process_agent_result(state)
+            st.rerun()
+
+    return user_email
+
+
+def display_chat_history() -> None:
+    """Display chat messages from session state."""
+    for message in st.session_state.messages:
+        if isinstance(message, HumanMessage):
+            with st.chat_message("user"):
+                st.write(message.content)
+        elif isinstance(message, AIMessage):
+            with st.chat_message("assistant"):
+                if message.content:
+                    st.write(message.content)
+                # if hasattr(message, "response_metadata") and message.response_metadata: TODO: uncomment if want to show
+                #     internal_plan = message.response_metadata.get("internal_plan")
+                #     if internal_plan:
+                #         with st.expander("🤔 Internal Plan"):
+                #             st.markdown(internal_plan)
+
+                # if hasattr(message, "tool_calls") and message.tool_calls:
+                #     with st.expander("🔧 Tool Calls"):
+                #         for tool_call in message.tool_calls:
+                #             st.json(
+                #                 {
+                #                     "name": tool_call.get("name", "unknown"),
+                #                     "args": tool_call.get("args", {}),
+                #                 }
+                #             )
+
+
+def display_artifacts_section() -> None:
+    """Display generated artifacts section."""
+    pass
+
+
+def handle_chat_input(user_email: str) -> None:
+    """Handle chat input and agent processing."""
+    if prompt := st.chat_input("Ask me anything..."):
+        
+        if not user_email:
+            st.error("Please enter your email in the sidebar to begin.")
+            st.stop()
+        
+        # Add user message to session state
+        user_message = HumanMessage(content=prompt)
+        st.session_state.messages.append(user_message)
+
+        # Display user message immediately
+        with st.chat_message("user"):
+            st.write(prompt)
+
+        with st.chat_message("assistant"):
+            try:
+                session = session_snapshot()
+                if st.session_state.streaming:
+                    # Render tokens and tool progress as they arrive
+                    result = render_agent_stream(
+                        agent_events(user_message, user_email, session)
+                    )
+                else:
+                    # Show thinking indicator until the whole turn is done
+                    with st.spinner("🤔 Thinking..."):
+                        result = get_agent_loop().run(
+                            run_agent(user_message, user_email, session)
+                        )
+                # Update session state with the agent's full history
+                process_agent_result(result)
+
+            except Exception as e:
+                st.error(f"❌ Error: {e!s}")
+                st.session_state.messages.append(
+                    AIMessage(content=f"I encountered an error: {e!s}")
+                )
+
+        # Rerun to display the new state (AI message and artifacts)
+        st.rerun()
+
+
+def process_agent_result(result: dict[str, Any]) -> None:
+    """Process the agent result and update session state."""
+    # --- Replace local state with the full state from the agent's memory ---
+    st.session_state.messages = result.get("messages", [])
+    st.session_state.artifacts = result.get("artifacts", [])
+    st.session_state.image_count = result.get("image_count", st.session_state.image_count)
+
+
+def main():
+    """Main Streamlit application."""
+    st.title("🤖 Ownit Agent Chatbot")
+    st.markdown("Chat with your AI agent powered by LangGraph")
+
+    user_email = setup_sidebar()
+
+    display_chat_history()
+
+    handle_chat_input(user_email)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1 @@
+"""Micro-benchmarks for the agent's hot paths. Run each module as a script."""
@@ -0,0 +1,61 @@
+"""Compare checkpoint size and write time for inline vs referenced artifacts.
+
+Builds the state a thread holds after three generated designs, once with the
+PNG bytes base64-encoded into `artifacts` (the old layout) and once with
+artifact-store references, then serializes it the way the checkpointer does.
+
+Usage:
+    python tests/benchmarks/bench_checkpoint_size.py
+"""
+
+import base64
+import os
+import tempfile
+import time
+
+from agent.artifacts import ArtifactStore
+from langchain_core.messages import AIMessage, HumanMessage
+from langgraph.checkpoint.serde.jsonplus import JsonPlusSerializer
+
+DESIGN_BYTES = 1_500_000  # A typical 1024x1024 dall-e-3 PNG.
+DESIGNS = 3
+WRITES = 20
+
+
+def checkpoint_values(artifacts: list[dict]) -> dict:
+    """Return channel values resembling a thread after three designs."""
+    messages = []
+    for i in range(10):
+        messages.append(HumanMessage(content=f"cambio {i}", id=f"h{i}"))
+        messages.append(AIMessage(content=f"respuesta {i}", id=f"a{i}"))
+    return {"messages": messages, "artifacts": artifacts, "image_count": DESIGNS}
+
+
+def measure(serde: JsonPlusSerializer, values: dict) -> tuple[int, float]:
+    """Return the serialized size and the mean serialization time in ms."""
+    start = time.perf_counter()
+    for _ in range(WRITES):
+        _, payload = serde.dumps_typed(values)
+    elapsed = (time.perf_counter() - start) / WRITES
+    return len(payload), elapsed * 1000
+
+
+def main() -> None:
+    """Print checkpoint size and write time for both artifact layouts."""
+    serde = JsonPlusSerializer()
+    designs = [os.urandom(DESIGN_BYTES) for _ in range(DESIGNS)]
+
+    inline = [{"type": "image", "b64": base64.b64encode(d).decode()} for d in designs]
+    with tempfile.TemporaryDirectory() as root:
+        store = ArtifactStore(root)
+        referenced = [{"type": "image", "ref": store.put(d)} for d in designs]
+
+    for name, artifacts in (("inline b64", inline), ("references", referenced)):
+        size, ms = measure(serde, checkpoint_values(artifacts))
+        print(
+            f"{name:>11}: {size / 1024:10.1f} KiB per checkpoint, {ms:7.2f} ms to serialize"
+        )
+
+
+if __name__ == "__main__":
+    main()
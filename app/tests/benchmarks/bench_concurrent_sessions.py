@@ -0,0 +1,85 @@
+"""Load-test the production step with many concurrent sessions on one loop.
+
+Each session keys a 1024x1024 design and then "uploads" it with a blocking
+call that sleeps for `UPLOAD_LATENCY` seconds, as `storage.upload_file` does while
+it waits on the network. The keying part only scales with the number of
+cores available to the CPU pool; the upload part scales with the I/O pool.
+Inline runs the blocking calls on the event loop as the graph nodes used to;
+offloaded runs them through `agent.executors`.
+
+Usage:
+    python tests/benchmarks/bench_concurrent_sessions.py
+"""
+
+import asyncio
+import os
+import tempfile
+import time
+
+import numpy as np
+from agent.executors import run_cpu, run_io, shutdown_executors
+from agent.tools import convert_black_to_transparent
+from PIL import Image
+
+UPLOAD_LATENCY = 0.2
+SESSIONS = (1, 4, 16)
+DISC_RADIUS_SQ = 0.1  # Squared radius of the disc, as a fraction of the size.
+
+
+def fake_upload(path: str) -> str:
+    """Stand in for `storage.upload_file` with a fixed blocking delay."""
+    time.sleep(UPLOAD_LATENCY)
+    return f"https://storage.example/{os.path.basename(path)}"
+
+
+def design_like_pixels(size: int = 1024) -> np.ndarray:
+    """A black background with a shaded disc, roughly like a DALL-E design."""
+    y, x = np.mgrid[:size, :size] / size
+    disc = ((x - 0.5) ** 2 + (y - 0.5) ** 2) < DISC_RADIUS_SQ
+    pixels = np.zeros((size, size, 3), dtype=np.uint8)
+    pixels[..., 0] = disc * (255 * x).astype(np.uint8)
+    pixels[..., 1] = disc * (255 * y).astype(np.uint8)
+    pixels[..., 2] = disc * 180
+    return pixels
+
+
+async def inline_session(src: str, out: str) -> None:
+    """Run the production step with blocking calls on the event loop."""
+    convert_black_to_transparent(src, out)
+    fake_upload(out)
+
+
+async def offloaded_session(src: str, out: str) -> None:
+    """Run the production step through the executor layer."""
+    await run_cpu(convert_black_to_transparent, src, out)
+    await run_io(fake_upload, out)
+
+
+async def measure(session, workdir: str, src: str, sessions: int) -> float:
+    """Run `sessions` concurrent sessions and return completed sessions/sec."""
+    start = time.perf_counter()
+    await asyncio.gather(
+        *(session(src, os.path.join(workdir, f"out-{i}.png")) for i in range(sessions))
+    )
+    return sessions / (time.perf_counter() - start)
+
+
+async def main() -> None:
+    """Print throughput for inline vs offloaded execution."""
+    with tempfile.TemporaryDirectory() as workdir:
+        src = os.path.join(workdir, "design-1.png")
+        Image.fromarray(design_like_pixels()).save(src)
+
+        # Warm up the pools so process start-up is not billed to the first run.
+        await measure(offloaded_session, workdir, src, 2)
+
+        print(f"{'sessions':>8} {'inline/s':>10} {'offloaded/s':>12}")
+        for sessions in SESSIONS:
+            inline = await measure(inline_session, workdir, src, sessions)
+            offloaded = await measure(offloaded_session, workdir, src, sessions)
+            print(f"{sessions:>8} {inline:>10.1f} {offloaded:>12.1f}")
+    shutdown_executors()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
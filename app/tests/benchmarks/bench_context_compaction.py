@@ -0,0 +1,90 @@
+"""Measure history tokens per model call as a design thread grows.
+
+Builds a synthetic thread where every turn generates a design with a long
+image prompt, then times the compaction of the whole history at several
+thread lengths and compares the tokens sent with and without it. Token
+counts come from tiktoken when its encoding is available, otherwise from
+the length estimate.
+
+Usage:
+    python tests/benchmarks/bench_context_compaction.py
+"""
+
+import time
+
+from agent.context import ContextCompactor
+from agent.tools import create_image_prompt
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+
+BUDGET = 8000
+KEEP_RECENT = 8
+
+
+def design_turn(n: int) -> list:
+    """One user turn: feedback, a prompt, the create_image call and the reply."""
+    prompt = create_image_prompt.invoke(
+        {
+            "main_character": f"un gato astronauta número {n}",
+            "text": "OWNIT",
+            "items_to_include": ["cohete", "estrellas", "casco"],
+            "color_palette": "rojo y dorado",
+        }
+    )
+    return [
+        HumanMessage(
+            content=f"Me gusta, pero cambiá el color del casco ({n}).", id=f"h{n}"
+        ),
+        AIMessage(
+            content="",
+            id=f"p{n}",
+            tool_calls=[{"name": "create_image_prompt", "args": {}, "id": f"cp{n}"}],
+        ),
+        ToolMessage(
+            content=prompt,
+            name="create_image_prompt",
+            tool_call_id=f"cp{n}",
+            id=f"tp{n}",
+        ),
+        AIMessage(
+            content="",
+            id=f"a{n}",
+            tool_calls=[
+                {
+                    "name": "create_image",
+                    "args": {"prompt": prompt, "image_number": n},
+                    "id": f"c{n}",
+                }
+            ],
+        ),
+        ToolMessage(
+            content=f"images/a@b.c/design-{n}.png",
+            name="create_image",
+            tool_call_id=f"c{n}",
+            id=f"t{n}",
+        ),
+        AIMessage(
+            content=f"¡Listo! Acá está la versión {n}. ¿Qué te parece?", id=f"r{n}"
+        ),
+    ]
+
+
+def main() -> None:
+    """Print history tokens and compaction time per call for growing threads."""
+    compactor = ContextCompactor(BUDGET, KEEP_RECENT)
+    # Compacted copies keep their message ids, so measure them uncached.
+    measure = ContextCompactor(0, 0)
+    messages: list = []
+    print(f"{'turns':>5} {'full tokens':>12} {'sent tokens':>12} {'compact ms':>11}")
+    for n in range(1, 101):
+        messages.extend(design_turn(n))
+        start = time.perf_counter()
+        compacted = compactor.compact(messages)
+        elapsed = (time.perf_counter() - start) * 1000
+        if n in (1, 5, 10, 25, 50, 100):
+            full = sum(compactor.count(m) for m in messages)
+            sent = sum(measure._measure(m) for m in compacted)
+            print(f"{n:>5} {full:>12} {sent:>12} {elapsed:>11.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+"""Measure gang sheet packing and compositing.
+
+Packing: `pack_sheets` on batches of production files of the four talles at
+300 DPI, and of random rectangles as a harder case, reporting sheets used,
+mean utilization (the share of each sheet's area covered by files) and
+runtime.
+
+Compositing: renders one print file per talle, then composes the first sheet
+of a talle batch with `compose_sheet` in a fresh process, reporting runtime
+and RSS before and at peak next to the size the whole sheet would take in
+memory.
+
+Usage (from ``app/``):
+    python -m tests.benchmarks.bench_gang_sheet [--items 50 200 1000]
+"""
+
+import argparse
+import multiprocessing
+import os
+import resource
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+from agent.configuration import Configuration
+from agent.gangsheet import PackedSheet, compose_sheet, pack_sheets
+from agent.imaging import key_png
+from agent.printing import print_width_px, render_print_files
+
+# The shared fakes live under app/tests, which is only importable from app/;
+# put it on the path so the benchmark also runs as a script.
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+from tests.fakes.images import canned_png
+
+
+def talle_sizes(
+    count: int, dpi: int, widths_cm: dict[str, float]
+) -> list[tuple[int, int]]:
+    """Square production files, cycling through the talles."""
+    widths = [print_width_px(cm, dpi) for cm in widths_cm.values()]
+    return [(widths[i % len(widths)],) * 2 for i in range(count)]
+
+
+def random_sizes(count: int, dpi: int) -> list[tuple[int, int]]:
+    """Rectangles between 5 and 30 cm on each side."""
+    rng = np.random.default_rng(0)
+    low, high = print_width_px(5, dpi), print_width_px(30, dpi)
+    return [
+        tuple(int(v) for v in rng.integers(low, high, size=2)) for _ in range(count)
+    ]
+
+
+def current_rss_mb() -> float:
+    """Return the resident set size of this process in MB."""
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+
+
+def compose_in_process(
+    path: str, sheet: PackedSheet, files: list[str], dpi: int
+) -> tuple[float, float, float]:
+    """Compose one sheet. Returns seconds, the starting RSS and the peak RSS in MB."""
+    baseline = current_rss_mb()
+    start = time.perf_counter()
+    compose_sheet(path, sheet, files, dpi)
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    return time.perf_counter() - start, baseline, peak
+
+
+def main() -> None:
+    """Print packing results per batch, then one composited sheet."""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--items", type=int, nargs="+", default=[50, 200, 1000])
+    args = parser.parse_args()
+
+    configuration = Configuration()
+    dpi = configuration.print_dpi
+    sheet_width = print_width_px(configuration.gang_sheet_width_cm, dpi)
+    max_length = print_width_px(configuration.gang_sheet_max_length_cm, dpi)
+    spacing = print_width_px(configuration.gang_sheet_spacing_cm, dpi)
+    print(f"sheet {sheet_width}px wide, up to {max_length}px long, {spacing}px spacing")
+
+    print(f"{'batch':<8} {'items':>6} {'sheets':>7} {'util':>6} {'pack ms':>9}")
+    for kind in ("talles", "random"):
+        for count in args.items:
+            sizes = (
+                talle_sizes(count, dpi, configuration.print_widths_cm)
+                if kind == "talles"
+                else random_sizes(count, dpi)
+            )
+            start = time.perf_counter()
+            sheets, _ = pack_sheets(sizes, sheet_width, max_length, spacing)
+            elapsed = time.perf_counter() - start
+            utilization = statistics.mean(sheet.utilization for sheet in sheets)
+            print(
+                f"{kind:<8} {count:>6} {len(sheets):>7} {utilization:>6.0%}"
+                f" {elapsed * 1000:>9.1f}"
+            )
+
+    with tempfile.TemporaryDirectory() as workdir:
+        keyed = key_png(canned_png(1024), threshold=30)
+        files = {
+            print_width_px(cm, dpi): os.path.join(workdir, f"talle-{talle}.png")
+            for talle, cm in configuration.print_widths_cm.items()
+        }
+        render_print_files(keyed, [(path, width) for width, path in files.items()], dpi)
+        sizes = talle_sizes(12, dpi, configuration.print_widths_cm)
+        [sheet, *_] = pack_sheets(sizes, sheet_width, max_length, spacing)[0]
+        item_files = [files[width] for width, _ in sizes]
+        context = multiprocessing.get_context("spawn")
+        with context.Pool(1) as pool:
+            seconds, baseline, peak = pool.apply(
+                compose_in_process,
+                (os.path.join(workdir, "sheet.png"), sheet, item_files, dpi),
+            )
+        canvas_mb = sheet.width * sheet.length * 4 / 2**20
+        print(
+            f"composed {len(sheet.placements)} files on {sheet.width}x{sheet.length}"
+            f" ({sheet.utilization:.0%} used) in {seconds:.1f}s,"
+            f" RSS {baseline:.0f} MB before, {peak:.0f} MB peak;"
+            f" a full canvas would take {canvas_mb:.0f} MB"
+        )
+
+
+if __name__ == "__main__":
+    main()
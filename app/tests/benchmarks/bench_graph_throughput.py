@@ -0,0 +1,234 @@
+"""Drive whole design conversations through the agent graph, offline.
+
+Each simulated thread plays a full conversation against `agent.graph.graph`:
+
+1. ask for a design, which generates and stores one image,
+2. say it is good, which moves to the finishing model,
+3. give the size and type, which queues the production file; the production
+   workers key and upload it after the turn.
+
+Nothing leaves the machine. The chat model is `tests.fakes.chat.ScriptedChatModel`,
+images come from `tests.fakes.images.FakeImagesServer` through ``OPENAI_BASE_URL``
+and uploads go to `tests.fakes.gcs.FakeGCSServer` through
+``STORAGE_EMULATOR_HOST``, each with a configurable latency. The turns are
+streamed with `turn_events`, as the front ends do.
+
+For each concurrency level the benchmark reports completed turns/sec, p50 and
+p99 turn latency, the p50 latency of the production turn alone, how long the
+production queue took to drain after the last turn, and the peak RSS of this
+process (CPU pool workers are separate processes and not included). The checkpointer follows
+``OWNIT_CHECKPOINTER`` and defaults to ``memory`` here.
+
+Usage (from ``app/``):
+    python -m tests.benchmarks.bench_graph_throughput [--threads 1 10 100]
+        [--print-dpi DPI]
+"""
+
+import argparse
+import asyncio
+import contextlib
+import os
+import resource
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from agent.configuration import Configuration
+from agent.jobs import get_production_queue, wait_for_job
+from agent.streaming import turn_events
+
+# The shared fakes live under app/tests, which is only importable from app/;
+# put it on the path so the benchmark also runs as a script.
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+from tests.fakes.chat import ScriptedChatModel
+from tests.fakes.gcs import FakeGCSServer
+from tests.fakes.images import FakeImagesServer
+
+CONVERSATION = (
+    # Unique per thread, so every design misses the generation cache.
+    "Quiero una remera con un gato astronauta, pedido {thread_id}",
+    "Me encanta, terminemos",
+    "Talle M, LISO",
+)
+RSS_SAMPLE_INTERVAL = 0.02
+# Seconds allowed per queued job for the production queue to drain. Every
+# job renders each talle at print resolution, so draining grows with the
+# number of threads.
+DRAIN_SECONDS_PER_JOB = 15.0
+
+
+def current_rss_mb() -> float:
+    """Return the resident set size of this process in MB."""
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except OSError:
+        # No procfs: fall back to the lifetime peak, in KB on Linux.
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+async def sample_peak_rss(peak: list[float]) -> None:
+    """Keep `peak[0]` at the highest RSS seen until cancelled."""
+    while True:
+        peak[0] = max(peak[0], current_rss_mb())
+        await asyncio.sleep(RSS_SAMPLE_INTERVAL)
+
+
+async def run_conversation(
+    graph, thread_id: str, latencies: list[tuple[int, float]], args: argparse.Namespace
+) -> None:
+    """Play the whole conversation on one thread, recording each turn's latency."""
+    config = {"configurable": {"thread_id": thread_id}}
+    if args.no_prekey:
+        config["configurable"]["prekey_cache_size"] = 0
+    if args.print_dpi is not None:
+        config["configurable"]["print_dpi"] = args.print_dpi
+    email = f"{thread_id}@bench.example"
+    for turn, message in enumerate(CONVERSATION):
+        if turn:
+            await asyncio.sleep(args.think_time)
+        input_state = {
+            "messages": [("user", message.format(thread_id=thread_id))],
+            "email": email,
+        }
+        start = time.perf_counter()
+        async for _ in turn_events(graph, input_state, config):  # type: ignore config
+            pass
+        latencies.append((turn, time.perf_counter() - start))
+
+
+def percentile(values: list[float], q: float) -> float:
+    """Return the `q` quantile of sorted `values`."""
+    return values[min(len(values) - 1, int(len(values) * q))]
+
+
+async def run_level(
+    graph, threads: int, label: str, args: argparse.Namespace
+) -> dict[str, float]:
+    """Run `threads` conversations concurrently and summarize them."""
+    latencies: list[tuple[int, float]] = []
+    thread_ids = [f"{label}-{i}" for i in range(threads)]
+    peak = [current_rss_mb()]
+    sampler = asyncio.create_task(sample_peak_rss(peak))
+    start = time.perf_counter()
+    try:
+        await asyncio.gather(
+            *(
+                run_conversation(graph, thread_id, latencies, args)
+                for thread_id in thread_ids
+            )
+        )
+        elapsed = time.perf_counter() - start
+        queue = get_production_queue(Configuration())
+        job_ids = [job.id for t in thread_ids for job in queue.jobs_for_thread(t)]
+        timeout = 60.0 + DRAIN_SECONDS_PER_JOB * len(job_ids)
+        await asyncio.gather(
+            *(wait_for_job(queue, job_id, timeout=timeout) for job_id in job_ids)
+        )
+        drain = time.perf_counter() - start - elapsed
+    finally:
+        sampler.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await sampler
+    turns = sorted(seconds for _, seconds in latencies)
+    production = sorted(s for turn, s in latencies if turn == len(CONVERSATION) - 1)
+    return {
+        "turns_per_s": len(turns) / elapsed,
+        "p50_ms": statistics.median(turns) * 1000,
+        "p99_ms": percentile(turns, 0.99) * 1000,
+        "production_p50_ms": statistics.median(production) * 1000,
+        "drain_s": drain,
+        "peak_rss_mb": peak[0],
+    }
+
+
+async def measure(args: argparse.Namespace, gcs: FakeGCSServer) -> None:
+    """Print one row per concurrency level."""
+    # Imported late: the graph builds its checkpointer from the environment.
+    from agent import graph as graph_module  # noqa: PLC0415
+    from agent.executors import shutdown_executors  # noqa: PLC0415
+    from agent.jobs import stop_production_workers  # noqa: PLC0415
+
+    models = {
+        finishing: ScriptedChatModel(
+            finishing=finishing, token_latency=args.token_latency
+        )
+        for finishing in (False, True)
+    }
+    # Only the main model is bound to create_image.
+    graph_module.get_chat_model = lambda name, tools: models[  # type: ignore assignment
+        all(t.name != "create_image" for t in tools)
+    ]
+
+    # Warm up the pools and clients so start-up is not billed to the first level.
+    await run_level(graph_module.graph, 1, "warmup", args)
+
+    print(
+        f"{'threads':>7} {'turns/s':>9} {'p50 ms':>9} {'p99 ms':>9}"
+        f" {'prod p50':>9} {'drain s':>8} {'peak RSS':>10}"
+    )
+    for threads in args.threads:
+        result = await run_level(graph_module.graph, threads, f"t{threads}", args)
+        print(
+            f"{threads:>7} {result['turns_per_s']:>9.1f} {result['p50_ms']:>9.0f}"
+            f" {result['p99_ms']:>9.0f} {result['production_p50_ms']:>9.0f}"
+            f" {result['drain_s']:>8.2f}"
+            f" {result['peak_rss_mb']:>7.0f} MB"
+        )
+        produced = sum("-talle-m-liso-" in name for _, name in gcs.objects)
+        assert produced >= threads, (
+            f"only {produced} production files for {threads} threads"
+        )
+    await stop_production_workers()
+    shutdown_executors()
+
+
+def main() -> None:
+    """Start the fake services, point the agent at them and run the levels."""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--threads", type=int, nargs="+", default=[1, 10, 100])
+    parser.add_argument("--image-latency", type=float, default=0.5)
+    parser.add_argument("--upload-latency", type=float, default=0.05)
+    parser.add_argument("--token-latency", type=float, default=0.001)
+    parser.add_argument(
+        "--think-time",
+        type=float,
+        default=0.0,
+        help="Seconds a user waits between turns.",
+    )
+    parser.add_argument(
+        "--no-prekey", action="store_true", help="Disable speculative pre-keying."
+    )
+    parser.add_argument(
+        "--print-dpi",
+        type=int,
+        default=None,
+        help="DPI of the production files; 0 skips print rendering. "
+        "Defaults to the configured DPI.",
+    )
+    args = parser.parse_args()
+
+    with (
+        FakeImagesServer(latency=args.image_latency) as images,
+        FakeGCSServer(latency=args.upload_latency) as gcs,
+        tempfile.TemporaryDirectory() as workdir,
+    ):
+        os.environ.setdefault("OWNIT_CHECKPOINTER", "memory")
+        os.environ.update(
+            {
+                "OPENAI_API_KEY": "sk-bench",
+                "OPENAI_BASE_URL": images.url,
+                "STORAGE_EMULATOR_HOST": gcs.url,
+                "GCP_BUCKET_NAME": "bench",
+            }
+        )
+        # Images, artifacts and the generation cache are written under the cwd.
+        os.chdir(workdir)
+        asyncio.run(measure(args, gcs))
+
+
+if __name__ == "__main__":
+    main()
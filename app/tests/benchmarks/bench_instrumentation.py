@@ -0,0 +1,68 @@
+"""Measure the per-call overhead of the instrumentation hooks.
+
+Times an empty async node called directly, through `instrument_node` with
+instrumentation off, and with it on inside a turn trace, along with the
+executor round trip of `run_io` in both modes. The disabled numbers should
+be indistinguishable from the direct call.
+
+Usage:
+    python tests/benchmarks/bench_instrumentation.py
+"""
+
+import asyncio
+import time
+
+from agent import instrumentation
+from agent.executors import run_io, shutdown_executors
+
+CALLS = 100_000
+IO_CALLS = 5_000
+
+
+async def node(state):
+    """A node that does nothing, so only the wrapper is measured."""
+    return state
+
+
+def noop() -> None:
+    """An I/O call that does nothing, so only the executor is measured."""
+    return None
+
+
+async def per_call_us(func, calls: int) -> float:
+    """Return the mean microseconds per awaited call of `func`."""
+    start = time.perf_counter()
+    for _ in range(calls):
+        await func()
+    return (time.perf_counter() - start) / calls * 1e6
+
+
+async def measure() -> None:
+    """Print one row per call, with instrumentation off and on."""
+    wrapped = instrumentation.instrument_node("bench", node)
+    cases = {
+        "direct": lambda: node(None),
+        "wrapped": lambda: wrapped(None),
+        "run_io": lambda: run_io(noop),
+    }
+    print(f"{'call':>8} {'disabled':>12} {'enabled':>12}")
+    for name, func in cases.items():
+        calls = IO_CALLS if name == "run_io" else CALLS
+        instrumentation.enable(False)
+        disabled = await per_call_us(func, calls)
+        instrumentation.enable()
+        with instrumentation.turn_trace("bench") as trace:
+            enabled = await per_call_us(func, calls)
+            trace.spans.clear()  # Keep the logged trace small.
+        print(f"{name:>8} {disabled:>9.2f} us {enabled:>9.2f} us")
+    instrumentation.enable(False)
+
+
+def main() -> None:
+    """Run the measurement and shut the executors down."""
+    asyncio.run(measure())
+    shutdown_executors()
+
+
+if __name__ == "__main__":
+    main()
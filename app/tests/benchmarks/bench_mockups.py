@@ -0,0 +1,72 @@
+"""Measure garment mockup rendering: time per mockup, with and without cached templates.
+
+Renders a design on every product type with `render_mockups`:
+
+- ``cached``: the templates are built once, as in a warm CPU pool worker;
+- ``uncached``: the template cache is cleared before each render, so every
+  render also builds its garments; what rendering would cost without it.
+
+Each row reports the mean and 95th percentile milliseconds per mockup (one
+design on one product); a finishing turn renders one per design and product.
+
+Usage (from ``app/``):
+    python -m tests.benchmarks.bench_mockups [--sizes 512 1024] [--rounds 20]
+"""
+
+import argparse
+import statistics
+import sys
+import time
+from pathlib import Path
+
+from agent.mockups import (
+    PRODUCT_TYPES,
+    garment_template,
+    render_mockups,
+    warm_templates,
+)
+
+# The shared fakes live under app/tests, which is only importable from app/;
+# put it on the path so the benchmark also runs as a script.
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+from tests.fakes.images import canned_png
+
+
+def time_renders(data: bytes, rounds: int, cached: bool) -> list[float]:
+    """Return the milliseconds per mockup of each round."""
+    timings = []
+    for _ in range(rounds):
+        if not cached:
+            garment_template.cache_clear()
+        start = time.perf_counter()
+        render_mockups(data, PRODUCT_TYPES)
+        timings.append((time.perf_counter() - start) * 1000 / len(PRODUCT_TYPES))
+    return timings
+
+
+def main() -> None:
+    """Print the template build time, then one row per design size and mode."""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[512, 1024])
+    parser.add_argument("--rounds", type=int, default=20)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    warm_templates()
+    print(
+        f"templates for {len(PRODUCT_TYPES)} products built in "
+        f"{(time.perf_counter() - start) * 1000:.0f} ms"
+    )
+    print(f"{'design':>7} {'mode':<9} {'ms/mockup':>10} {'p95':>7}")
+    for size in args.sizes:
+        data = canned_png(size)
+        render_mockups(data, PRODUCT_TYPES)  # Warm up.
+        for mode in ("cached", "uncached"):
+            timings = time_renders(data, args.rounds, cached=mode == "cached")
+            p95 = statistics.quantiles(timings, n=20)[-1]
+            print(f"{size:>7} {mode:<9} {statistics.mean(timings):>10.1f} {p95:>7.1f}")
+        warm_templates()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,37 @@
+"""Measure per-call overhead of building vs reusing a tool-bound chat model.
+
+Only model construction and tool binding are timed; no request is sent.
+
+Usage:
+    OPENAI_API_KEY=... python tests/benchmarks/bench_model_registry.py
+"""
+
+import os
+import time
+
+from agent.tools import TOOLS
+from agent.utils import get_chat_model, load_chat_model
+
+MODEL = "openai/gpt-4.1-mini"
+CALLS = 200
+
+
+def mean_ms(func) -> float:
+    """Return the mean wall time of `func` over CALLS calls in ms."""
+    start = time.perf_counter()
+    for _ in range(CALLS):
+        func()
+    return (time.perf_counter() - start) / CALLS * 1000
+
+
+def main() -> None:
+    """Print the per-call overhead before and after the registry."""
+    os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")
+    before = mean_ms(lambda: load_chat_model(MODEL).bind_tools(TOOLS))
+    after = mean_ms(lambda: get_chat_model(MODEL, TOOLS))
+    print(f"load_chat_model + bind_tools: {before:8.3f} ms/call")
+    print(f"get_chat_model (cached)     : {after:8.3f} ms/call ({before / after:.0f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""Measure <Plan> extraction throughput on large streamed responses.
+
+Compares the incremental `PlanFilter` with what a streaming client has to do
+with the old regex: re-run it over the accumulated text after every chunk
+until the plan closes. A single regex pass over the finished reply is shown
+as the non-streaming floor.
+
+Usage:
+    python tests/benchmarks/bench_plan_parser.py
+"""
+
+import re
+import time
+
+from agent.plan import PlanFilter
+
+PLAN_RE = re.compile(r"<Plan>(.*?)</Plan>(.*)", re.DOTALL)
+CHUNK = 4  # Characters per streamed token, roughly what chat models send.
+
+
+def make_reply(plan_chars: int, text_chars: int) -> str:
+    """Build a reply with a plan and user text of the given sizes."""
+    return f"<Plan>{'p' * plan_chars}</Plan>\n{'t' * text_chars}"
+
+
+def chunked(reply: str) -> list[str]:
+    """Split a reply into streamed chunks of `CHUNK` characters."""
+    return [reply[i : i + CHUNK] for i in range(0, len(reply), CHUNK)]
+
+
+def incremental(chunks: list[str]) -> str:
+    """Return the visible text by feeding each chunk to a `PlanFilter`."""
+    plan_filter = PlanFilter()
+    visible = [plan_filter.feed(c) for c in chunks]
+    visible.append(plan_filter.finish())
+    return "".join(visible)
+
+
+def regex_per_chunk(chunks: list[str]) -> str:
+    """Return the visible text by re-matching the whole reply on every chunk."""
+    text = ""
+    for chunk in chunks:
+        text += chunk
+        match = PLAN_RE.search(text)
+    return match.group(2) if match else text
+
+
+def regex_once(chunks: list[str]) -> str:
+    """Return the visible text by matching the finished reply once."""
+    match = PLAN_RE.search("".join(chunks))
+    return match.group(2) if match else ""
+
+
+def mb_per_s(func, chunks: list[str], size: int) -> float:
+    """Return how many MB of reply per second `func` processes."""
+    start = time.perf_counter()
+    func(chunks)
+    return size / (time.perf_counter() - start) / 1e6
+
+
+def main() -> None:
+    """Print throughput for growing plan sizes."""
+    print(
+        f"{'plan chars':>10} {'incremental':>14} {'regex/chunk':>14} {'regex once':>14}"
+    )
+    for plan_chars in (1_000, 10_000, 50_000):
+        reply = make_reply(plan_chars, 20_000)
+        chunks = chunked(reply)
+        results = [
+            mb_per_s(func, chunks, len(reply))
+            for func in (incremental, regex_per_chunk, regex_once)
+        ]
+        print(f"{plan_chars:>10} " + " ".join(f"{r:>9.2f} MB/s" for r in results))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""Measure print-resolution rendering: time per output and peak memory.
+
+Renders a keyed 1024x1024 design at the print width of every talle three ways:
+
+- ``full frame``: resize the whole design with Pillow and save it, one talle
+  at a time; what a straightforward implementation would do;
+- ``strips``: `render_print_files` called once per talle;
+- ``strips, one decode``: one `render_print_files` call for all talles.
+
+Each mode runs in a fresh process so its peak RSS is its own; the table
+shows that peak next to the process's RSS just before rendering.
+
+Usage (from ``app/``):
+    python -m tests.benchmarks.bench_print_render [--dpi 300]
+"""
+
+import argparse
+import io
+import multiprocessing
+import os
+import resource
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+from agent.imaging import key_png
+from agent.printing import PRINT_WIDTHS_CM, print_width_px, render_print_files
+from PIL import Image
+
+# The shared fakes live under app/tests, which is only importable from app/;
+# put it on the path so the benchmark also runs as a script.
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+from tests.fakes.images import canned_png
+
+
+def design() -> bytes:
+    """A keyed design with some texture, so outputs compress like real ones."""
+    rng = np.random.default_rng(0)
+    with Image.open(io.BytesIO(canned_png(1024))) as img:
+        pixels = np.asarray(img).astype(np.int16)
+    noise = rng.integers(-12, 13, size=pixels.shape, dtype=np.int16)
+    textured = (
+        np.where(pixels > 0, pixels + noise, pixels).clip(0, 255).astype(np.uint8)
+    )
+    buffer = io.BytesIO()
+    Image.fromarray(textured).save(buffer, "PNG")
+    return key_png(buffer.getvalue(), threshold=30)
+
+
+def peak_rss_mb() -> float:
+    """Return the peak RSS of this process in MB (KB units on Linux)."""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def current_rss_mb() -> float:
+    """Return the resident set size of this process in MB."""
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+
+
+def full_frame(data: bytes, outputs: list[tuple[str, int]], dpi: int) -> None:
+    """Render each output by resizing the whole design in memory."""
+    for path, width in outputs:
+        with Image.open(io.BytesIO(data)) as img:
+            height = round(width * img.height / img.width)
+            img.resize((width, height), Image.Resampling.LANCZOS).save(
+                path, dpi=(dpi, dpi)
+            )
+
+
+def run_mode(
+    mode: str, data: bytes, outputs: list[tuple[str, int]], dpi: int
+) -> tuple[float, float, float]:
+    """Render in the current process. Returns seconds, the starting RSS and the peak."""
+    baseline = current_rss_mb()
+    start = time.perf_counter()
+    if mode == "full frame":
+        full_frame(data, outputs, dpi)
+    elif mode == "strips":
+        for output in outputs:
+            render_print_files(data, [output], dpi)
+    else:
+        render_print_files(data, outputs, dpi)
+    return time.perf_counter() - start, baseline, peak_rss_mb()
+
+
+def main() -> None:
+    """Print one row per rendering mode."""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--dpi", type=int, default=300)
+    args = parser.parse_args()
+
+    data = design()
+    widths = {
+        talle: print_width_px(cm, args.dpi) for talle, cm in PRINT_WIDTHS_CM.items()
+    }
+    print("outputs: " + ", ".join(f"{t.upper()} {w}px" for t, w in widths.items()))
+    print(
+        f"{'mode':<20} {'ms/output':>10} {'start RSS':>10} {'peak RSS':>10} {'files MB':>9}"
+    )
+    context = multiprocessing.get_context("spawn")
+    with (
+        tempfile.TemporaryDirectory() as workdir,
+        context.Pool(1, maxtasksperchild=1) as pool,
+    ):
+        outputs = [
+            (os.path.join(workdir, f"talle-{t}.png"), w) for t, w in widths.items()
+        ]
+        for mode in ("full frame", "strips", "strips, one decode"):
+            seconds, start, peak = pool.apply(run_mode, (mode, data, outputs, args.dpi))
+            total = sum(os.path.getsize(path) for path, _ in outputs) / 2**20
+            print(
+                f"{mode:<20} {seconds / len(outputs) * 1000:>10.0f}"
+                f" {start:>7.0f} MB {peak:>7.0f} MB {total:>9.1f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""Measure production throughput against the number of queue workers.
+
+Queues a burst of production orders, each for a different stored design, and
+times `ProductionWorkers` draining them with the real `produce`: keying on
+the CPU pool, then uploading to `tests.fakes.gcs.FakeGCSServer` through
+``STORAGE_EMULATOR_HOST`` with a fixed latency. Uploads dominate, so
+throughput should grow with the worker count until the CPU pool saturates.
+Pre-keying is off, so every job keys its own design.
+
+Usage (from ``app/``):
+    python -m tests.benchmarks.bench_production_queue [--jobs 40] [--workers 1 2 4 8]
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from agent.artifacts import get_artifact_store
+from agent.configuration import Configuration
+from agent.executors import shutdown_executors
+from agent.jobs import (
+    DONE,
+    ProductionOrder,
+    ProductionQueue,
+    ProductionWorkers,
+    wait_for_job,
+)
+
+# The shared fakes live under app/tests, which is only importable from app/;
+# put it on the path so the benchmark also runs as a script.
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+from tests.fakes.gcs import FakeGCSServer
+from tests.fakes.images import canned_png
+
+
+async def drain(jobs: int, workers: int, size: int, workdir: str) -> float:
+    """Queue `jobs` orders, drain them with `workers` workers and return jobs/sec."""
+    configuration = Configuration(prekey_cache_size=0, production_workers=workers)
+    store = get_artifact_store(configuration.artifact_store_dir)
+    queue = ProductionQueue(os.path.join(workdir, f"jobs-{workers}.sqlite"))
+    # One distinct design per job, so no two orders collapse into one.
+    base = canned_png(size)
+    ids = []
+    for n in range(jobs):
+        order = ProductionOrder(
+            email=f"w{workers}@bench.example",
+            design_number=1,
+            variant=None,
+            size=f"S{n}",
+            product_type="LISO",
+            source_ref=store.put(base + n.to_bytes(4, "big")),
+            keying_threshold=configuration.keying_threshold,
+            keying_feather=configuration.keying_feather,
+        )
+        ids.append(queue.enqueue(order)[0].id)
+
+    pool = ProductionWorkers(queue, configuration, workers, poll_interval=0.05)
+    start = time.perf_counter()
+    pool.start()
+    try:
+        done = await asyncio.gather(*(wait_for_job(queue, job_id) for job_id in ids))
+    finally:
+        await pool.stop()
+    elapsed = time.perf_counter() - start
+    assert all(job.status == DONE for job in done), "some production jobs failed"
+    return jobs / elapsed
+
+
+async def measure(args: argparse.Namespace, workdir: str) -> None:
+    """Print one row per worker count."""
+    # Warm up the CPU pool and the storage client.
+    await drain(2, 2, args.size, workdir)
+    print(f"{'workers':>7} {'jobs/s':>9} {'speedup':>8}")
+    baseline = None
+    for workers in args.workers:
+        rate = await drain(args.jobs, workers, args.size, workdir)
+        baseline = baseline or rate
+        print(f"{workers:>7} {rate:>9.1f} {rate / baseline:>7.1f}x")
+    shutdown_executors()
+
+
+def main() -> None:
+    """Start the fake storage, point the agent at it and run each worker count."""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--jobs", type=int, default=40)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--upload-latency", type=float, default=0.1)
+    parser.add_argument("--size", type=int, default=256, help="Design width in pixels.")
+    args = parser.parse_args()
+
+    with (
+        FakeGCSServer(latency=args.upload_latency) as gcs,
+        tempfile.TemporaryDirectory() as workdir,
+    ):
+        os.environ.update(
+            {"STORAGE_EMULATOR_HOST": gcs.url, "GCP_BUCKET_NAME": "bench"}
+        )
+        # Artifacts and local copies are written under the cwd.
+        os.chdir(workdir)
+        asyncio.run(measure(args, workdir))
+
+
+if __name__ == "__main__":
+    main()
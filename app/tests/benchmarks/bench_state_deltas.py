@@ -0,0 +1,93 @@
+"""Regression benchmark: per-step cost of a tools-node write vs history length.
+
+For a thread holding N messages, times the state merge of one tools-node
+write that returns either the full history plus its new message (the old
+behaviour of custom_tool_node/production_node) or just the delta. With
+deltas the node no longer re-submits N messages for id matching; what is
+left is add_messages copying the existing list, which is linear in N.
+
+It also times a whole super-step with an InMemorySaver for reference; that
+number still grows with N because the checkpointer serializes the messages
+channel on every write.
+
+Usage:
+    python tests/benchmarks/bench_state_deltas.py
+"""
+
+import asyncio
+import time
+
+from agent.state import InputState, State
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+from langgraph.checkpoint.memory import InMemorySaver
+from langgraph.graph import START, StateGraph, add_messages
+
+HISTORY_SIZES = (10, 100, 1_000)
+STEPS = 20
+
+
+def build_graph(delta: bool):
+    """A one-node graph that writes a ToolMessage and an artifact."""
+
+    async def tools(state: State) -> dict:
+        message = ToolMessage(content="ok", tool_call_id="call")
+        artifact = {"type": "image", "ref": "sha256:" + "0" * 64}
+        if delta:
+            return {"messages": [message], "artifacts": [artifact]}
+        return {"messages": [*state.messages, message], "artifacts": [artifact]}
+
+    builder = StateGraph(State, input_schema=InputState)
+    builder.add_node("tools", tools)
+    builder.add_edge(START, "tools")
+    return builder.compile(checkpointer=InMemorySaver())
+
+
+async def step_ms(delta: bool, history: int) -> float:
+    """Return the mean wall time of one step on a thread with `history` messages."""
+    graph = build_graph(delta)
+    config = {"configurable": {"thread_id": "bench"}}
+    seed = [
+        HumanMessage(content=f"m{i}") if i % 2 else AIMessage(content=f"m{i}")
+        for i in range(history)
+    ]
+    await graph.aupdate_state(config, {"messages": seed})
+
+    start = time.perf_counter()
+    for _ in range(STEPS):
+        await graph.ainvoke({"messages": []}, config)
+    return (time.perf_counter() - start) / STEPS * 1000
+
+
+def merge_ms(delta: bool, history: int) -> float:
+    """Return the mean wall time of merging one write into the messages channel."""
+    messages = add_messages(
+        [],
+        [HumanMessage(content=f"m{i}") for i in range(history)],
+    )
+    start = time.perf_counter()
+    for _ in range(STEPS):
+        new = ToolMessage(content="ok", tool_call_id="call")
+        update = [new] if delta else [*messages, new]
+        messages = add_messages(messages, update)
+    return (time.perf_counter() - start) / STEPS * 1000
+
+
+async def main() -> None:
+    """Print per-step cost for full-history and delta writes."""
+    print(
+        f"{'messages':>8} {'merge full':>11} {'merge delta':>12} "
+        f"{'step full':>10} {'step delta':>11}"
+    )
+    for history in HISTORY_SIZES:
+        merge_full = merge_ms(delta=False, history=history)
+        merge_delta = merge_ms(delta=True, history=history)
+        full = await step_ms(delta=False, history=history)
+        delta = await step_ms(delta=True, history=history)
+        print(
+            f"{history:>8} {merge_full:>11.3f} {merge_delta:>12.3f} "
+            f"{full:>10.2f} {delta:>11.2f}"
+        )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,101 @@
+"""Measure p50/p95 turn latency with asyncio.run per turn vs a persistent loop.
+
+Each simulated turn makes a few sequential HTTPS-like requests to a local
+server that charges a fixed delay for every new connection, standing in for
+the TCP and TLS handshakes to the OpenAI and GCS endpoints. With asyncio.run
+per turn the async client dies with its loop, so every turn pays for new
+connections; on the persistent loop the client and its pool are reused.
+
+Usage:
+    python tests/benchmarks/bench_turn_latency.py [turns]
+"""
+
+import asyncio
+import statistics
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import httpx
+from agent.runtime import BackgroundLoop
+
+HANDSHAKE_S = 0.03  # Per new connection, roughly a TLS handshake to a US region.
+REQUESTS_PER_TURN = 3  # e.g. model call, image call, upload.
+
+
+class Handler(BaseHTTPRequestHandler):
+    """A keep-alive endpoint that pays `HANDSHAKE_S` per new connection."""
+
+    protocol_version = "HTTP/1.1"  # keep-alive
+    disable_nagle_algorithm = True
+
+    def setup(self) -> None:
+        """Delay each new connection like a TLS handshake."""
+        time.sleep(HANDSHAKE_S)
+        super().setup()
+
+    def do_GET(self) -> None:
+        """Answer every request with a tiny body."""
+        self.send_response(200)
+        self.send_header("Content-Length", "2")
+        self.end_headers()
+        self.wfile.write(b"ok")
+
+    def log_message(self, format, *args) -> None:  # noqa: A002
+        """Keep the request log off the benchmark output."""
+        pass
+
+
+async def turn(client: httpx.AsyncClient, url: str) -> None:
+    """Make the requests of one turn on `client`."""
+    for _ in range(REQUESTS_PER_TURN):
+        (await client.get(url)).raise_for_status()
+
+
+async def turn_with_new_client(url: str) -> None:
+    """Make the requests of one turn on a fresh client, as `asyncio.run` per turn did."""
+    async with httpx.AsyncClient() as client:
+        await turn(client, url)
+
+
+def percentiles(samples: list[float]) -> str:
+    """Format the median and 95th percentile of `samples` in ms."""
+    q = statistics.quantiles(samples, n=20)
+    return (
+        f"p50 {statistics.median(samples) * 1000:6.1f} ms  p95 {q[18] * 1000:6.1f} ms"
+    )
+
+
+def measure(run_turn, turns: int) -> list[float]:
+    """Return the seconds taken by each of `turns` calls of `run_turn`."""
+    samples = []
+    for _ in range(turns):
+        start = time.perf_counter()
+        run_turn()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def main() -> None:
+    """Print turn latency percentiles for both runtimes."""
+    turns = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_address[1]}/"
+
+    before = measure(lambda: asyncio.run(turn_with_new_client(url)), turns)
+
+    background_loop = BackgroundLoop()
+    client = httpx.AsyncClient()
+    after = measure(lambda: background_loop.run(turn(client, url)), turns)
+    background_loop.run(client.aclose())
+    background_loop.close()
+    server.shutdown()
+
+    print(f"asyncio.run per turn : {percentiles(before)}")
+    print(f"persistent loop      : {percentiles(after)}")
+
+
+if __name__ == "__main__":
+    main()
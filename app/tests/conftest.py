@@ -1,5 +1,10 @@
+import os
+
 import pytest
 
+# Keep tests off the on-disk checkpoint database.
+os.environ.setdefault("OWNIT_CHECKPOINTER", "memory")
+
 
 @pytest.fixture(scope="session")
 def anyio_backend():
@@ -0,0 +1 @@
+"""Offline stand-ins for the external services the agent talks to."""
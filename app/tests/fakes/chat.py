@@ -0,0 +1,166 @@
+"""A scripted chat model that plays the Ownit design conversation.
+
+`ScriptedChatModel` answers from the conversation it is given rather than
+from a fixed list of replies, so one instance can serve any number of
+concurrent threads. The main model generates a design for each request and
+calls ``finalize_design`` once the user says "terminemos" or names a size
+("talle"); threads with fewer than three designs start every turn on the main
+model. The finishing model asks for the size and calls
+``execute_production_file`` once the user gives one. Replies stream in small
+chunks with a ``<Plan>`` prefix and report token usage, like the real model.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import uuid
+from collections.abc import AsyncIterator, Iterator
+from typing import Any
+
+from agent.prompting import CURRENT_TIME_LABEL
+from langchain_core.callbacks import (
+    AsyncCallbackManagerForLLMRun,
+    CallbackManagerForLLMRun,
+)
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import (
+    AIMessage,
+    AIMessageChunk,
+    BaseMessage,
+    HumanMessage,
+    SystemMessage,
+    ToolMessage,
+)
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+CHUNK_CHARS = 4  # Roughly one streamed token.
+
+
+class ScriptedChatModel(BaseChatModel):
+    """Plays either the main design model or the finishing model.
+
+    Args:
+        finishing (bool): Play the finishing model instead of the main one.
+        token_latency (float): Seconds to wait before each streamed chunk.
+    """
+
+    finishing: bool = False
+    token_latency: float = 0.0
+
+    @property
+    def _llm_type(self) -> str:
+        return "scripted-ownit"
+
+    def reply(self, messages: list[BaseMessage]) -> AIMessage:
+        """Return the scripted reply to a conversation."""
+        history = [m for m in messages if not isinstance(m, SystemMessage)]
+        last = history[-1]
+        request = next(
+            (
+                str(m.content).split(f"\n\n{CURRENT_TIME_LABEL}")[0].lower()
+                for m in reversed(history)
+                if isinstance(m, HumanMessage)
+            ),
+            "",
+        )
+        designs = sum(
+            tc["name"] == "create_image"
+            for m in history
+            if isinstance(m, AIMessage)
+            for tc in m.tool_calls
+        )
+        if self.finishing:
+            if "talle" in request:
+                args = {
+                    "design_number": max(designs, 1),
+                    "size": "M",
+                    "product_type": "LISO",
+                }
+                return _call("Generar producción.", "execute_production_file", args)
+            return _text("Pedir talle y tipo.", "¿Qué talle y tipo de remera querés?")
+
+        if isinstance(last, ToolMessage):
+            return _text(
+                "Mostrar el diseño.", f"¡Listo! Este es el diseño {designs}. ¿Te gusta?"
+            )
+        if "terminemos" in request or "talle" in request:
+            return _call("El usuario está conforme.", "finalize_design", {})
+        args = {"prompt": f"Remera streetwear: {request}", "image_number": designs + 1}
+        return _call("Generar el diseño.", "create_image", args)
+
+    def _generate(
+        self,
+        messages: list[BaseMessage],
+        stop: list[str] | None = None,
+        run_manager: CallbackManagerForLLMRun | None = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        return ChatResult(generations=[ChatGeneration(message=self.reply(messages))])
+
+    def _stream(
+        self,
+        messages: list[BaseMessage],
+        stop: list[str] | None = None,
+        run_manager: CallbackManagerForLLMRun | None = None,
+        **kwargs: Any,
+    ) -> Iterator[ChatGenerationChunk]:
+        yield from (
+            ChatGenerationChunk(message=c)
+            for c in _chunks(self.reply(messages), messages)
+        )
+
+    async def _astream(
+        self,
+        messages: list[BaseMessage],
+        stop: list[str] | None = None,
+        run_manager: AsyncCallbackManagerForLLMRun | None = None,
+        **kwargs: Any,
+    ) -> AsyncIterator[ChatGenerationChunk]:
+        for chunk in _chunks(self.reply(messages), messages):
+            await asyncio.sleep(self.token_latency)
+            if run_manager and isinstance(chunk.content, str) and chunk.content:
+                await run_manager.on_llm_new_token(chunk.content, chunk=chunk)  # type: ignore chunk type
+            yield ChatGenerationChunk(message=chunk)
+
+
+def _text(plan: str, text: str) -> AIMessage:
+    return AIMessage(content=f"<Plan>{plan}</Plan>\n{text}")
+
+
+def _call(plan: str, name: str, args: dict[str, Any]) -> AIMessage:
+    tool_call = {"name": name, "args": args, "id": f"call_{uuid.uuid4().hex[:12]}"}
+    return AIMessage(content=f"<Plan>{plan}</Plan>", tool_calls=[tool_call])
+
+
+def _chunks(reply: AIMessage, messages: list[BaseMessage]) -> list[AIMessageChunk]:
+    """Split a reply into streamed chunks; the last carries tool calls and usage."""
+    text = str(reply.content)
+    chunks = [
+        AIMessageChunk(content=text[i : i + CHUNK_CHARS])
+        for i in range(0, len(text), CHUNK_CHARS)
+    ]
+    input_tokens = sum(len(str(m.content)) for m in messages) // CHUNK_CHARS
+    output_tokens = len(chunks) + sum(
+        len(json.dumps(tc["args"])) for tc in reply.tool_calls
+    )
+    chunks.append(
+        AIMessageChunk(
+            content="",
+            tool_call_chunks=[
+                {
+                    "name": tc["name"],
+                    "args": json.dumps(tc["args"]),
+                    "id": tc["id"],
+                    "index": i,
+                }
+                for i, tc in enumerate(reply.tool_calls)
+            ],
+            usage_metadata={
+                "input_tokens": input_tokens,
+                "output_tokens": output_tokens,
+                "total_tokens": input_tokens + output_tokens,
+            },
+        )
+    )
+    return chunks
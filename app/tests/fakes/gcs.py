@@ -0,0 +1,221 @@
+"""A minimal local Google Cloud Storage endpoint.
+
+Implements just enough of the JSON API for `google-cloud-storage` pointed at
+it through ``STORAGE_EMULATOR_HOST``: multipart and resumable uploads, object
+metadata and media downloads. Objects are kept in memory.
+"""
+
+from __future__ import annotations
+
+import base64
+import email.parser
+import itertools
+import json
+import re
+import threading
+import time
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import google_crc32c
+
+# Path segments of /upload/storage/v1/b/<bucket>/o and /storage/v1/b/<bucket>/o/<name>.
+_UPLOAD_PATH_PARTS = 6
+_OBJECT_PATH_PARTS = 6
+# Content-Range of a resumable chunk: "bytes <first>-<last>/<total or *>", or
+# "bytes */<total>" to ask how much was received.
+_CONTENT_RANGE = re.compile(r"bytes (?:(\d+)-(\d+)|\*)/(\d+|\*)")
+
+
+def _resource(bucket: str, name: str, data: bytes) -> dict:
+    """Object metadata, with the checksum the client checks resumable uploads against."""
+    crc32c = google_crc32c.Checksum(data).digest()
+    return {
+        "bucket": bucket,
+        "name": name,
+        "size": str(len(data)),
+        "crc32c": base64.b64encode(crc32c).decode(),
+    }
+
+
+class FakeGCSServer:
+    """An in-memory GCS endpoint served from a background thread.
+
+    Args:
+        latency (float): Seconds to wait before answering each upload.
+        fail_next (int): Number of upcoming uploads, or resumable upload
+            chunks, to answer with a 503.
+    """
+
+    def __init__(self, latency: float = 0.0, fail_next: int = 0) -> None:
+        self.latency = latency
+        self.fail_next = fail_next
+        self.objects: dict[tuple[str, str], bytes] = {}
+        self.upload_attempts = 0
+        self.chunk_attempts = 0
+        # Resumable upload sessions: id -> (bucket, object name, bytes received).
+        self._sessions: dict[str, tuple[str, str, bytearray]] = {}
+        self._session_ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        """Base URL to use as ``STORAGE_EMULATOR_HOST``."""
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def __enter__(self) -> FakeGCSServer:
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc: object) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _inject_failure(self) -> bool:
+        """Return whether to fail the current request. Call with the lock held."""
+        if self.fail_next > 0:
+            self.fail_next -= 1
+            return True
+        return False
+
+    def _store_upload(self, bucket: str, content_type: str, body: bytes) -> dict | None:
+        """Record a multipart upload. Returns None when a failure is injected."""
+        time.sleep(self.latency)
+        with self._lock:
+            self.upload_attempts += 1
+            if self._inject_failure():
+                return None
+        message = email.parser.BytesParser().parsebytes(
+            f"Content-Type: {content_type}\r\n\r\n".encode() + body
+        )
+        metadata_part, media_part = message.get_payload()
+        metadata = json.loads(metadata_part.get_payload())
+        data = media_part.get_payload(decode=True)
+        with self._lock:
+            self.objects[(bucket, metadata["name"])] = data
+        return _resource(bucket, metadata["name"], data)
+
+    def _start_session(self, bucket: str, body: bytes) -> str:
+        """Open a resumable upload session and return its id."""
+        with self._lock:
+            self.upload_attempts += 1
+            session_id = str(next(self._session_ids))
+            self._sessions[session_id] = (bucket, json.loads(body)["name"], bytearray())
+        return session_id
+
+    def _store_chunk(
+        self, session_id: str, content_range: str, body: bytes
+    ) -> tuple[int, dict | None]:
+        """Record a resumable upload chunk.
+
+        Returns:
+            tuple[int, dict | None]: The number of bytes received so far and,
+                once the upload is complete, the object resource; ``(-1,
+                None)`` when a failure is injected.
+        """
+        time.sleep(self.latency)
+        first, _, total = _CONTENT_RANGE.fullmatch(content_range).groups()
+        with self._lock:
+            bucket, name, data = self._sessions[session_id]
+            if first is not None:
+                self.chunk_attempts += 1
+                if self._inject_failure():
+                    return -1, None
+                # A chunk sent again after a failure overwrites what it covers.
+                data[int(first) :] = body
+            if total == "*" or len(data) < int(total):
+                return len(data), None
+            del self._sessions[session_id]
+            self.objects[(bucket, name)] = bytes(data)
+        return len(data), _resource(bucket, name, bytes(data))
+
+    def _handler(self) -> type[BaseHTTPRequestHandler]:
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def _reply(self, status: int, body: bytes, content_type: str) -> None:
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _json(self, status: int, payload: dict) -> None:
+                self._reply(status, json.dumps(payload).encode(), "application/json")
+
+            def do_POST(self) -> None:
+                path = urllib.parse.urlparse(self.path).path
+                parts = path.strip("/").split("/")
+                # /upload/storage/v1/b/<bucket>/o
+                if (
+                    parts[:4] != ["upload", "storage", "v1", "b"]
+                    or len(parts) != _UPLOAD_PATH_PARTS
+                ):
+                    self._json(404, {"error": {"code": 404, "message": path}})
+                    return
+                body = self.rfile.read(int(self.headers["Content-Length"]))
+                query = urllib.parse.parse_qs(urllib.parse.urlparse(self.path).query)
+                if query.get("uploadType") == ["resumable"]:
+                    session_id = fake._start_session(parts[4], body)
+                    self.send_response(200)
+                    self.send_header(
+                        "Location",
+                        f"{fake.url}{path}?uploadType=resumable&upload_id={session_id}",
+                    )
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+                resource = fake._store_upload(
+                    parts[4], self.headers["Content-Type"], body
+                )
+                if resource is None:
+                    self._json(
+                        503, {"error": {"code": 503, "message": "injected failure"}}
+                    )
+                else:
+                    self._json(200, resource)
+
+            def do_PUT(self) -> None:
+                url = urllib.parse.urlparse(self.path)
+                [session_id] = urllib.parse.parse_qs(url.query)["upload_id"]
+                body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                received, resource = fake._store_chunk(
+                    session_id, self.headers["Content-Range"], body
+                )
+                if received < 0:
+                    self._json(
+                        503, {"error": {"code": 503, "message": "injected failure"}}
+                    )
+                elif resource is not None:
+                    self._json(200, resource)
+                else:
+                    # 308: resume after the bytes received so far.
+                    self.send_response(308)
+                    if received:
+                        self.send_header("Range", f"bytes=0-{received - 1}")
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+
+            def do_GET(self) -> None:
+                url = urllib.parse.urlparse(self.path)
+                parts = url.path.strip("/").split("/", 5)
+                # /storage/v1/b/<bucket>/o/<name>
+                key = (
+                    (parts[3], urllib.parse.unquote(parts[5]))
+                    if len(parts) == _OBJECT_PATH_PARTS
+                    else None
+                )
+                if key not in fake.objects:
+                    self._json(404, {"error": {"code": 404, "message": url.path}})
+                elif "alt=media" in url.query:
+                    self._reply(200, fake.objects[key], "application/octet-stream")
+                else:
+                    self._json(200, {"bucket": key[0], "name": key[1]})
+
+            def log_message(self, format: str, *args: object) -> None:  # noqa: A002
+                pass
+
+        return Handler
@@ -0,0 +1,97 @@
+"""A minimal local OpenAI images endpoint.
+
+Answers ``POST /v1/images/generations`` with a canned PNG after a fixed
+delay. Point `openai.AsyncOpenAI` at it with ``OPENAI_BASE_URL`` set to
+`FakeImagesServer.url`.
+"""
+
+from __future__ import annotations
+
+import base64
+import io
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+from PIL import Image
+
+DISC_RADIUS_SQ = 0.1  # Squared radius of the disc, as a fraction of the size.
+
+
+def canned_png(size: int = 1024) -> bytes:
+    """A black background with a shaded disc, roughly like a generated design."""
+    y, x = np.mgrid[:size, :size] / size
+    disc = ((x - 0.5) ** 2 + (y - 0.5) ** 2) < DISC_RADIUS_SQ
+    pixels = np.zeros((size, size, 3), dtype=np.uint8)
+    pixels[..., 0] = disc * (255 * x).astype(np.uint8)
+    pixels[..., 1] = disc * (255 * y).astype(np.uint8)
+    pixels[..., 2] = disc * 180
+    buffer = io.BytesIO()
+    Image.fromarray(pixels).save(buffer, "PNG")
+    return buffer.getvalue()
+
+
+class FakeImagesServer:
+    """An images generation endpoint served from a background thread.
+
+    Args:
+        latency (float): Seconds to wait before answering each request.
+        png (bytes | None): The image returned for every prompt; a 1024x1024
+            `canned_png` by default.
+    """
+
+    def __init__(self, latency: float = 0.0, png: bytes | None = None) -> None:
+        self.latency = latency
+        self.prompts: list[str] = []
+        self._b64 = base64.b64encode(png or canned_png()).decode()
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        """Base URL to use as ``OPENAI_BASE_URL``."""
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def __enter__(self) -> FakeImagesServer:
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc: object) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _handler(self) -> type[BaseHTTPRequestHandler]:
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # keep-alive, as the real API
+            disable_nagle_algorithm = True
+
+            def do_POST(self) -> None:
+                request = json.loads(
+                    self.rfile.read(int(self.headers["Content-Length"]))
+                )
+                if self.path != "/v1/images/generations":
+                    status, payload = 404, {"error": {"message": self.path}}
+                else:
+                    time.sleep(fake.latency)
+                    with fake._lock:
+                        fake.prompts.append(request["prompt"])
+                    data = [{"b64_json": fake._b64} for _ in range(request.get("n", 1))]
+                    status, payload = 200, {"created": int(time.time()), "data": data}
+                body = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format: str, *args: object) -> None:  # noqa: A002
+                pass
+
+        return Handler
@@ -0,0 +1,32 @@
+import hashlib
+
+import pytest
+from agent.artifacts import ArtifactStore
+
+
+def test_put_returns_sha256_reference(tmp_path) -> None:
+    store = ArtifactStore(str(tmp_path))
+
+    ref = store.put(b"png-bytes")
+
+    assert ref == "sha256:" + hashlib.sha256(b"png-bytes").hexdigest()
+    assert store.get(ref) == b"png-bytes"
+    assert store.exists(ref)
+
+
+def test_identical_content_is_stored_once(tmp_path) -> None:
+    store = ArtifactStore(str(tmp_path))
+    src = tmp_path / "design-1.png"
+    src.write_bytes(b"same")
+
+    assert store.put(b"same") == store.put_file(str(src))
+    blobs = [p for p in tmp_path.rglob("*") if p.is_file() and p != src]
+    assert len(blobs) == 1
+
+
+@pytest.mark.parametrize(
+    "ref", ["md5:abc", "sha256:../../etc/passwd", "sha256:" + "g" * 64]
+)
+def test_rejects_malformed_references(tmp_path, ref) -> None:
+    with pytest.raises(ValueError):
+        ArtifactStore(str(tmp_path)).path(ref)
@@ -0,0 +1,70 @@
+import operator
+import os
+import time
+from typing import Annotated, TypedDict
+
+import pytest
+from agent.checkpointing import RetainingSqliteSaver
+from langgraph.graph import START, StateGraph
+
+pytestmark = pytest.mark.anyio
+
+
+class CounterState(TypedDict):
+    count: Annotated[int, operator.add]
+
+
+def _counter_graph(saver: RetainingSqliteSaver):
+    builder = StateGraph(CounterState)
+    builder.add_node("step", lambda state: {"count": 1})
+    builder.add_edge(START, "step")
+    return builder.compile(checkpointer=saver)
+
+
+def _checkpoint_count(saver: RetainingSqliteSaver, thread_id: str) -> int:
+    return len(list(saver.list({"configurable": {"thread_id": thread_id}})))
+
+
+async def test_state_survives_reopening_the_database(tmp_path) -> None:
+    path = str(tmp_path / "checkpoints.sqlite")
+    config = {"configurable": {"thread_id": "t1"}}
+    await _counter_graph(RetainingSqliteSaver.from_path(path)).ainvoke(
+        {"count": 1}, config
+    )
+
+    graph = _counter_graph(RetainingSqliteSaver.from_path(path))
+    state = await graph.aget_state(config)
+
+    assert state.values["count"] == 2
+
+
+async def test_keeps_only_last_checkpoints_per_thread(tmp_path) -> None:
+    saver = RetainingSqliteSaver.from_path(str(tmp_path / "c.sqlite"), keep_last=3)
+    graph = _counter_graph(saver)
+    for _ in range(5):
+        await graph.ainvoke({"count": 1}, {"configurable": {"thread_id": "t1"}})
+
+    assert _checkpoint_count(saver, "t1") == 3
+    state = await graph.aget_state({"configurable": {"thread_id": "t1"}})
+    assert state.values["count"] == 10
+
+
+async def test_evicts_idle_threads_and_compacts(tmp_path) -> None:
+    path = str(tmp_path / "data" / "c.sqlite")
+    saver = RetainingSqliteSaver.from_path(path, thread_ttl=60)
+    graph = _counter_graph(saver)
+    for thread_id in ("old", "new"):
+        await graph.ainvoke({"count": 1}, {"configurable": {"thread_id": thread_id}})
+
+    assert saver.evict_expired_threads(now=time.time() + 30) == 0
+    with saver.cursor() as cur:
+        cur.execute("UPDATE thread_activity SET updated_at = 0 WHERE thread_id = 'old'")
+    assert saver.evict_expired_threads() == 1
+    # Compaction does not need the saver's lock, so it never stalls checkpoints.
+    with saver.lock:
+        saver.compact()
+
+    assert os.path.getsize(f"{path}-wal") == 0
+
+    assert _checkpoint_count(saver, "old") == 0
+    assert _checkpoint_count(saver, "new") > 0
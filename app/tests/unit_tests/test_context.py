@@ -0,0 +1,112 @@
+from agent.context import ELIDED_PROMPT, ContextCompactor
+from agent.utils import get_message_text
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage, ToolMessage
+
+
+def count_words(text: str) -> int:
+    return len(text.split())
+
+
+def design_turn(n: int, prompt_words: int = 100) -> list:
+    """A user turn that generates design `n` with a long prompt."""
+    prompt = " ".join(["palabra"] * prompt_words)
+    args = {"prompt": prompt, "image_number": n}
+    return [
+        HumanMessage(content=f"cambio {n}", id=f"h{n}"),
+        AIMessage(
+            content="",
+            id=f"a{n}",
+            tool_calls=[{"name": "create_image", "args": args, "id": f"c{n}"}],
+        ),
+        ToolMessage(
+            content=" ".join(["ruta"] * 60),
+            name="create_image",
+            tool_call_id=f"c{n}",
+            id=f"t{n}",
+        ),
+        AIMessage(content=f"Listo el diseño {n}", id=f"r{n}"),
+    ]
+
+
+def test_history_under_budget_is_unchanged() -> None:
+    messages = design_turn(1)
+    compactor = ContextCompactor(budget=10_000, keep_recent=4, count_text=count_words)
+
+    assert compactor.compact(messages) == messages
+
+
+def test_old_tool_outputs_and_prompts_are_elided_first() -> None:
+    messages = [*design_turn(1), *design_turn(2), *design_turn(3)]
+    compactor = ContextCompactor(budget=420, keep_recent=4, count_text=count_words)
+
+    compacted = compactor.compact(messages)
+
+    assert len(compacted) == len(messages)
+    assert compacted[2].content == "[Resultado anterior de create_image omitido]"
+    assert compacted[1].tool_calls[0]["args"] == {
+        "prompt": ELIDED_PROMPT,
+        "image_number": 1,
+    }
+    # The latest prompt and the recent turn are kept in full.
+    assert compacted[9] == messages[9]
+    assert compacted[8:] == messages[8:]
+    assert messages[2].content.startswith("ruta")
+
+
+def test_oldest_turns_are_dropped_with_a_note() -> None:
+    messages = [*design_turn(1), *design_turn(2), *design_turn(3), *design_turn(4)]
+    compactor = ContextCompactor(budget=250, keep_recent=4, count_text=count_words)
+
+    compacted = compactor.compact(messages)
+
+    assert not any(isinstance(m, SystemMessage) for m in compacted)
+    assert compacted[0].id == messages[8].id
+    assert compacted[0].content.startswith("[Se omitieron 8 mensajes")
+    assert "Diseños ya generados: 1, 2.]" in compacted[0].content
+    assert compacted[0].content.endswith("\n\ncambio 3")
+    assert len(compacted) == len(messages) - 8
+    assert compacted[-4:] == messages[-4:]
+    fresh = ContextCompactor(budget=250, keep_recent=4, count_text=count_words)
+    assert sum(fresh.count(m) for m in compacted) <= 250
+
+
+def test_messages_are_tokenized_once() -> None:
+    calls = []
+
+    def counting(text: str) -> int:
+        calls.append(text)
+        return count_words(text)
+
+    compactor = ContextCompactor(budget=10_000, keep_recent=4, count_text=counting)
+    messages = design_turn(1)
+    compactor.compact(messages)
+    compactor.compact([*messages, *design_turn(2)])
+
+    assert len(calls) == 8
+
+
+def chat_turn(n: int) -> list:
+    """A user turn answered without tools."""
+    return [
+        HumanMessage(content=" ".join(["hola"] * 80), id=f"h{n}"),
+        AIMessage(content=" ".join(["claro"] * 80), id=f"r{n}"),
+    ]
+
+
+def test_turn_with_the_latest_prompt_is_never_dropped() -> None:
+    messages = [
+        *chat_turn(1),
+        *chat_turn(2),
+        *design_turn(3),
+        *chat_turn(4),
+        *chat_turn(5),
+    ]
+    compactor = ContextCompactor(budget=100, keep_recent=2, count_text=count_words)
+
+    compacted = compactor.compact(messages)
+
+    assert compacted[0].id == "h3"
+    assert "Diseños ya generados" not in get_message_text(compacted[0])
+    assert compacted[1] == messages[5]
+    assert compacted[2].tool_call_id == "c3"
+    assert compacted[3:] == messages[7:]
@@ -0,0 +1,75 @@
+import io
+from urllib.parse import quote
+
+import pytest
+from agent import graph as graph_module
+from agent import jobs, storage
+from agent.configuration import Configuration
+from agent.streaming import turn_events
+from PIL import Image
+from tests.fakes.chat import ScriptedChatModel
+from tests.fakes.gcs import FakeGCSServer
+from tests.fakes.images import FakeImagesServer, canned_png
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+async def offline_services(monkeypatch, tmp_path):
+    monkeypatch.chdir(tmp_path)
+    models = {
+        finishing: ScriptedChatModel(finishing=finishing) for finishing in (False, True)
+    }
+    monkeypatch.setattr(
+        graph_module,
+        "get_chat_model",
+        lambda name, tools: models[all(t.name != "create_image" for t in tools)],
+    )
+    with FakeImagesServer(png=canned_png(64)) as images, FakeGCSServer() as gcs:
+        monkeypatch.setenv("OPENAI_API_KEY", "sk-test")
+        monkeypatch.setenv("OPENAI_BASE_URL", images.url)
+        monkeypatch.setenv("STORAGE_EMULATOR_HOST", gcs.url)
+        monkeypatch.setenv("GCP_BUCKET_NAME", "ownit-test")
+        storage.get_gcs_bucket.cache_clear()
+        yield images, gcs
+        await jobs.stop_production_workers()
+    storage.get_gcs_bucket.cache_clear()
+
+
+async def test_design_to_production_conversation(offline_services) -> None:
+    images, gcs = offline_services
+    config = {"configurable": {"thread_id": "offline-1", "cpu_pool_size": 0}}
+    turns = ["Quiero una remera con un gato", "Me encanta, terminemos", "Talle M, LISO"]
+
+    events = []
+    for message in turns:
+        input_state = {"messages": [("user", message)], "email": "a@b.c"}
+        events.append(
+            [e async for e in turn_events(graph_module.graph, input_state, config)]
+        )
+
+    assert ("tools", ["create_image"]) in events[0]
+    assert images.prompts == ["Remera streetwear: quiero una remera con un gato"]
+    # The turn only queues the production file; a worker makes it.
+    queue = jobs.get_production_queue(Configuration())
+    [job] = queue.jobs_for_thread("offline-1")
+    state = (await graph_module.graph.aget_state(config)).values
+    assert (
+        state["messages"][-1].content
+        == f"Production job {job.id} queued for {job.order.output_name}."
+    )
+
+    job = await jobs.wait_for_job(queue, job.id, timeout=10)
+    assert job.status == jobs.DONE
+    print_blob = f"a@b.c/{job.order.output_name}"
+    assert job.order.output_name.startswith("design-1-talle-m-liso-")
+    assert job.result_url.endswith(f"/ownit-test/{quote(print_blob)}")
+    assert set(gcs.objects) == {
+        ("ownit-test", "a@b.c/design-1.png"),
+        ("ownit-test", print_blob),
+    }
+    # Rendered at print resolution: 27 cm at 300 DPI.
+    print_png = gcs.objects[("ownit-test", print_blob)]
+    with Image.open(io.BytesIO(print_png)) as print_file:
+        assert print_file.size == (3189, 3189)
+        assert round(print_file.info["dpi"][0]) == 300
@@ -0,0 +1,49 @@
+import asyncio
+import math
+import threading
+import time
+
+import pytest
+from agent import executors
+from agent.configuration import Configuration
+from agent.executors import run_cpu, run_io, shutdown_executors
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_run_io_does_not_block_event_loop() -> None:
+    start = time.perf_counter()
+    await asyncio.gather(*(run_io(time.sleep, 0.2) for _ in range(4)))
+    assert time.perf_counter() - start < 0.6
+
+
+async def test_run_io_uses_worker_thread() -> None:
+    thread_name = await run_io(lambda: threading.current_thread().name)
+    assert thread_name.startswith("ownit-io")
+
+
+async def test_run_cpu_returns_result() -> None:
+    try:
+        assert await run_cpu(math.factorial, 10) == 3628800
+    finally:
+        shutdown_executors()
+
+
+async def test_warm_cpu_pool_runs_the_enabled_initializers(monkeypatch) -> None:
+    calls = []
+    monkeypatch.setattr(executors, "_cpu_initializers", [])
+    executors.register_cpu_initializer(lambda: calls.append("on"))
+    executors.register_cpu_initializer(
+        lambda: calls.append("off"), lambda c: c.render_mockups
+    )
+    configuration = Configuration(cpu_pool_size=0, render_mockups=False)
+    monkeypatch.setattr(
+        Configuration, "from_context", classmethod(lambda cls: configuration)
+    )
+
+    try:
+        await executors.warm_cpu_pool()
+    finally:
+        shutdown_executors()
+
+    assert calls == ["on"]
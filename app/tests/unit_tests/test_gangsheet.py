@@ -0,0 +1,140 @@
+import itertools
+import json
+
+import numpy as np
+import pytest
+from agent import gangsheet, storage
+from agent.configuration import Configuration
+from agent.gangsheet import PackedSheet, Placement, compose_sheet, pack_sheets
+from agent.jobs import DONE, ProductionOrder, get_production_queue
+from agent.printing import PngStreamWriter
+from PIL import Image
+from tests.fakes.gcs import FakeGCSServer
+
+pytestmark = pytest.mark.anyio
+
+
+def test_packing_keeps_spacing_and_bounds() -> None:
+    rng = np.random.default_rng(0)
+    sizes = [tuple(int(v) for v in rng.integers(20, 120, size=2)) for _ in range(60)]
+    sizes.append((400, 30))  # Only fits turned.
+    sizes.append((600, 600))  # Fits nowhere.
+
+    sheets, oversized = pack_sheets(sizes, sheet_width=300, max_length=500, spacing=5)
+
+    assert oversized == [len(sizes) - 1]
+    assert len(sheets) > 1
+    placed = [p for sheet in sheets for p in sheet.placements]
+    assert sorted(p.index for p in placed) == list(range(len(sizes) - 1))
+    for sheet in sheets:
+        assert sheet.length <= 500
+        assert 0 < sheet.utilization < 1
+        for p in sheet.placements:
+            width, height = sizes[p.index]
+            assert (p.width, p.height) == (
+                (height, width) if p.rotated else (width, height)
+            )
+            assert p.x >= 5 and p.y >= 5
+            assert p.x + p.width <= 300 - 5 and p.y + p.height <= sheet.length - 5
+        for a, b in itertools.combinations(sheet.placements, 2):
+            apart_x = a.x + a.width + 5 <= b.x or b.x + b.width + 5 <= a.x
+            apart_y = a.y + a.height + 5 <= b.y or b.y + b.height + 5 <= a.y
+            assert apart_x or apart_y
+    assert next(p for p in placed if p.index == len(sizes) - 2).rotated
+
+
+def test_rotation_can_be_forbidden() -> None:
+    sheets, oversized = pack_sheets(
+        [(400, 30)], 300, 500, spacing=5, allow_rotation=False
+    )
+
+    assert sheets == [] and oversized == [0]
+
+
+def test_sheet_is_composited_strip_by_strip(tmp_path) -> None:
+    item = np.zeros((30, 20, 4), dtype=np.uint8)
+    item[..., 0] = np.arange(20, dtype=np.uint8)
+    item[..., 1] = np.arange(30, dtype=np.uint8)[:, None]
+    item[..., 3] = 255
+    with open(tmp_path / "streamed.png", "wb") as f:
+        writer = PngStreamWriter(f, 20, 30)
+        writer.write_rows(item)
+        writer.close()
+    # Pillow picks its own filters, which are decoded whole instead.
+    Image.fromarray(item).save(tmp_path / "pillow.png")
+    placements = [
+        Placement(0, 5, 5, 20, 30, False),
+        Placement(1, 30, 20, 30, 20, True),
+        Placement(2, 65, 3, 20, 30, False),
+    ]
+    files = [
+        str(tmp_path / name) for name in ("streamed.png", "pillow.png", "pillow.png")
+    ]
+
+    compose_sheet(
+        str(tmp_path / "sheet.png"),
+        PackedSheet(90, 60, placements),
+        files,
+        dpi=300,
+        strip_rows=7,
+    )
+
+    with Image.open(tmp_path / "sheet.png") as sheet:
+        pixels = np.asarray(sheet)
+    assert pixels.shape == (60, 90, 4)
+    assert np.array_equal(pixels[5:35, 5:25], item)
+    assert np.array_equal(pixels[20:40, 30:60], np.rot90(item))
+    assert np.array_equal(pixels[3:33, 65:85], item)
+    assert pixels[..., 3].sum() == 3 * 30 * 20 * 255
+
+
+@pytest.fixture
+def fake_gcs(monkeypatch, tmp_path):
+    monkeypatch.chdir(tmp_path)
+    with FakeGCSServer() as server:
+        monkeypatch.setenv("STORAGE_EMULATOR_HOST", server.url)
+        monkeypatch.setenv("GCP_BUCKET_NAME", "ownit-test")
+        storage.get_gcs_bucket.cache_clear()
+        yield server
+    storage.get_gcs_bucket.cache_clear()
+
+
+def finish_job(queue, email: str, size: str, pixels: int) -> str:
+    order = ProductionOrder(
+        email, 1, None, size, "liso", "sha256:abc", 30, 0, None, 24.0, 10
+    )
+    job, _ = queue.enqueue(order)
+    claimed = queue.claim()
+    # Files are read from where the job recorded them, not from their name.
+    path = f"images/{email}/{claimed.id}.png"
+    if pixels:
+        Image.new("RGBA", (pixels, pixels), (200, 0, 0, 255)).save(path)
+    queue.complete(claimed, f"https://storage.example/{order.output_name}", path)
+    return job.id
+
+
+async def test_pending_files_are_ganged_once(fake_gcs, tmp_path) -> None:
+    configuration = Configuration(
+        print_dpi=10,
+        gang_sheet_width_cm=25.4,
+        gang_sheet_spacing_cm=0.254,
+        cpu_pool_size=0,
+    )
+    queue = get_production_queue(configuration)
+    (tmp_path / "images/a@b.c").mkdir(parents=True)
+    ganged = [finish_job(queue, "a@b.c", size, 40) for size in ("s", "m", "l")]
+    missing = finish_job(queue, "a@b.c", "xl", 0)
+
+    [sheet] = await gangsheet.compose_gang_sheets(configuration)
+
+    assert sorted(sheet.job_ids) == sorted(ganged)
+    assert (sheet.width, sheet.dpi) == (100, 10)
+    assert sheet.url.endswith(f"/ownit-test/gang-sheets/{sheet.name}.png")
+    manifest = json.loads(
+        fake_gcs.objects[("ownit-test", f"gang-sheets/{sheet.name}.json")]
+    )
+    assert {item["job_id"] for item in manifest["items"]} == set(ganged)
+    assert all(queue.get(job_id).gang_sheet == sheet.name for job_id in ganged)
+    assert queue.get(missing).status == DONE and queue.get(missing).gang_sheet is None
+    # Nothing new to gang.
+    assert await gangsheet.compose_gang_sheets(configuration) == []
@@ -0,0 +1,53 @@
+import os
+import time
+
+from agent.generation_cache import GenerationCache, normalize_prompt
+
+PARAMS = {
+    "model": "dall-e-3",
+    "size": "1024x1024",
+    "style": "vivid",
+    "quality": "standard",
+}
+
+
+def test_key_ignores_whitespace_but_not_parameters() -> None:
+    key = GenerationCache.key("Un gato  con\n   gafas", **PARAMS)
+
+    assert normalize_prompt("  Un gato  con\n   gafas ") == "Un gato con gafas"
+    assert key == GenerationCache.key("Un gato con gafas", **PARAMS)
+    assert key != GenerationCache.key(
+        "Un gato con gafas", **{**PARAMS, "quality": "hd"}
+    )
+    assert key != GenerationCache.key("Un gato con gafas", variant=2, **PARAMS)
+    assert key != GenerationCache.key("UN GATO CON GAFAS", **PARAMS)
+
+
+def test_hits_misses_and_ttl(tmp_path) -> None:
+    cache = GenerationCache(str(tmp_path), ttl=60, max_bytes=1024)
+    key = GenerationCache.key("p", **PARAMS)
+
+    assert cache.get(key) is None
+    cache.put(key, b"png")
+    assert cache.get(key) == b"png"
+
+    # Backdate the generation time past the TTL.
+    path = cache._path(key)
+    os.utime(path, (time.time(), time.time() - 61))
+    assert cache.get(key) is None
+    assert not os.path.exists(path)
+    assert cache.stats() == {"hits": 1, "misses": 2, "hit_ratio": 1 / 3}
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path) -> None:
+    cache = GenerationCache(str(tmp_path), ttl=60, max_bytes=350)
+    keys = [GenerationCache.key(p, **PARAMS) for p in ("a", "b", "c")]
+    for age, key in zip((30, 20, 10), keys, strict=True):
+        cache.put(key, b"x" * 100)
+        os.utime(cache._path(key), (time.time() - age, time.time() - age))
+    # "a" is the oldest but was just used, so "b" goes first.
+    assert cache.get(keys[0]) is not None
+
+    cache.put(GenerationCache.key("d", **PARAMS), b"x" * 100)
+
+    assert [cache.get(k) is not None for k in keys] == [True, False, True]
@@ -0,0 +1,64 @@
+import numpy as np
+from agent.imaging import key_black_to_transparent
+from agent.tools import convert_black_to_transparent
+from PIL import Image
+
+
+def _reference_key(img: Image.Image, threshold: int = 30) -> Image.Image:
+    """The original per-pixel implementation, kept as the parity oracle."""
+    img = img.convert("RGBA")
+    new_pixel_data = []
+    for r, g, b, a in img.getdata():
+        if (r + g + b) / 3 < threshold:
+            new_pixel_data.append((r, g, b, 0))
+        else:
+            new_pixel_data.append((r, g, b, a))
+    img.putdata(new_pixel_data)
+    return img
+
+
+def _random_image(size: int = 64, seed: int = 0) -> Image.Image:
+    rng = np.random.default_rng(seed)
+    pixels = rng.integers(0, 256, size=(size, size, 4), dtype=np.uint8)
+    # Bias a quarter of the pixels towards the threshold boundary.
+    pixels[: size // 2, : size // 2, :3] = rng.integers(
+        25, 35, size=(size // 2, size // 2, 3)
+    )
+    return Image.fromarray(pixels)
+
+
+def test_key_matches_reference_implementation() -> None:
+    img = _random_image()
+    for threshold in (0, 30, 31, 128):
+        expected = np.asarray(_reference_key(img, threshold))
+        actual = np.asarray(key_black_to_transparent(img, threshold=threshold))
+        assert np.array_equal(expected, actual)
+
+
+def test_key_accepts_rgb_input() -> None:
+    img = _random_image().convert("RGB")
+    expected = np.asarray(_reference_key(img))
+    actual = np.asarray(key_black_to_transparent(img))
+    assert np.array_equal(expected, actual)
+
+
+def test_feather_ramps_alpha_above_threshold() -> None:
+    levels = np.array([[0, 30, 35, 40, 200]], dtype=np.uint8)
+    rgb = np.repeat(levels[..., None], 3, axis=2)
+    img = Image.fromarray(rgb).convert("RGBA")
+
+    alpha = np.asarray(key_black_to_transparent(img, threshold=30, feather=10))[0, :, 3]
+
+    assert alpha.tolist() == [0, 0, 127, 255, 255]
+
+
+def test_convert_black_to_transparent_writes_png(tmp_path) -> None:
+    src = tmp_path / "design-1.png"
+    _random_image().save(src)
+    out = tmp_path / "out" / "talle-m-liso.png"
+
+    result = convert_black_to_transparent(str(src), str(out))
+
+    assert result == str(out)
+    with Image.open(out) as keyed, Image.open(src) as original:
+        assert np.array_equal(np.asarray(keyed), np.asarray(_reference_key(original)))
@@ -0,0 +1,99 @@
+import asyncio
+
+import pytest
+from agent import instrumentation
+from agent.executors import run_io
+from agent.instrumentation import REGISTRY
+
+
+@pytest.fixture
+def instrumented():
+    REGISTRY.reset()
+    instrumentation.enable()
+    yield REGISTRY
+    instrumentation.enable(False)
+    REGISTRY.reset()
+
+
+def test_disabled_records_nothing() -> None:
+    REGISTRY.reset()
+
+    async def node(state):
+        return {"state": state}
+
+    wrapped = instrumentation.instrument_node("call_model", node)
+    assert asyncio.run(wrapped(1)) == {"state": 1}
+    instrumentation.record_tokens(
+        "call_model", {"input_tokens": 10, "output_tokens": 2}
+    )
+    with instrumentation.turn_trace("t") as trace:
+        assert trace is None
+
+    assert REGISTRY.render() == "\n"
+
+
+def test_node_spans_tokens_and_errors_are_recorded(instrumented) -> None:
+    async def call_model(state):
+        instrumentation.record_tokens(
+            "call_model",
+            {
+                "input_tokens": 120,
+                "output_tokens": 30,
+                "input_token_details": {"cache_read": 64},
+            },
+        )
+        await run_io(len, b"abc")
+        return {}
+
+    async def tools(state):
+        with instrumentation.span("tool", "create_image") as attributes:
+            attributes["error"] = "boom"
+        raise RuntimeError("node failed")
+
+    async def turn():
+        with instrumentation.turn_trace("thread-1") as trace:
+            await instrumentation.instrument_node("call_model", call_model)(None)
+            with pytest.raises(RuntimeError):
+                await instrumentation.instrument_node("tools", tools)(None)
+        return trace
+
+    trace = asyncio.run(turn())
+
+    assert (
+        instrumented.value("ownit_llm_tokens_total", node="call_model", direction="in")
+        == 120
+    )
+    assert (
+        instrumented.value(
+            "ownit_llm_tokens_total", node="call_model", direction="cached"
+        )
+        == 64
+    )
+    assert instrumented.value("ownit_node_duration_seconds", node="call_model") == 1
+    assert instrumented.value("ownit_node_errors_total", node="tools") == 1
+    assert instrumented.value("ownit_tool_errors_total", tool="create_image") == 1
+    assert instrumented.value("ownit_executor_queue_seconds", pool="io") == 1
+
+    spans = {s["name"]: s for s in trace.to_dict()["spans"]}
+    assert set(spans) == {
+        "tokens:call_model",
+        "node:call_model",
+        "tool:create_image",
+        "node:tools",
+    }
+    assert spans["tool:create_image"]["error"] == "boom"
+    assert spans["node:tools"]["error"] == "RuntimeError('node failed')"
+    assert instrumentation.recent_traces()[-1]["thread_id"] == "thread-1"
+
+
+def test_prometheus_text_format(instrumented) -> None:
+    instrumented.inc("ownit_upload_bytes_total", 2048)
+    instrumented.observe("ownit_node_duration_seconds", 0.3, node='say "hi"')
+
+    text = instrumented.render()
+
+    assert "# TYPE ownit_upload_bytes_total counter" in text
+    assert "ownit_upload_bytes_total 2048" in text
+    assert 'ownit_node_duration_seconds_bucket{node="say \\"hi\\"",le="0.25"} 0' in text
+    assert 'ownit_node_duration_seconds_bucket{node="say \\"hi\\"",le="0.5"} 1' in text
+    assert 'ownit_node_duration_seconds_count{node="say \\"hi\\""} 1' in text
@@ -0,0 +1,263 @@
+import asyncio
+import sqlite3
+import time
+
+import pytest
+from agent import jobs
+from agent.artifacts import get_artifact_store
+from agent.configuration import Configuration
+from agent.jobs import DONE, FAILED, QUEUED, RUNNING, ProductionOrder, ProductionQueue
+from PIL import Image
+from tests.fakes.images import canned_png
+
+pytestmark = pytest.mark.anyio
+
+
+def make_order(size: str = "M", **overrides) -> ProductionOrder:
+    order = {
+        "email": "a@b.c",
+        "design_number": 1,
+        "variant": None,
+        "size": size,
+        "product_type": "LISO",
+        "source_ref": "sha256:abc",
+        "keying_threshold": 10.0,
+        "keying_feather": 1.0,
+        "thread_id": "t1",
+    }
+    return ProductionOrder(**{**order, **overrides})
+
+
+def test_repeated_orders_resolve_to_one_job(tmp_path) -> None:
+    queue = ProductionQueue(str(tmp_path / "jobs.sqlite"))
+
+    job, queued = queue.enqueue(make_order())
+    again, queued_again = queue.enqueue(make_order(design_number=2))  # Same source.
+    other, _ = queue.enqueue(make_order(size="L"))
+
+    assert queued and not queued_again
+    assert again.id == job.id
+    assert other.id != job.id
+    assert [j.id for j in queue.jobs_for_thread("t1")] == [job.id, other.id]
+    assert queue.counts() == {QUEUED: 2}
+
+
+def test_each_thread_sees_its_own_order(tmp_path) -> None:
+    queue = ProductionQueue(str(tmp_path / "jobs.sqlite"))
+
+    first, _ = queue.enqueue(make_order())
+    second, queued = queue.enqueue(make_order(thread_id="t2"))
+
+    assert queued and second.id != first.id
+    assert second.order.output_name != first.order.output_name
+    assert [j.id for j in queue.jobs_for_thread("t2")] == [second.id]
+
+
+def test_failures_retry_with_backoff_then_fail(tmp_path) -> None:
+    queue = ProductionQueue(str(tmp_path / "jobs.sqlite"), retry_backoff=0.0)
+    job, _ = queue.enqueue(make_order(), max_attempts=2)
+
+    first = queue.claim()
+    assert first is not None and first.attempts == 1 and first.status == RUNNING
+    assert queue.claim() is None
+    assert queue.fail(first, "boom").status == QUEUED
+
+    second = queue.claim()
+    assert second is not None and second.attempts == 2
+    failed = queue.fail(second, "boom again")
+    assert failed.status == FAILED and failed.error == "boom again"
+
+    # Ordering again after a final failure starts over.
+    requeued, queued = queue.enqueue(make_order(), max_attempts=2)
+    assert queued and requeued.id == job.id and requeued.attempts == 0
+
+
+def test_backoff_delays_the_retry(tmp_path) -> None:
+    queue = ProductionQueue(str(tmp_path / "jobs.sqlite"), retry_backoff=60.0)
+    queue.enqueue(make_order())
+
+    failed = queue.fail(queue.claim(), "boom")
+
+    assert failed.next_run_at - time.time() > 50
+    assert queue.claim() is None
+
+
+def test_expired_lease_is_claimed_again(tmp_path) -> None:
+    path = str(tmp_path / "jobs.sqlite")
+    queue = ProductionQueue(path, lease_seconds=0.0)
+    queue.enqueue(make_order())
+    lost = queue.claim()
+    time.sleep(0.01)
+
+    # Another process takes the job over; the first worker's result is ignored.
+    taken = ProductionQueue(path).claim()
+    assert taken is not None and taken.id == lost.id and taken.attempts == 2
+    assert not queue.complete(lost, "https://late.example")
+    assert queue.complete(taken, "https://storage.example/a")
+    assert queue.get(lost.id).result_url == "https://storage.example/a"
+
+
+async def test_workers_make_queued_jobs(monkeypatch, tmp_path) -> None:
+    made = []
+
+    async def fake_produce(job, configuration):
+        await asyncio.sleep(0.01)
+        if job.attempts == 1 and job.order.size == "L":
+            raise RuntimeError("upload failed")
+        made.append(job.order.size)
+        return (
+            f"https://storage.example/{job.order.output_name}",
+            f"images/{job.order.output_name}",
+        )
+
+    monkeypatch.setattr(jobs, "produce", fake_produce)
+    configuration = Configuration(
+        production_queue_path=str(tmp_path / "jobs.sqlite"),
+        production_workers=2,
+        production_retry_backoff=0.0,
+    )
+    workers = await jobs.ensure_production_workers(configuration)
+    try:
+        assert await jobs.ensure_production_workers(configuration) is workers
+        ids = [workers.queue.enqueue(make_order(size=size))[0].id for size in "SML"]
+        workers.notify()
+        done = [
+            await jobs.wait_for_job(workers.queue, job_id, timeout=5) for job_id in ids
+        ]
+    finally:
+        await jobs.stop_production_workers()
+
+    assert [job.status for job in done] == [DONE] * 3
+    assert done[2].attempts == 2
+    assert done[2].result_url == (
+        f"https://storage.example/{done[2].order.output_name}"
+    )
+    assert done[2].result_path == f"images/{done[2].order.output_name}"
+    assert "result_path" not in done[2].to_dict()
+    assert sorted(made) == ["L", "M", "S"]
+
+
+async def test_workers_survive_a_failure_to_record_a_job(monkeypatch, tmp_path) -> None:
+    async def fake_produce(job, configuration):
+        return f"https://storage.example/{job.id}", None
+
+    monkeypatch.setattr(jobs, "produce", fake_produce)
+    queue = ProductionQueue(str(tmp_path / "jobs.sqlite"), lease_seconds=0.0)
+    complete = queue.complete
+    failures = []
+
+    def flaky_complete(job, *args):
+        if not failures:
+            failures.append(job.id)
+            raise sqlite3.OperationalError("database is locked")
+        return complete(job, *args)
+
+    monkeypatch.setattr(queue, "complete", flaky_complete)
+    workers = jobs.ProductionWorkers(
+        queue, Configuration(), concurrency=1, poll_interval=0.01
+    )
+    job, _ = queue.enqueue(make_order())
+    workers.start()
+    try:
+        done = await jobs.wait_for_job(queue, job.id, timeout=5)
+    finally:
+        await workers.stop()
+
+    assert failures == [job.id]
+    assert done.status == DONE and done.attempts == 2
+
+
+async def test_designs_of_one_size_and_type_get_their_own_files(
+    monkeypatch, tmp_path
+) -> None:
+    monkeypatch.chdir(tmp_path)
+    uploads = {}
+
+    async def fake_key_design(source, threshold, feather):
+        return b"keyed:" + source
+
+    async def fake_upload(data, blob_name):
+        uploads[blob_name] = data
+        return f"https://storage.example/{blob_name}"
+
+    monkeypatch.setattr(jobs, "key_design", fake_key_design)
+    monkeypatch.setattr(jobs, "aupload_bytes", fake_upload)
+    configuration = Configuration(
+        production_queue_path=str(tmp_path / "jobs.sqlite"), prekey_cache_size=0
+    )
+    store = get_artifact_store(configuration.artifact_store_dir)
+    queue = ProductionQueue(configuration.production_queue_path)
+    orders = [
+        make_order(design_number=1, source_ref=store.put(b"one")),
+        make_order(design_number=2, variant=1, source_ref=store.put(b"two")),
+        # Design numbers restart in every thread of an email.
+        make_order(design_number=1, source_ref=store.put(b"three"), thread_id="t2"),
+    ]
+    for order in orders:
+        queue.enqueue(order)
+
+    results = [await jobs.produce(queue.claim(), configuration) for _ in orders]
+
+    assert len({url for url, _ in results}) == len({p for _, p in results}) == 3
+    for order, source in zip(orders, [b"one", b"two", b"three"], strict=True):
+        assert uploads[f"a@b.c/{order.output_name}"] == b"keyed:" + source
+        local = tmp_path / "images" / "a@b.c" / order.output_name
+        assert local.read_bytes() == b"keyed:" + source
+    assert orders[1].output_name.startswith("design-2-1-talle-M-LISO-")
+
+
+async def test_talles_of_one_design_share_one_render(monkeypatch, tmp_path) -> None:
+    monkeypatch.chdir(tmp_path)
+    renders = []
+
+    async def fake_key_design(source, threshold, feather):
+        return source
+
+    async def inline_run_cpu(func, *args):
+        renders.append([width for _, width in args[1]])
+        return func(*args)
+
+    async def fake_upload(path, blob_name):
+        return f"https://storage.example/{blob_name}"
+
+    monkeypatch.setattr(jobs, "key_design", fake_key_design)
+    monkeypatch.setattr(jobs, "run_cpu", inline_run_cpu)
+    monkeypatch.setattr(jobs, "aupload_file", fake_upload)
+    configuration = Configuration(
+        production_queue_path=str(tmp_path / "jobs.sqlite"), prekey_cache_size=0
+    )
+    source_ref = get_artifact_store(configuration.artifact_store_dir).put(canned_png(8))
+    queue = ProductionQueue(configuration.production_queue_path)
+    orders = [
+        make_order(size=size, source_ref=source_ref, print_width_cm=cm, print_dpi=10)
+        for size, cm in [("M", 27.0), ("L", 30.0)]
+    ]
+    for order in orders:
+        queue.enqueue(order)
+
+    results = await asyncio.gather(
+        *(jobs.produce(queue.claim(), configuration) for _ in orders)
+    )
+
+    # One render of every talle: 24, 27, 30 and 33 cm at 10 DPI.
+    assert renders == [[94, 106, 118, 130]]
+    for (_, path), width in zip(results, [106, 118], strict=True):
+        with Image.open(tmp_path / path) as img:
+            assert img.width == width
+
+
+def test_older_database_gains_print_columns(tmp_path) -> None:
+    path = str(tmp_path / "jobs.sqlite")
+    old_schema = jobs._SCHEMA.replace(
+        "print_width_cm REAL NOT NULL DEFAULT 0,\n    print_dpi INTEGER NOT NULL DEFAULT 0,\n",
+        "",
+    )
+    assert "print_dpi" not in old_schema
+    with sqlite3.connect(path) as conn:
+        conn.executescript(old_schema)
+
+    job, _ = ProductionQueue(path).enqueue(
+        make_order(print_width_cm=27.0, print_dpi=300)
+    )
+
+    assert (job.order.print_width_cm, job.order.print_dpi) == (27.0, 300)
@@ -0,0 +1,196 @@
+import asyncio
+import contextlib
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+from agent import graph as graph_module
+from agent import instrumentation
+from agent.artifacts import ArtifactStore
+from agent.configuration import Configuration
+from agent.jobs import ProductionOrder, get_production_queue
+from fastapi.testclient import TestClient
+from langchain_core.language_models import GenericFakeChatModel
+from langchain_core.messages import AIMessage
+from src import main
+
+
+@pytest.fixture
+def client(monkeypatch):
+    model = GenericFakeChatModel(
+        messages=iter(
+            [AIMessage(content="<Plan>Greet.</Plan>Hola, ¿qué diseñamos?")] * 2
+        )
+    )
+    monkeypatch.setattr(graph_module, "get_chat_model", lambda name, tools: model)
+    monkeypatch.setattr(main, "limiter", main.TurnLimiter(limit=2))
+    return TestClient(main.app)
+
+
+def parse_sse(body: str) -> list[tuple[str, dict]]:
+    events = []
+    for block in body.strip().split("\n\n"):
+        event, data = block.split("\n")
+        events.append(
+            (event.removeprefix("event: "), json.loads(data.removeprefix("data: ")))
+        )
+    return events
+
+
+def test_turn_streams_tokens_then_state(client) -> None:
+    thread_id = client.post("/threads").json()["thread_id"]
+
+    response = client.post(f"/threads/{thread_id}/turns", json={"message": "hola"})
+
+    assert response.headers["content-type"].startswith("text/event-stream")
+    events = parse_sse(response.text)
+    tokens = [data["text"] for event, data in events if event == "token"]
+    assert len(tokens) > 1
+    assert "".join(tokens) == "Hola, ¿qué diseñamos?"
+    event, state = events[-1]
+    assert event == "state"
+    assert [m["type"] for m in state["messages"]] == ["human", "ai"]
+    assert client.get(f"/threads/{thread_id}").json() == state
+    assert main.limiter.active_threads == set()
+
+
+def test_later_turn_keeps_the_thread_email(client) -> None:
+    thread_id = client.post("/threads").json()["thread_id"]
+
+    client.post(
+        f"/threads/{thread_id}/turns", json={"message": "hola", "email": "a@b.c"}
+    )
+    client.post(f"/threads/{thread_id}/turns", json={"message": "sigo"})
+
+    snapshot = asyncio.run(graph_module.graph.aget_state(main.thread_config(thread_id)))
+    assert snapshot.values["email"] == "a@b.c"
+
+
+def test_saturated_worker_answers_429(client) -> None:
+    main.limiter.active_threads.update({"busy-1", "busy-2"})
+
+    response = client.post("/threads/other/turns", json={"message": "hola"})
+
+    assert response.status_code == 429
+    assert response.headers["retry-after"] == str(main.RETRY_AFTER_SECONDS)
+
+
+def test_one_turn_per_thread(client) -> None:
+    main.limiter.active_threads.add("busy")
+
+    assert (
+        client.post("/threads/busy/turns", json={"message": "hola"}).status_code == 409
+    )
+
+
+def test_late_release_keeps_the_next_turn_of_the_thread() -> None:
+    limiter = main.TurnLimiter(limit=2)
+    first = limiter.acquire("t")
+    limiter.release("t", first)  # The turn's body ends.
+    second = limiter.acquire("t")
+
+    limiter.release("t", first)  # The first response closes afterwards.
+
+    assert limiter.active_threads == {"t"}
+    with pytest.raises(main.HTTPException) as raised:
+        limiter.acquire("t")
+    assert raised.value.status_code == 409
+    limiter.release("t", second)
+    assert limiter.active_threads == set()
+
+
+@pytest.mark.parametrize("spec_version", ["2.0", "2.4"])
+def test_dropped_response_frees_the_thread(client, spec_version) -> None:
+    async def receive():
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        # The client is gone before the first byte of the body.
+        raise OSError("connection reset")
+
+    async def drop() -> None:
+        response = await main.submit_turn("gone", main.TurnRequest(message="hola"))
+        assert main.limiter.active_threads == {"gone"}
+        scope = {"type": "http", "asgi": {"spec_version": spec_version}}
+        with contextlib.suppress(Exception):
+            await response(scope, receive, send)
+
+    asyncio.run(drop())
+
+    assert main.limiter.active_threads == set()
+
+
+def test_artifact_fetch(client, monkeypatch, tmp_path) -> None:
+    monkeypatch.chdir(tmp_path)
+    ref = ArtifactStore(Configuration().artifact_store_dir).put(b"png-bytes")
+    digest = ref.removeprefix("sha256:")
+
+    response = client.get(f"/artifacts/{digest}")
+
+    assert response.status_code == 200
+    assert response.content == b"png-bytes"
+    assert response.headers["content-type"] == "image/png"
+    assert "immutable" in response.headers["cache-control"]
+    mockup = ArtifactStore(Configuration().artifact_store_dir).put(b"\xff\xd8\xffjpeg")
+    mockup_response = client.get(f"/artifacts/{mockup.removeprefix('sha256:')}")
+    assert mockup_response.headers["content-type"] == "image/jpeg"
+    assert client.get(f"/artifacts/{'0' * 64}").status_code == 404
+    assert client.get("/artifacts/not-a-digest").status_code == 400
+
+
+def test_job_status(client, monkeypatch, tmp_path) -> None:
+    monkeypatch.chdir(tmp_path)
+    order = ProductionOrder(
+        "a@b.c", 1, None, "M", "LISO", "sha256:abc", 10.0, 1.0, "t1"
+    )
+    job, _ = get_production_queue(Configuration()).enqueue(order)
+
+    response = client.get(f"/jobs/{job.id}")
+
+    assert response.status_code == 200
+    assert response.json()["status"] == "queued"
+    assert response.json()["size"] == "M"
+    assert [j["id"] for j in client.get("/threads/t1/jobs").json()] == [job.id]
+    assert client.get("/threads/t2/jobs").json() == []
+    assert client.get("/jobs/missing").status_code == 404
+
+
+def test_metrics_and_traces_when_instrumented(client) -> None:
+    assert client.get("/metrics").status_code == 404
+
+    instrumentation.enable()
+    try:
+        thread_id = client.post("/threads").json()["thread_id"]
+        client.post(f"/threads/{thread_id}/turns", json={"message": "hola"})
+
+        metrics = client.get("/metrics")
+        traces = client.get("/traces").json()
+    finally:
+        instrumentation.enable(False)
+
+    assert metrics.headers["content-type"].startswith("text/plain")
+    assert 'ownit_node_duration_seconds_count{node="call_model"}' in metrics.text
+    assert traces[-1]["thread_id"] == thread_id
+    assert "node:call_model" in [s["name"] for s in traces[-1]["spans"]]
+
+
+def test_imports_with_the_container_path() -> None:
+    # The Dockerfile runs `uvicorn src.main:app` from the app directory with
+    # src on PYTHONPATH, so modules in src shadow installed packages.
+    app_dir = Path(__file__).resolve().parents[2]
+    env = {**os.environ, "PYTHONPATH": str(app_dir / "src")}
+    code = "import sys, src.main; assert 'streamlit' not in sys.modules"
+
+    result = subprocess.run(
+        [sys.executable, "-c", code],
+        cwd=app_dir,
+        env=env,
+        capture_output=True,
+        text=True,
+        check=False,
+    )
+
+    assert result.returncode == 0, result.stderr
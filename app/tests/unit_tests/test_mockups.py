@@ -0,0 +1,146 @@
+import asyncio
+import io
+
+import numpy as np
+import pytest
+from agent import graph as graph_module
+from agent.artifacts import get_artifact_store
+from agent.configuration import Configuration
+from agent.mockups import MOCKUP_SIZE, PRODUCT_TYPES, garment_template, render_mockups
+from agent.state import State
+from PIL import Image
+from tests.fakes.images import canned_png
+
+
+def decode(data: bytes) -> np.ndarray:
+    with Image.open(io.BytesIO(data)) as img:
+        assert img.format == "JPEG"
+        return np.asarray(img.convert("RGB"), dtype=np.int16)
+
+
+def test_templates_are_cached_per_product() -> None:
+    liso, jaspeado = (garment_template(p) for p in PRODUCT_TYPES)
+
+    assert garment_template("LISO") is liso
+    assert liso.base.shape == (MOCKUP_SIZE[1], MOCKUP_SIZE[0], 3)
+    # Heathered fabric is darker and more textured than the plain one.
+    assert jaspeado.base.mean() < liso.base.mean()
+    with pytest.raises(ValueError, match="Unknown product type"):
+        garment_template("ESTAMPADO")
+
+
+def test_design_is_printed_inside_the_print_area_only() -> None:
+    mockups = render_mockups(canned_png(256), PRODUCT_TYPES, threshold=30)
+
+    assert len(mockups) == len(PRODUCT_TYPES)
+    for product_type, mockup in zip(PRODUCT_TYPES, mockups, strict=True):
+        template = garment_template(product_type)
+        left, top, width, height = template.print_area
+        difference = np.abs(decode(mockup) - template.base).max(axis=2)
+        inside = np.zeros(difference.shape, dtype=bool)
+        inside[top : top + height, left : left + width] = True
+        # The keyed-out background leaves the garment as is, up to JPEG noise.
+        assert np.percentile(difference[~inside], 99) < 12
+        assert (difference[inside] > 30).mean() > 0.15
+
+
+def test_black_design_leaves_the_garment_bare() -> None:
+    black = io.BytesIO()
+    Image.new("RGB", (64, 64)).save(black, "PNG")
+
+    [mockup] = render_mockups(black.getvalue(), ("JASPEADO",), threshold=30)
+
+    assert (
+        np.percentile(np.abs(decode(mockup) - garment_template("JASPEADO").base), 99)
+        < 12
+    )
+
+
+@pytest.mark.anyio
+async def test_finishing_previews_each_design_once_in_the_background(
+    monkeypatch, tmp_path
+) -> None:
+    monkeypatch.chdir(tmp_path)
+    rendered = []
+    release = asyncio.Event()
+
+    async def fake_run_cpu(func, data, product_types, threshold, feather):
+        rendered.append(data)
+        await release.wait()
+        return [data + p.encode() for p in product_types]
+
+    monkeypatch.setattr(graph_module, "run_cpu", fake_run_cpu)
+    configuration = Configuration(cpu_pool_size=0)
+    store = get_artifact_store(configuration.artifact_store_dir)
+    designs = [
+        {"type": "image", "ref": store.put(b"one"), "image_number": 1},
+        {"type": "image", "ref": store.put(b"two"), "image_number": 2, "variant": 1},
+    ]
+    state = State(artifacts=designs)
+
+    assert graph_module._start_mockups(state, configuration) == 2
+    assert graph_module._start_mockups(state, configuration) == 0
+    await asyncio.sleep(0.01)
+    # The turn does not wait for renders in progress; a later turn takes them.
+    assert graph_module._finished_mockups(state) == []
+    release.set()
+    await asyncio.sleep(0.01)
+    mockups = graph_module._finished_mockups(state)
+
+    assert sorted(rendered) == [b"one", b"two"]
+    assert sorted(
+        (m["image_number"], m.get("variant"), m["product_type"]) for m in mockups
+    ) == [
+        (1, None, "JASPEADO"),
+        (1, None, "LISO"),
+        (2, 1, "JASPEADO"),
+        (2, 1, "LISO"),
+    ]
+    [jaspeado] = [
+        m for m in mockups if m["image_number"] == 2 and m["product_type"] == "JASPEADO"
+    ]
+    assert store.get(jaspeado["ref"]) == b"twoJASPEADO"
+    assert graph_module._finished_mockups(state) == []
+
+    state = State(artifacts=designs + mockups)
+    assert graph_module._start_mockups(state, configuration) == 0
+    off = Configuration(render_mockups=False)
+    assert graph_module._start_mockups(State(artifacts=designs), off) == 0
+
+
+@pytest.mark.anyio
+async def test_renders_left_behind_are_bounded(monkeypatch, tmp_path) -> None:
+    monkeypatch.chdir(tmp_path)
+    release = asyncio.Event()
+
+    async def fake_run_cpu(func, data, product_types, threshold, feather):
+        await release.wait()
+        return [data + p.encode() for p in product_types]
+
+    thread = "a"
+    monkeypatch.setattr(graph_module, "run_cpu", fake_run_cpu)
+    monkeypatch.setattr(graph_module, "_thread_id", lambda: thread)
+    monkeypatch.setattr(graph_module, "MOCKUP_RENDERS_KEPT", 2)
+    configuration = Configuration(cpu_pool_size=0)
+    store = get_artifact_store(configuration.artifact_store_dir)
+    designs = [
+        {"type": "image", "ref": store.put(data), "image_number": n}
+        for n, data in enumerate([b"one", b"two", b"three"], start=1)
+    ]
+
+    assert graph_module._start_mockups(State(artifacts=designs[:2]), configuration) == 2
+    thread = "b"
+    assert graph_module._start_mockups(State(artifacts=designs[2:]), configuration) == 1
+    renders = graph_module._mockup_renders[asyncio.get_running_loop()]
+    # Thread a left the finishing state; its oldest render was dropped.
+    assert list(renders) == [("a", designs[1]["ref"]), ("b", designs[2]["ref"])]
+
+    release.set()
+    await asyncio.sleep(0.01)
+    assert len(graph_module._finished_mockups(State(artifacts=designs[2:]))) == 2
+    assert list(renders) == [("a", designs[1]["ref"])]
+    # Thread a comes back with the design already previewed.
+    thread = "a"
+    previewed = {"type": "mockup", "ref": "sha256:x", "source": designs[1]["ref"]}
+    assert graph_module._finished_mockups(State(artifacts=[*designs, previewed])) == []
+    assert not renders
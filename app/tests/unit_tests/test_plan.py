@@ -0,0 +1,103 @@
+import pytest
+from agent import graph as graph_module
+from agent.plan import PlanFilter, ainvoke_with_plan
+from langchain_core.language_models import GenericFakeChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, HumanMessage
+
+pytestmark = pytest.mark.anyio
+
+REPLY = "<Plan>Ask for the colours.</Plan>\n\n¿Qué colores querés usar?"
+
+
+def test_plan_is_hidden_and_text_released() -> None:
+    plan_filter = PlanFilter()
+
+    chunks = ["<Plan>Ask ", "for the colours.</Plan>", "\n\n¿Qué", " colores?"]
+
+    visible = "".join(plan_filter.feed(c) for c in chunks)
+
+    assert visible == "¿Qué colores?"
+    assert plan_filter.plan == "Ask for the colours."
+
+
+def test_reply_without_plan_passes_through() -> None:
+    plan_filter = PlanFilter()
+
+    assert plan_filter.feed("<P") == ""
+    assert plan_filter.feed("or qué?") == "<Por qué?"
+    assert plan_filter.feed(" Porque sí.") == " Porque sí."
+    assert plan_filter.plan is None
+
+
+async def test_graph_streams_model_tokens(monkeypatch) -> None:
+    model = GenericFakeChatModel(messages=iter([AIMessage(content=REPLY)]))
+    monkeypatch.setattr(graph_module, "get_chat_model", lambda name, tools: model)
+    plan_filter = PlanFilter()
+    tokens = []
+
+    async for mode, chunk in graph_module.graph.astream(
+        {"messages": [HumanMessage(content="hola")], "email": "a@b.c"},
+        config={"configurable": {"thread_id": "streaming"}},
+        stream_mode=["messages", "updates"],
+    ):
+        if mode == "messages":
+            message, metadata = chunk
+            if isinstance(message, AIMessageChunk):
+                assert metadata["langgraph_node"] == "call_model"
+                tokens.append(plan_filter.feed(message.content))
+
+    # The reply arrives token by token, not as one final message.
+    assert len(tokens) > 1
+    assert "".join(tokens) == "¿Qué colores querés usar?"
+
+
+@pytest.mark.parametrize("first", range(len(REPLY) + 1))
+def test_tags_split_across_chunks(first: int) -> None:
+    for second in range(first, len(REPLY) + 1):
+        plan_filter = PlanFilter()
+        chunks = [REPLY[:first], REPLY[first:second], REPLY[second:]]
+
+        visible = "".join(plan_filter.feed(c) for c in chunks) + plan_filter.finish()
+
+        assert visible == "¿Qué colores querés usar?"
+        assert plan_filter.plan == "Ask for the colours."
+
+
+def test_text_is_released_as_soon_as_plan_closes() -> None:
+    plan_filter = PlanFilter()
+
+    assert plan_filter.feed("<Plan>" + "x" * 10_000) == ""
+    assert plan_filter.feed("</Pl") == ""
+    assert plan_filter.feed("an>Hola") == "Hola"
+    assert plan_filter.feed(" mundo") == " mundo"
+
+
+def test_unclosed_plan_is_shown_in_full() -> None:
+    plan_filter = PlanFilter()
+
+    assert plan_filter.feed("<Plan>never closed") == ""
+    assert plan_filter.finish() == "<Plan>never closed"
+    assert plan_filter.plan is None
+
+
+async def test_empty_stream_gives_an_empty_reply() -> None:
+    class SilentModel:
+        async def astream(self, messages):
+            return
+            yield
+
+    response = await ainvoke_with_plan(SilentModel(), [HumanMessage(content="hola")])
+
+    assert response == AIMessage(content="")
+
+
+async def test_model_node_moves_plan_to_metadata(monkeypatch) -> None:
+    model = GenericFakeChatModel(messages=iter([AIMessage(content=REPLY)]))
+    monkeypatch.setattr(graph_module, "get_chat_model", lambda name, tools: model)
+    state = graph_module.State(messages=[HumanMessage(content="hola")])
+
+    result = await graph_module.call_model(state)
+
+    (message,) = result["messages"]
+    assert message.content == "¿Qué colores querés usar?"
+    assert message.response_metadata["internal_plan"] == "Ask for the colours."
@@ -0,0 +1,107 @@
+import asyncio
+
+import pytest
+from agent import graph as graph_module
+from agent import jobs, prekeying
+from agent.artifacts import get_artifact_store
+from agent.configuration import Configuration
+from agent.prekeying import Prekeyer
+from agent.state import State
+from agent.utils import write_file
+from langchain_core.messages import AIMessage
+from tests.fakes.images import canned_png
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_jobs_are_shared_cancelled_and_bounded() -> None:
+    prekeyer = Prekeyer(max_entries=2)
+    started = []
+    release = asyncio.Event()
+
+    async def job(name: str) -> bytes:
+        started.append(name)
+        await release.wait()
+        return name.encode()
+
+    assert prekeyer.schedule("a", lambda: job("a"), thread_id="t1")
+    assert not prekeyer.schedule("a", lambda: job("a"), thread_id="t1")
+    prekeyer.schedule("b", lambda: job("b"), thread_id="t2")
+    prekeyer.schedule("c", lambda: job("c"), thread_id="t2")  # Evicts and cancels "a".
+    await asyncio.sleep(0)
+
+    assert await prekeyer.take("a") is None
+    assert prekeyer.discard_pending("t2") == 2
+    assert len(prekeyer) == 0
+
+    prekeyer.schedule("d", lambda: job("d"))
+    release.set()
+    assert await prekeyer.take("d") == b"d"
+    # "a" was cancelled before it ever ran.
+    assert started == ["b", "c", "d"]
+
+
+async def test_failed_job_falls_back() -> None:
+    prekeyer = Prekeyer(max_entries=2)
+
+    async def fail() -> bytes:
+        raise RuntimeError("pool gone")
+
+    prekeyer.schedule("a", fail)
+
+    assert await prekeyer.take("a") is None
+    assert len(prekeyer) == 0
+
+
+async def test_production_uses_design_keyed_on_entering_finishing(
+    monkeypatch, tmp_path
+) -> None:
+    monkeypatch.chdir(tmp_path)
+    keyed_sources = []
+
+    async def fake_run_cpu(func, source, **kwargs):
+        keyed_sources.append(source)
+        return b"keyed:" + source[:8]
+
+    async def fake_render(func, keyed, outputs, dpi, strip_rows):
+        for path, _ in outputs:
+            write_file(path, keyed)
+        return [(width, width) for _, width in outputs]
+
+    async def fake_upload(path, blob_name):
+        return f"https://storage.example/{blob_name}"
+
+    monkeypatch.setattr(prekeying, "run_cpu", fake_run_cpu)
+    monkeypatch.setattr(jobs, "run_cpu", fake_render)
+    monkeypatch.setattr(jobs, "aupload_file", fake_upload)
+    configuration = Configuration()
+    store = get_artifact_store(configuration.artifact_store_dir)
+    designs = [canned_png(16 + n) for n in range(3)]
+    artifacts = [
+        {"type": "image", "ref": store.put(png), "image_number": n}
+        for n, png in enumerate(designs, start=1)
+    ]
+    state = State(messages=[], email="a@b.c", artifacts=artifacts, image_count=3)
+
+    assert graph_module._start_prekeying(state, configuration) == 3
+    assert graph_module._start_prekeying(state, configuration) == 0
+    await asyncio.sleep(0.01)
+    assert sorted(keyed_sources) == sorted(designs)
+
+    args = {"design_number": 2, "size": "M", "product_type": "LISO"}
+    call = {"name": "execute_production_file", "id": "call-1", "args": args}
+    state.messages = [AIMessage(content="", tool_calls=[call])]
+    result = await graph_module.production_node(state)
+    job_id = result["messages"][0].artifact["job_id"]
+    try:
+        job = await jobs.wait_for_job(
+            jobs.get_production_queue(configuration), job_id, timeout=5
+        )
+    finally:
+        await jobs.stop_production_workers()
+
+    assert job.result_url == f"https://storage.example/a@b.c/{job.order.output_name}"
+    assert (
+        tmp_path / "images/a@b.c" / job.order.output_name
+    ).read_bytes() == b"keyed:" + designs[1][:8]
+    assert len(keyed_sources) == 3
@@ -0,0 +1,64 @@
+import io
+
+import numpy as np
+from agent.imaging import key_png
+from agent.printing import (
+    PngStreamReader,
+    PngStreamWriter,
+    print_width_px,
+    render_print_files,
+)
+from PIL import Image
+from tests.fakes.images import canned_png
+
+
+def test_stream_writer_round_trips_blocks() -> None:
+    rng = np.random.default_rng(0)
+    pixels = rng.integers(0, 256, size=(37, 23, 4), dtype=np.uint8)
+    buffer = io.BytesIO()
+
+    writer = PngStreamWriter(buffer, 23, 37, dpi=300)
+    for top in range(0, 37, 10):
+        writer.write_rows(pixels[top : top + 10])
+    writer.close()
+
+    with Image.open(io.BytesIO(buffer.getvalue())) as img:
+        assert np.array_equal(np.asarray(img), pixels)
+        assert round(img.info["dpi"][0]) == 300
+    buffer.seek(0)
+    reader = PngStreamReader(buffer)
+    streamed = np.concatenate([reader.read_rows(8) for _ in range(5)])
+    assert np.array_equal(streamed, pixels)
+
+
+def test_strips_match_a_full_frame_resize(tmp_path) -> None:
+    keyed = key_png(canned_png(96), threshold=30)
+    strips, frame = tmp_path / "strips.png", tmp_path / "frame.png"
+
+    sizes = render_print_files(keyed, [(str(strips), 250)], dpi=300, strip_rows=16)
+    render_print_files(keyed, [(str(frame), 250)], dpi=300, strip_rows=250)
+
+    assert sizes == [(250, 250)]
+    with Image.open(strips) as a, Image.open(frame) as b:
+        difference = np.abs(np.asarray(a).astype(int) - np.asarray(b))
+    # Only float rounding of the filter weights differs, amplified at low alpha.
+    assert difference.max() <= 2
+    assert np.count_nonzero(difference) < 10
+    assert not list(tmp_path.glob("*.part"))
+
+
+def test_one_decode_renders_every_talle(tmp_path) -> None:
+    keyed = key_png(canned_png(64), threshold=30)
+    widths = {
+        talle: print_width_px(cm, 10) for talle, cm in {"s": 24, "xl": 33}.items()
+    }
+
+    sizes = render_print_files(
+        keyed, [(str(tmp_path / f"{t}.png"), w) for t, w in widths.items()], dpi=10
+    )
+
+    assert sizes == [(94, 94), (130, 130)]
+    with Image.open(tmp_path / "xl.png") as xl, Image.open(io.BytesIO(keyed)) as source:
+        assert xl.mode == "RGBA"
+        # Keyed-out corners stay transparent after resampling.
+        assert np.asarray(xl)[0, 0, 3] == 0 == np.asarray(source)[0, 0, 3]
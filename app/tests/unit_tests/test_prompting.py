@@ -0,0 +1,80 @@
+import logging
+from datetime import UTC, datetime
+
+import pytest
+from agent.prompting import (
+    PromptTemplate,
+    build_model_messages,
+    compile_system_prompt,
+    log_prompt_cache_usage,
+)
+from agent.prompts import SYSTEM_PROMPT
+from langchain_core.messages import AIMessage, HumanMessage
+
+
+def test_template_renders_fields_and_keeps_values_verbatim() -> None:
+    template = PromptTemplate("Hola {name}, {{literal}} {name}!")
+
+    assert template.fields == {"name"}
+    assert template.render(name="{x}") == "Hola {x}, {literal} {x}!"
+    with pytest.raises(ValueError, match="Unsupported"):
+        PromptTemplate("{value:>10}")
+
+
+def test_system_prompt_is_byte_stable() -> None:
+    assert compile_system_prompt(SYSTEM_PROMPT) == SYSTEM_PROMPT
+    stable = compile_system_prompt("Ahora es {system_time}.")
+    assert "{" not in stable
+    assert compile_system_prompt("Ahora es {system_time}.") == stable
+
+
+def test_turns_share_their_prefix_and_time_goes_in_the_last_user_turn() -> None:
+    history = [HumanMessage(content="hola", id="1")]
+    first = build_model_messages(
+        SYSTEM_PROMPT, history, datetime(2025, 1, 1, 10, 0, tzinfo=UTC)
+    )
+    history = [
+        *history,
+        AIMessage(content="¡Hola!", id="2"),
+        HumanMessage(content="gato", id="3"),
+        AIMessage(content="", id="4"),
+    ]
+    second = build_model_messages(
+        SYSTEM_PROMPT, history, datetime(2025, 1, 1, 10, 5, tzinfo=UTC)
+    )
+
+    assert [m["role"] for m in second if isinstance(m, dict)] == ["system"]
+    assert second[:2] == [first[0], history[0]]
+    assert first[1].content == "hola\n\nFecha y hora actual: 2025-01-01T10:00+00:00"
+    assert second[3].content == "gato\n\nFecha y hora actual: 2025-01-01T10:05+00:00"
+    assert second[3].id == "3"
+    assert second[4] is history[3]
+    # The conversation in the thread state is left as it was.
+    assert history[2].content == "gato"
+
+
+def test_time_is_added_to_multimodal_user_turns() -> None:
+    image = {"type": "image_url", "image_url": {"url": "data:image/png;base64,AA"}}
+    history = [HumanMessage(content=[image])]
+
+    [_, turn] = build_model_messages(
+        SYSTEM_PROMPT, history, datetime(2025, 1, 1, 10, 0, tzinfo=UTC)
+    )
+
+    assert turn.content == [
+        image,
+        {"type": "text", "text": "Fecha y hora actual: 2025-01-01T10:00+00:00"},
+    ]
+
+
+def test_cached_tokens_are_reported(caplog) -> None:
+    usage = {
+        "input_tokens": 2000,
+        "output_tokens": 50,
+        "input_token_details": {"cache_read": 1536},
+    }
+
+    with caplog.at_level(logging.INFO):
+        log_prompt_cache_usage(usage)
+
+    assert "1536/2000 input tokens cached (77%)" in caplog.text
@@ -0,0 +1,63 @@
+import asyncio
+import threading
+
+import pytest
+from agent.runtime import BackgroundLoop
+
+
+@pytest.fixture
+def background_loop():
+    loop = BackgroundLoop()
+    yield loop
+    loop.close()
+
+
+def test_turns_share_one_loop(background_loop) -> None:
+    async def current_loop():
+        return asyncio.get_running_loop()
+
+    first = background_loop.run(current_loop())
+    second = background_loop.run(current_loop())
+
+    assert first is second is background_loop.loop
+
+
+def test_stream_yields_items_and_heartbeats(background_loop) -> None:
+    async def events():
+        yield "a"
+        await asyncio.sleep(0.3)
+        yield "b"
+
+    items = list(background_loop.stream(events(), heartbeat=0.1))
+
+    assert items[0] == "a"
+    assert items[-1] == "b"
+    assert None in items
+
+
+def test_stream_propagates_errors(background_loop) -> None:
+    async def events():
+        yield "a"
+        raise RuntimeError("model down")
+
+    with pytest.raises(RuntimeError, match="model down"):
+        list(background_loop.stream(events()))
+
+
+def test_stopping_the_consumer_cancels_the_turn(background_loop) -> None:
+    cancelled = threading.Event()
+
+    async def events():
+        try:
+            yield "a"
+            await asyncio.sleep(10)
+            yield "b"
+        except asyncio.CancelledError:
+            cancelled.set()
+            raise
+
+    for item in background_loop.stream(events()):
+        assert item == "a"
+        break
+
+    assert cancelled.wait(1)
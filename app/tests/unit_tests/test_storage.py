@@ -0,0 +1,104 @@
+import asyncio
+import os
+import time
+
+import pytest
+from agent import storage
+from google.api_core import exceptions as gcs_exceptions
+from tests.fakes.gcs import FakeGCSServer
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def fake_gcs(monkeypatch):
+    with FakeGCSServer() as server:
+        monkeypatch.setenv("STORAGE_EMULATOR_HOST", server.url)
+        monkeypatch.setenv("GCP_BUCKET_NAME", "ownit-test")
+        storage.get_gcs_bucket.cache_clear()
+        yield server
+    storage.get_gcs_bucket.cache_clear()
+
+
+def test_upload_bytes_reuses_one_client(fake_gcs) -> None:
+    storage.upload_bytes(b"one", "a@b.c/design-1.png")
+    storage.upload_bytes(memoryview(b"two"), "a@b.c/design-2.png")
+
+    assert storage.get_gcs_bucket.cache_info().misses == 1
+    assert fake_gcs.objects == {
+        ("ownit-test", "a@b.c/design-1.png"): b"one",
+        ("ownit-test", "a@b.c/design-2.png"): b"two",
+    }
+
+
+async def test_aupload_bytes_retries_transient_errors(fake_gcs) -> None:
+    fake_gcs.fail_next = 2
+
+    url = await storage.aupload_bytes(b"png", "a@b.c/talle-m-liso.png")
+
+    assert url.endswith("/ownit-test/a%40b.c/talle-m-liso.png")
+    assert fake_gcs.upload_attempts == 3
+    assert fake_gcs.objects[("ownit-test", "a@b.c/talle-m-liso.png")] == b"png"
+
+
+async def test_aupload_bytes_gives_up_after_retries(fake_gcs) -> None:
+    fake_gcs.fail_next = 10
+
+    with pytest.raises(gcs_exceptions.ServiceUnavailable):
+        await storage.aupload_bytes(b"png", "a@b.c/design-1.png")
+    assert fake_gcs.upload_attempts == 4
+
+
+async def test_large_file_resends_only_the_failed_chunk(
+    fake_gcs, monkeypatch, tmp_path
+) -> None:
+    monkeypatch.setattr(storage, "UPLOAD_CHUNK_BYTES", 4 << 20)
+    large, small = tmp_path / "large.png", tmp_path / "small.png"
+    large.write_bytes(os.urandom(storage.RESUMABLE_UPLOAD_BYTES + (1 << 20)))
+    small.write_bytes(b"png")
+    fake_gcs.fail_next = 1
+
+    await storage.aupload_file(str(large), "a@b.c/large.png")
+    await storage.aupload_file(str(small), "a@b.c/small.png")
+
+    assert fake_gcs.objects[("ownit-test", "a@b.c/large.png")] == large.read_bytes()
+    assert fake_gcs.objects[("ownit-test", "a@b.c/small.png")] == b"png"
+    # One resumable session of three chunks, the failed first one sent twice;
+    # then the small file in a single request.
+    assert fake_gcs.chunk_attempts == 4
+    assert fake_gcs.upload_attempts == 2
+
+
+@pytest.mark.parametrize(
+    "error", [KeyError("gcp_service_account"), ValueError("bad key")]
+)
+async def test_aupload_bytes_does_not_retry_setup_errors(monkeypatch, error) -> None:
+    attempts = []
+
+    def failing_upload(data, blob_name, content_type):
+        attempts.append(blob_name)
+        raise error
+
+    monkeypatch.setattr(storage, "upload_bytes", failing_upload)
+    with pytest.raises(type(error)):
+        await storage.aupload_bytes(b"png", "a@b.c/design-1.png")
+    assert attempts == ["a@b.c/design-1.png"]
+
+
+async def test_aupload_bytes_bounds_concurrency(fake_gcs, monkeypatch) -> None:
+    in_flight = peak = 0
+
+    def slow_upload(data, blob_name, content_type):
+        nonlocal in_flight, peak
+        in_flight += 1
+        peak = max(peak, in_flight)
+        try:
+            time.sleep(0.05)
+        finally:
+            in_flight -= 1
+        return blob_name
+
+    monkeypatch.setattr(storage, "upload_bytes", slow_upload)
+    await asyncio.gather(*(storage.aupload_bytes(b"x", f"f{i}") for i in range(20)))
+
+    assert peak <= 8
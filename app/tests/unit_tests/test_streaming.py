@@ -0,0 +1,43 @@
+import pytest
+from agent.streaming import turn_events
+from langchain_core.language_models import GenericFakeChatModel
+from langchain_core.messages import AIMessage
+from langgraph.graph import END, START, MessagesState, StateGraph
+
+pytestmark = pytest.mark.anyio
+
+
+def reply_graph(*replies: str):
+    """A graph whose ``call_model`` node streams the given replies in order."""
+    model = GenericFakeChatModel(messages=iter(AIMessage(r) for r in replies))
+
+    async def call_model(state: MessagesState) -> dict:
+        return {"messages": [await model.ainvoke(state["messages"])]}
+
+    builder = StateGraph(MessagesState)
+    builder.add_node("call_model", call_model)
+    builder.add_edge(START, "call_model")
+    builder.add_edge("call_model", END)
+    return builder.compile()
+
+
+async def turn_text(graph) -> str:
+    input_state = {"messages": [("user", "hola")]}
+    config = {"configurable": {"thread_id": "t-1"}}
+    events = [e async for e in turn_events(graph, input_state, config)]
+    return "".join(payload[1] for event, payload in events if event == "token")
+
+
+@pytest.mark.parametrize(
+    ("reply", "shown"),
+    [
+        (
+            "<Plan>Saludar.</Plan>\n¡Hola! ¿Qué diseño querés?",
+            "¡Hola! ¿Qué diseño querés?",
+        ),
+        ("<Plan>never closed", "<Plan>never closed"),
+        ("<Pl", "<Pl"),
+    ],
+)
+async def test_turn_events_show_what_the_plan_filter_holds(reply, shown) -> None:
+    assert await turn_text(reply_graph(reply)) == shown
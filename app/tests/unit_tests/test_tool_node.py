@@ -0,0 +1,186 @@
+import asyncio
+import os
+import time
+
+import pytest
+from agent import graph as graph_module
+from agent.artifacts import get_artifact_store
+from agent.configuration import Configuration
+from agent.imaging import ImageHandle
+from agent.state import State
+from agent.tools import select_variant, variant_path
+from langchain_core.messages import AIMessage
+from langchain_core.tools import tool
+
+pytestmark = pytest.mark.anyio
+
+
+@tool(response_format="content_and_artifact")
+async def create_image(
+    prompt: str, image_number: int, output_path: str, variants: int = 1
+) -> tuple[str, list[ImageHandle]]:
+    """Fake create_image that takes 0.2s and fails on a 'boom' prompt."""
+    await asyncio.sleep(0.2)
+    if prompt == "boom":
+        raise RuntimeError("image API down")
+    if variants == 1:
+        return output_path, [ImageHandle(b"png", os.path.basename(output_path))]
+    return output_path, [
+        ImageHandle(
+            f"png-{k}".encode(), os.path.basename(variant_path(output_path, k)), k
+        )
+        for k in range(1, variants + 1)
+    ]
+
+
+@pytest.fixture
+def fake_tools(monkeypatch, tmp_path):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(graph_module, "TOOLS", [create_image])
+    uploads = {}
+
+    async def fake_upload(data, blob_name):
+        uploads[blob_name] = bytes(data)
+        return f"https://storage.example/{blob_name}"
+
+    monkeypatch.setattr(graph_module, "aupload_bytes", fake_upload)
+    return uploads
+
+
+def _state_with_calls(*prompts: str) -> State:
+    tool_calls = [
+        {
+            "name": "create_image",
+            "args": {"prompt": p, "image_number": i},
+            "id": f"call-{i}",
+        }
+        for i, p in enumerate(prompts, start=1)
+    ]
+    return State(messages=[AIMessage(content="", tool_calls=tool_calls)], email="a@b.c")
+
+
+async def test_tool_calls_run_concurrently_in_order(fake_tools) -> None:
+    state = _state_with_calls("uno", "dos", "tres")
+
+    start = time.perf_counter()
+    result = await graph_module.custom_tool_node(state)
+
+    assert time.perf_counter() - start < 0.5
+    # Only the new tool messages are returned, not the prior history.
+    tool_messages = result["messages"]
+    assert [m.tool_call_id for m in tool_messages] == ["call-1", "call-2", "call-3"]
+    assert len(result["artifacts"]) == 3
+    assert all(a["ref"].startswith("sha256:") for a in result["artifacts"])
+    assert result["image_count"] == 3
+
+
+async def test_failing_tool_call_is_isolated(fake_tools) -> None:
+    state = _state_with_calls("uno", "boom", "tres")
+
+    result = await graph_module.custom_tool_node(state)
+
+    contents = [m.content for m in result["messages"]]
+    assert contents[0].endswith("design-1.png")
+    assert contents[1] == "Error executing tool create_image: image API down"
+    assert contents[2].endswith("design-3.png")
+    assert len(result["artifacts"]) == 2
+
+
+async def test_variants_are_surfaced_as_artifacts(fake_tools) -> None:
+    tool_call = {
+        "name": "create_image",
+        "args": {"prompt": "uno", "image_number": 2, "variants": 9},
+        "id": "call-1",
+    }
+    state = State(
+        messages=[AIMessage(content="", tool_calls=[tool_call])], email="a@b.c"
+    )
+
+    result = await graph_module.custom_tool_node(state)
+
+    # Clamped to Configuration.max_image_variants.
+    assert [(a["image_number"], a["variant"]) for a in result["artifacts"]] == [
+        (2, 1),
+        (2, 2),
+        (2, 3),
+        (2, 4),
+    ]
+    assert result["image_count"] == 2
+
+
+async def test_images_are_persisted_from_memory(fake_tools, tmp_path) -> None:
+    tool_call = {
+        "name": "create_image",
+        "args": {"prompt": "uno", "image_number": 1, "variants": 2},
+        "id": "call-1",
+    }
+    state = State(
+        messages=[AIMessage(content="", tool_calls=[tool_call])], email="a@b.c"
+    )
+
+    result = await graph_module.custom_tool_node(state)
+
+    assert fake_tools == {
+        "a@b.c/design-1-1.png": b"png-1",
+        "a@b.c/design-1-2.png": b"png-2",
+    }
+    design_dir = tmp_path / "images" / "a@b.c"
+    assert (design_dir / "design-1.png").read_bytes() == b"png-1"
+    assert (design_dir / "design-1-2.png").read_bytes() == b"png-2"
+    # Only references are checkpointed with the tool message.
+    assert result["messages"][0].artifact == [a["ref"] for a in result["artifacts"]]
+
+
+async def test_selected_variant_is_recorded_in_state(fake_tools, monkeypatch) -> None:
+    monkeypatch.setattr(graph_module, "TOOLS", [create_image, select_variant])
+    create = {
+        "name": "create_image",
+        "args": {"prompt": "uno", "image_number": 1, "variants": 2},
+        "id": "call-1",
+    }
+    state = State(messages=[AIMessage(content="", tool_calls=[create])], email="a@b.c")
+    state.artifacts = (await graph_module.custom_tool_node(state))["artifacts"]
+    selections = [
+        {
+            "name": "select_variant",
+            "args": {"image_number": 1, "variant": v},
+            "id": f"s{v}",
+        }
+        for v in (2, 7)
+    ]
+    state.messages = [AIMessage(content="", tool_calls=selections)]
+
+    result = await graph_module.custom_tool_node(state)
+
+    assert result["messages"][0].content == "Variant 2 selected for design 1."
+    assert result["messages"][1].content.startswith(
+        "Error executing tool select_variant"
+    )
+    assert result["artifacts"] == [
+        {"type": "selection", "image_number": 1, "variant": 2}
+    ]
+    state.artifacts += result["artifacts"]
+    assert graph_module._selected_variant(state, 1) == 2
+    # Production finds the selection in the store, without any local copy.
+    configuration = Configuration(save_local_images=False)
+    source = await graph_module._load_design(state, 1, 2, "missing.png", configuration)
+    assert source == b"png-2"
+
+
+async def test_production_loads_the_threads_own_design(monkeypatch, tmp_path) -> None:
+    monkeypatch.chdir(tmp_path)
+    configuration = Configuration()
+    # Another thread of the same email saved its design 1 locally.
+    shared = tmp_path / "images" / "a@b.c" / "design-1.png"
+    shared.parent.mkdir(parents=True)
+    shared.write_bytes(b"other thread")
+    ref = get_artifact_store(configuration.artifact_store_dir).put(b"this thread")
+    state = State(artifacts=[{"type": "image", "ref": ref, "image_number": 1}])
+
+    source = await graph_module._load_design(state, 1, None, str(shared), configuration)
+    fallback = await graph_module._load_design(
+        State(), 1, None, str(shared), configuration
+    )
+
+    assert source == b"this thread"
+    assert fallback == b"other thread"
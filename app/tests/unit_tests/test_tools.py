@@ -0,0 +1,114 @@
+import asyncio
+import base64
+import time
+
+import pytest
+from agent import tools
+
+pytestmark = pytest.mark.anyio
+
+PNG_B64 = base64.b64encode(b"fake-png").decode()
+
+
+@pytest.fixture
+def fake_images_api(monkeypatch, tmp_path_factory):
+    monkeypatch.setenv("OPENAI_API_KEY", "sk-test")
+    # Keep the generation cache out of the test's output directory.
+    monkeypatch.chdir(tmp_path_factory.mktemp("cwd"))
+    calls = []
+
+    async def generate(client, prompt):
+        calls.append(prompt)
+        await asyncio.sleep(0.2)
+        return PNG_B64
+
+    monkeypatch.setattr(tools, "_generate_image_b64", generate)
+    return calls
+
+
+async def test_create_image_generates_variants_concurrently(
+    fake_images_api, tmp_path
+) -> None:
+    output_path = str(tmp_path / "design-2.png")
+
+    start = time.perf_counter()
+    message = await tools.create_image.ainvoke(
+        {
+            "name": "create_image",
+            "args": {
+                "prompt": "p",
+                "image_number": 2,
+                "variants": 3,
+                "output_path": output_path,
+            },
+            "id": "call-1",
+            "type": "tool_call",
+        }
+    )
+
+    assert time.perf_counter() - start < 0.5
+    assert [(h.name, h.variant) for h in message.artifact] == [
+        ("design-2-1.png", 1),
+        ("design-2-2.png", 2),
+        ("design-2-3.png", 3),
+    ]
+    assert all(h.data == b"fake-png" for h in message.artifact)
+    # Decoded in memory only; the caller decides whether to save to disk.
+    assert list(tmp_path.iterdir()) == []
+
+
+async def test_repeated_prompt_is_served_from_cache(fake_images_api, tmp_path) -> None:
+    args = {
+        "prompt": "Un  gato\n con gafas",
+        "image_number": 1,
+        "output_path": str(tmp_path),
+    }
+    await tools.create_image.ainvoke(
+        {"name": "create_image", "args": args, "id": "1", "type": "tool_call"}
+    )
+
+    # Same prompt up to whitespace, now with a second variant.
+    args = {**args, "prompt": "Un gato con gafas", "variants": 2}
+    message = await tools.create_image.ainvoke(
+        {"name": "create_image", "args": args, "id": "2", "type": "tool_call"}
+    )
+
+    assert fake_images_api == ["Un  gato\n con gafas", "Un gato con gafas"]
+    assert [h.data for h in message.artifact] == [b"fake-png", b"fake-png"]
+
+
+async def test_select_variant_copies_chosen_file(tmp_path) -> None:
+    (tmp_path / "design-1.png").write_bytes(b"first")
+    (tmp_path / "design-1-2.png").write_bytes(b"second")
+
+    result = await tools.select_variant.ainvoke(
+        {"image_number": 1, "variant": 2, "design_dir": str(tmp_path)}
+    )
+
+    assert result == "Variant 2 selected for design 1."
+    assert (tmp_path / "design-1.png").read_bytes() == b"second"
+
+
+async def test_image_client_is_reused_until_closed(monkeypatch, tmp_path) -> None:
+    monkeypatch.setenv("OPENAI_API_KEY", "sk-test")
+    monkeypatch.chdir(tmp_path)
+    clients = []
+
+    async def generate(client, prompt):
+        clients.append(client)
+        return PNG_B64
+
+    monkeypatch.setattr(tools, "_generate_image_b64", generate)
+
+    async def create(prompt: str) -> None:
+        await tools.create_image.ainvoke({"prompt": prompt, "image_number": 1})
+
+    await create("uno")
+    await create("dos")
+    await tools.close_openai_client()
+    await create("tres")
+
+    assert clients[0] is clients[1]
+    assert clients[0].is_closed()
+    assert clients[2] is not clients[0] and not clients[2].is_closed()
+    await tools.close_openai_client()
@@ -0,0 +1,67 @@
+from agent import utils
+from langchain_core.tools import tool
+
+
+class FakeChatModel:
+    def __init__(self, name: str) -> None:
+        self.name = name
+
+    def bind_tools(self, tools):
+        return (self, tuple(t.name for t in tools))
+
+
+@tool
+def alpha() -> str:
+    """Alpha tool."""
+    return "a"
+
+
+@tool
+def beta() -> str:
+    """Beta tool."""
+    return "b"
+
+
+def _patch_loader(monkeypatch) -> list[str]:
+    loaded: list[str] = []
+
+    def load(name: str) -> FakeChatModel:
+        loaded.append(name)
+        return FakeChatModel(name)
+
+    utils.clear_model_cache()
+    monkeypatch.setattr(utils, "load_chat_model", load)
+    return loaded
+
+
+def test_get_chat_model_reuses_bindings_and_clients(monkeypatch) -> None:
+    loaded = _patch_loader(monkeypatch)
+
+    first = utils.get_chat_model("openai/m", [alpha])
+    again = utils.get_chat_model("openai/m", [alpha])
+    other = utils.get_chat_model("openai/m", [alpha, beta])
+
+    assert first is again
+    assert other[1] == ("alpha", "beta")
+    # Both tool sets wrap the same underlying client.
+    assert first[0] is other[0]
+    assert loaded == ["openai/m"]
+
+
+def test_get_chat_model_evicts_least_recently_used(monkeypatch) -> None:
+    _patch_loader(monkeypatch)
+    monkeypatch.setattr(utils, "MODEL_CACHE_SIZE", 2)
+
+    first = utils.get_chat_model("openai/m", [alpha])
+    utils.get_chat_model("openai/m", [beta])
+    utils.get_chat_model("openai/m", [alpha])  # refresh alpha
+    utils.get_chat_model("openai/m", [alpha, beta])  # evicts beta
+
+    assert utils.get_chat_model("openai/m", [alpha]) is first
+    assert ("openai/m", ("beta",)) not in utils._bound_models
+
+
+def test_openai_models_stream_usage(monkeypatch) -> None:
+    monkeypatch.setenv("OPENAI_API_KEY", "sk-test")
+
+    assert utils.load_chat_model("openai/gpt-4.1-mini").stream_usage is True